@@ -0,0 +1,191 @@
+"""Prueba de carga de la integración contra el simulador de ventanas.
+
+Arranca un Home Assistant mínimo en un directorio temporal, carga la
+integración con el inventario del simulador y maneja las entidades reales
+de `cover`, `light`, `switch` y `sensor` a través de sus servicios.
+Necesita Home Assistant instalado:
+
+    python benchmarks/bench_load.py --windows 200 --rounds 3
+
+Informa de:
+
+- tiempo de arranque de la integración,
+- sockets abiertos y tramas enviadas por ciclo de consulta,
+- comandos por segundo y latencia p50/p99 de cada servicio.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from homeassistant import bootstrap, loader
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from simulator import DeviceSimulator, SimulatorOptions
+
+DOMAIN = "mysmartwindow"
+REPO_COMPONENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components")
+
+
+def percentile(values, fraction):
+    """Percentil por el método del rango más cercano."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def start_hass(config_dir):
+    """Arrancar un Home Assistant mínimo que encuentre la integración del repositorio."""
+    os.symlink(os.path.abspath(REPO_COMPONENTS), os.path.join(config_dir, "custom_components"))
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = ConfigEntries(hass, {})
+    await bootstrap.async_load_base_functionality(hass)
+    # `network` solo hace falta para descubrir interfaces; con localhost basta marcarlo como cargado
+    hass.config.components.add("network")
+    disable_cloud()
+    await hass.async_start()
+    return hass
+
+
+def disable_cloud():
+    """Evitar que el refresco del inventario consulte la nube real.
+
+    Con el token del simulador la nube contestaría 401 (y se abriría la
+    reautenticación) o, peor, un inventario que sustituiría al del simulador.
+    La lista de edificios se da siempre por no modificada (como un 304).
+    """
+    from custom_components.mysmartwindow.cloud import CloudClient
+
+    async def async_get_buildings(self, conditional=False):
+        return None
+
+    CloudClient.async_get_buildings = async_get_buildings
+
+
+async def timed_calls(hass, calls):
+    """Lanzar las llamadas de servicio a la vez y devolver (latencias, duración total)."""
+    latencies = []
+
+    async def call(domain, service, data):
+        start = time.perf_counter()
+        await hass.services.async_call(domain, service, data, blocking=True)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(*c) for c in calls))
+    return latencies, time.perf_counter() - start
+
+
+async def poll_cycle(hass, simulator):
+    """Forzar un ciclo de consulta de todas las ventanas y contar sockets y tramas."""
+    connections, requests = simulator.connections, simulator.requests
+    coordinators = hass.data[DOMAIN]["coordinators"].values()
+    start = time.perf_counter()
+    await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+    elapsed = time.perf_counter() - start
+    return simulator.connections - connections, simulator.requests - requests, elapsed
+
+
+async def run(args):
+    """Ejecutar la prueba de carga completa."""
+    options = SimulatorOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        split_probability=args.split,
+        drop_probability=args.drop,
+        padding=args.padding,
+        seed=args.seed,
+    )
+    simulator = DeviceSimulator(args.windows, options=options, rooms=args.rooms)
+    await simulator.start()
+
+    config_dir = tempfile.mkdtemp(prefix="mysmartwindow-bench-")
+    hass = await start_hass(config_dir)
+    try:
+        entry = ConfigEntry(
+            version=1,
+            minor_version=1,
+            domain=DOMAIN,
+            title="MySmartWindow",
+            data={"cloud_token": "simulator", "devices": simulator.inventory()},
+            source="user",
+            options={},
+        )
+        start = time.perf_counter()
+        await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+        print(f"Ventanas: {args.windows}  arranque: {time.perf_counter() - start:.2f}s  estado: {entry.state}")
+
+        entities = {}
+        for entity in er.async_entries_for_config_entry(er.async_get(hass), entry.entry_id):
+            entities.setdefault(entity.domain, []).append(entity.entity_id)
+        print("Entidades: " + ", ".join(f"{domain}={len(ids)}" for domain, ids in sorted(entities.items())))
+
+        print(f"\n{'ciclo':<8}{'sockets':>10}{'tramas':>10}{'s':>10}")
+        for cycle in range(args.cycles):
+            sockets, frames, elapsed = await poll_cycle(hass, simulator)
+            print(f"{cycle + 1:<8}{sockets:>10}{frames:>10}{elapsed:>10.3f}")
+
+        covers = entities.get("cover", [])
+        lights = entities.get("light", [])
+        switches = entities.get("switch", [])
+        scenarios = {
+            "cover.set_cover_position": lambda r: [
+                ("cover", "set_cover_position", {"entity_id": e, "position": (r * 37) % 101}) for e in covers
+            ],
+            "light.turn_on": lambda r: [
+                ("light", "turn_on", {"entity_id": e, "rgb_color": (255, 0, 0) if r % 2 else (0, 0, 255)})
+                for e in lights
+            ],
+            "switch.toggle": lambda r: [("switch", "toggle", {"entity_id": e}) for e in switches],
+        }
+
+        print(f"\n{'servicio':<28}{'llamadas':>10}{'cmd/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, build in scenarios.items():
+            latencies, wall = [], 0.0
+            for round_ in range(args.rounds):
+                calls = build(round_)
+                if not calls:
+                    break
+                round_latencies, elapsed = await timed_calls(hass, calls)
+                latencies.extend(round_latencies)
+                wall += elapsed
+            if not latencies:
+                continue
+            print(
+                f"{name:<28}{len(latencies):>10}{len(latencies) / wall:>10.1f}"
+                f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+            )
+
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+    finally:
+        await hass.async_stop(force=True)
+        await simulator.stop()
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=int, default=50)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3, help="rondas de comandos por servicio")
+    parser.add_argument("--cycles", type=int, default=3, help="ciclos de consulta a medir")
+    parser.add_argument("--latency", type=float, default=0.005, help="segundos")
+    parser.add_argument("--jitter", type=float, default=0.002, help="segundos")
+    parser.add_argument("--split", type=float, default=0.0, help="probabilidad de partir una respuesta")
+    parser.add_argument("--drop", type=float, default=0.0, help="probabilidad de cerrar la conexión")
+    parser.add_argument("--padding", action="store_true", help="rellenar las respuestas con \\x00")
+    parser.add_argument("--seed", type=int)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
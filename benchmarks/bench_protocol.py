@@ -0,0 +1,86 @@
+"""Micro-benchmarks del decodificador y del constructor de tramas frente a los métodos anteriores.
+
+El decodificador anterior hacía una sola lectura y buscaba el JSON con
+`re.search(r"\\{.*\\}", ...)`; las tramas se construían con un diccionario,
+`json.dumps` y `.encode()` en cada petición. Se ejecuta sin Home Assistant:
+
+    python benchmarks/bench_protocol.py
+"""
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "mysmartwindow"))
+
+from protocol import FrameBuilder, FrameDecoder  # noqa: E402
+
+NUMBER = 20000
+
+FRAME = json.dumps({"bearer": "x" * 32, "type": "plain", "op": 6, "value": 87}).encode()
+
+CASES = {
+    "una trama": [FRAME],
+    "relleno \\x00": [b"\x00" * 16 + FRAME + b"\x00" * 16],
+    "partida en 3 segmentos": [FRAME[:10], FRAME[10:40], FRAME[40:]],
+    "dos tramas juntas": [FRAME + FRAME],
+}
+
+
+BEARER = "x" * 32
+BUILD_CASES = {
+    "lectura": (6, None),
+    "posición": (20, 57),
+}
+
+
+def dumps_build(op, args=None):
+    """Método anterior: diccionario, `json.dumps` y `.encode()` en cada trama."""
+    mensaje = {"bearer": BEARER, "type": "plain", "op": op}
+    if args is not None:
+        mensaje["args"] = args
+    return (json.dumps(mensaje) + "\n").encode()
+
+
+def regex_decode(chunks):
+    """Método anterior: solo se analiza la primera lectura."""
+    respuesta = chunks[0].replace(b"\x00", b"").decode().strip()
+    match = re.search(r"\{.*\}", respuesta)
+    if not match:
+        return []
+    try:
+        return [json.loads(match.group(0))]
+    except json.JSONDecodeError:
+        return []
+
+
+def stream_decode(chunks, decoder=FrameDecoder()):
+    """Decodificador incremental, reutilizado como en una conexión persistente."""
+    frames = []
+    for chunk in chunks:
+        frames.extend(decoder.feed(chunk))
+    return frames
+
+
+def main():
+    """Ejecutar los casos y mostrar tiempo por llamada y mensajes decodificados."""
+    print(f"{'caso':<24}{'método':<10}{'µs/llamada':>12}{'mensajes':>10}")
+    for name, chunks in CASES.items():
+        for label, func in (("regex", regex_decode), ("stream", stream_decode)):
+            seconds = timeit.timeit(lambda: func(chunks), number=NUMBER)
+            print(f"{name:<24}{label:<10}{seconds / NUMBER * 1e6:>12.2f}{len(func(chunks)):>10}")
+
+    print()
+    print(f"{'trama':<24}{'método':<10}{'µs/llamada':>12}{'bytes':>10}")
+    builder = FrameBuilder(BEARER)
+    compact = FrameBuilder(BEARER, compact=True)
+    for name, (op, args) in BUILD_CASES.items():
+        assert builder.build(op, args) == dumps_build(op, args)
+        for label, func in (("dumps", dumps_build), ("builder", builder.build), ("compacta", compact.build)):
+            seconds = timeit.timeit(lambda: func(op, args), number=NUMBER)
+            print(f"{name:<24}{label:<10}{seconds / NUMBER * 1e6:>12.2f}{len(func(op, args)):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""Simulador local de ventanas MySmartWindow para pruebas de carga.
+
+Cada ventana virtual es un servidor TCP asyncio que habla el protocolo del
+dispositivo: recibe tramas `{"bearer", "type": "plain", "op", "args"}` y
+contesta con `{"type": "plain", "op", "value"}`. Atiende todas las
+operaciones de `const.COMMANDS`, simula el recorrido de la persiana, la
+deriva de los sensores, la latencia, las respuestas partidas en varios
+segmentos y las conexiones que se caen. No necesita Home Assistant:
+
+    python benchmarks/simulator.py --windows 200 --inventory /tmp/inventory.json
+
+El inventario escrito tiene el mismo formato que `Creator_Buildings` de la
+nube, con `Ip` y `Port` de cada ventana virtual.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "custom_components", "mysmartwindow"))
+
+# protocol.py y const.py no dependen de Home Assistant
+from const import COMMANDS  # noqa: E402
+from protocol import FrameDecoder  # noqa: E402
+
+OP = {name: command["op"] for name, command in COMMANDS.items()}
+
+# Sensores simulados: op -> (valor inicial, deriva máxima por segundo, mínimo, máximo)
+SENSORS = {
+    OP["TEMPERATURE"]: (21.0, 0.02, 10.0, 35.0),
+    OP["HUMEDITY"]: (45.0, 0.1, 10.0, 90.0),
+    OP["Co2"]: (600.0, 5.0, 400.0, 3000.0),
+    OP["VOC"]: (100.0, 2.0, 0.0, 1000.0),
+    OP["IAQ"]: (50.0, 1.0, 0.0, 500.0),
+    OP["BAROMETRO"]: (1013.0, 0.05, 950.0, 1050.0),
+}
+
+BLIND_CLOSED = 120  # Escala de la persiana: 0 abierta, 120 cerrada
+
+
+class SimulatorOptions:
+    """Parámetros de la simulación compartidos por todas las ventanas."""
+
+    def __init__(
+        self,
+        latency=0.005,
+        jitter=0.002,
+        blind_speed=12.0,
+        split_probability=0.0,
+        drop_probability=0.0,
+        padding=False,
+        seed=None,
+    ):
+        """Guardar los parámetros (tiempos en segundos, velocidad en unidades/s)."""
+        self.latency = latency
+        self.jitter = jitter
+        self.blind_speed = blind_speed
+        self.split_probability = split_probability
+        self.drop_probability = drop_probability
+        self.padding = padding
+        self.random = random.Random(seed)
+
+
+class VirtualWindow:
+    """Estado de una ventana simulada y su servidor TCP."""
+
+    def __init__(self, window_id, bearer, options, services=("S5", "S9")):
+        """Crear la ventana con la persiana abierta, LED apagado y sensores en reposo."""
+        self.window_id = window_id
+        self.bearer = bearer
+        self.options = options
+        self.services = services
+        self.host = None
+        self.port = None
+        self.connections = 0
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._server = None
+        self._clients = set()
+
+        self._blind_from = 0.0
+        self._blind_target = 0.0
+        self._blind_started = time.monotonic()
+        self.led_on = 0
+        self.led_color = 1
+        self.window_state = 0
+        self.micro_state = 0
+        self._sensors = {op: initial for op, (initial, _, _, _) in SENSORS.items()}
+        self._sensors_at = time.monotonic()
+
+    @property
+    def blind_position(self):
+        """Posición actual de la persiana (0-120) interpolada desde el último comando."""
+        distance = self._blind_target - self._blind_from
+        travelled = (time.monotonic() - self._blind_started) * self.options.blind_speed
+        if travelled >= abs(distance):
+            return self._blind_target
+        return self._blind_from + travelled * (1 if distance > 0 else -1)
+
+    def _move_blind(self, target):
+        """Empezar a mover la persiana hacia `target` desde la posición actual."""
+        self._blind_from = self.blind_position
+        self._blind_target = max(0.0, min(float(BLIND_CLOSED), float(target)))
+        self._blind_started = time.monotonic()
+
+    def _drift_sensors(self):
+        """Aplicar un paseo aleatorio a los sensores según el tiempo transcurrido."""
+        now = time.monotonic()
+        elapsed = now - self._sensors_at
+        self._sensors_at = now
+        rnd = self.options.random
+        for op, (_, drift, low, high) in SENSORS.items():
+            value = self._sensors[op] + rnd.uniform(-drift, drift) * elapsed
+            self._sensors[op] = max(low, min(high, value))
+
+    def handle(self, op, args):
+        """Ejecutar una operación y devolver el valor de la respuesta."""
+        if op == OP["BLIND UP"]:
+            self._move_blind(0)
+        elif op == OP["BLIND DOWN"]:
+            self._move_blind(BLIND_CLOSED)
+        elif op == OP["BLIND STOP"]:
+            self._move_blind(self.blind_position)
+        elif op == OP["BLIND POSITION UNIT"]:
+            self._move_blind(args if isinstance(args, (int, float)) else 0)
+        elif op == OP["BLIND STATE"]:
+            return int(round(self.blind_position))
+        elif op == OP["LED ON"]:
+            self.led_on = 1
+        elif op == OP["LED OFF"]:
+            self.led_on = 0
+        elif op == OP["LED STATE"]:
+            return self.led_on
+        elif op == OP["LED COLOR SELECTION"]:
+            self.led_color = args if isinstance(args, int) else self.led_color
+        elif op == OP["LED COLOR STATE"]:
+            return self.led_color
+        elif op == OP["WINDOW OPEN"]:
+            self.window_state, self.micro_state = 1, 0
+        elif op == OP["WINDOW CLOSE"]:
+            self.window_state, self.micro_state = 0, 0
+        elif op == OP["WINDOW MICRO OPEN"]:
+            self.window_state, self.micro_state = 1, 1
+        elif op == OP["WINDOW STATE"]:
+            return self.window_state
+        elif op == OP["WINDOW MICRO STATE"]:
+            return self.micro_state
+        elif op in self._sensors:
+            self._drift_sensors()
+            return round(self._sensors[op], 1)
+        elif op == OP["OP_SENSORS"]:
+            return sorted(self._sensors)
+        else:
+            raise KeyError(op)
+        return "OK"
+
+    async def start(self, host):
+        """Abrir el servidor TCP en un puerto libre de `host`."""
+        self._server = await asyncio.start_server(self._handle_client, host, 0)
+        self.host = host
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Cerrar el servidor y las conexiones abiertas."""
+        if self._server is not None:
+            self._server.close()
+            for task in self._clients:
+                task.cancel()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _send(self, writer, reply):
+        """Enviar una respuesta con latencia, relleno y segmentación simulados."""
+        opts = self.options
+        data = json.dumps(reply).encode()
+        if opts.padding:
+            data = b"\x00" * 8 + data + b"\x00" * 8
+
+        delay = opts.latency + opts.random.uniform(0, opts.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if len(data) > 2 and opts.random.random() < opts.split_probability:
+            cut = opts.random.randrange(1, len(data) - 1)
+            writer.write(data[:cut])
+            await writer.drain()
+            await asyncio.sleep(0.001)
+            data = data[cut:]
+
+        writer.write(data)
+        self.bytes_out += len(data)
+        await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        """Atender una conexión: una respuesta por trama recibida, en orden."""
+        self.connections += 1
+        task = asyncio.current_task()
+        self._clients.add(task)
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                self.bytes_in += len(data)
+                for frame in decoder.feed(data):
+                    if self.options.random.random() < self.options.drop_probability:
+                        # Conexión caída a mitad de petición
+                        return
+                    self.requests += 1
+                    op = frame.get("op")
+                    reply = {"type": "plain", "op": op}
+                    if frame.get("bearer") != self.bearer:
+                        reply["error"] = "bearer"
+                    else:
+                        try:
+                            reply["value"] = self.handle(op, frame.get("args"))
+                        except KeyError:
+                            reply["error"] = "op"
+                    await self._send(writer, reply)
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+
+def _loopback(index):
+    """Dirección de loopback propia de la ventana `index`."""
+    return f"127.0.{index // 254}.{index % 254 + 1}"
+
+
+class DeviceSimulator:
+    """Conjunto de ventanas virtuales en localhost con su inventario."""
+
+    def __init__(self, count, host=None, options=None, rooms=10, bearer="simulator"):
+        """Preparar `count` ventanas repartidas en `rooms` salas de un edificio.
+
+        Sin `host` cada ventana escucha en su propia dirección de loopback
+        (127.0.x.y, válido en Linux), porque el `unique_id` de los sensores
+        es `Ip-Op` y dos ventanas con la misma IP chocarían.
+        """
+        self.host = host
+        self.options = options or SimulatorOptions()
+        self.rooms = rooms
+        self.bearer = bearer
+        self.windows = [
+            VirtualWindow(f"sim-{index:04d}", bearer, self.options) for index in range(count)
+        ]
+
+    @property
+    def connections(self):
+        """Total de conexiones TCP aceptadas por todas las ventanas."""
+        return sum(window.connections for window in self.windows)
+
+    @property
+    def requests(self):
+        """Total de tramas atendidas por todas las ventanas."""
+        return sum(window.requests for window in self.windows)
+
+    async def start(self):
+        """Arrancar todas las ventanas."""
+        await asyncio.gather(
+            *(window.start(self.host or _loopback(index)) for index, window in enumerate(self.windows))
+        )
+
+    async def stop(self):
+        """Parar todas las ventanas."""
+        await asyncio.gather(*(window.stop() for window in self.windows))
+
+    def inventory(self):
+        """Inventario con el formato de `Creator_Buildings` de la nube."""
+        rooms = []
+        for room in range(self.rooms):
+            windows = [
+                {
+                    "Id_Window": window.window_id,
+                    "Name": f"Ventana {index}",
+                    "Ip": window.host,
+                    "Port": window.port,
+                    "Services": list(window.services),
+                    "Sensors": [{"Op": op, "Value": None} for op in SENSORS],
+                }
+                for index, window in enumerate(self.windows)
+                if index % self.rooms == room
+            ]
+            if windows:
+                rooms.append({"Name": f"Sala {room}", "Windows": windows})
+        return [{"Home": {"Name": "Simulador", "Bearer": self.bearer, "Rooms": rooms}}]
+
+
+async def _run(args):
+    """Arrancar el simulador y mantenerlo hasta Ctrl+C."""
+    options = SimulatorOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        blind_speed=args.blind_speed,
+        split_probability=args.split,
+        drop_probability=args.drop,
+        padding=args.padding,
+        seed=args.seed,
+    )
+    simulator = DeviceSimulator(args.windows, args.host, options, rooms=args.rooms)
+    await simulator.start()
+    inventory = json.dumps(simulator.inventory(), indent=2)
+    if args.inventory:
+        with open(args.inventory, "w", encoding="utf-8") as file:
+            file.write(inventory)
+        print(f"{args.windows} ventanas en {args.host or '127.0.x.y'}; inventario en {args.inventory}")
+    else:
+        print(inventory)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+
+def main():
+    """Punto de entrada de la línea de comandos."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=int, default=10)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--host", help="dirección común (por defecto una 127.0.x.y por ventana)")
+    parser.add_argument("--latency", type=float, default=0.005, help="segundos")
+    parser.add_argument("--jitter", type=float, default=0.002, help="segundos")
+    parser.add_argument("--blind-speed", type=float, default=12.0, help="unidades (0-120) por segundo")
+    parser.add_argument("--split", type=float, default=0.0, help="probabilidad de partir una respuesta")
+    parser.add_argument("--drop", type=float, default=0.0, help="probabilidad de cerrar la conexión")
+    parser.add_argument("--padding", action="store_true", help="rellenar las respuestas con \\x00")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--inventory", help="fichero donde escribir el inventario JSON")
+    try:
+        asyncio.run(_run(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,140 @@
-import logging
-import os
-import yaml
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.device_registry import async_get as async_get_device_registry
-from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
-
-from .const import DOMAIN
-
-_LOGGER = logging.getLogger(__name__)
-
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Configurar la integración y registrar los dispositivos correctamente."""
-    hass.data.setdefault(DOMAIN, {})
-
-    # Guardamos los dispositivos en hass.data
-    devices = entry.data.get("devices", [])
-    hass.data[DOMAIN]["devices"] = devices
-    _LOGGER.info("Dispositivos cargados en hass.data: %s", devices)
-
-    device_registry = async_get_device_registry(hass)
-
-    # Registrar cada dispositivo en el sistema de dispositivos de HA
-    for building in devices:
-        home = building.get("Home", {})
-        rooms = home.get("Rooms", [])
-        for room in rooms:
-            windows = room.get("Windows", []) or []
-            for window in windows:
-                window_id = window.get("Id_Window")
-                if not window_id:
-                    continue
-                device_registry.async_get_or_create(
-                    config_entry_id=entry.entry_id,
-                    identifiers={(DOMAIN, window_id)},
-                    manufacturer="MySmartWindow",
-                    model="Smart Cover",
-                    name=f"{room.get('Name', 'Sala Desconocida')} - {window.get('Name', 'Ventana Desconocida')}",
-                    sw_version="1.0",
-                )
-                
-    await hass.config_entries.async_forward_entry_setups(entry, ["cover", "sensor", "light", "switch"])
-    
-    return True
-    
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Desinstalar la integración."""
-    _LOGGER.info("Desinstalando integración MySmartWindow")
-    
-    if DOMAIN in hass.data:
-        hass.data.pop(DOMAIN)
-    
-    return await hass.config_entries.async_unload_platforms(entry, ["cover", "sensor", "light", "switch"])
+import logging
+import os
+import yaml
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import (
+    async_entries_for_config_entry,
+    async_get as async_get_device_registry,
+)
+from homeassistant.helpers.entity_registry import (
+    async_entries_for_device,
+    async_get as async_get_entity_registry,
+)
+
+from .analytics import FleetAnalytics
+from .const import DOMAIN, CONF_VENTILATION, DEFAULT_VENTILATION
+from .connection import ConnectionPool
+from .inventory import (
+    InventoryRefresher,
+    async_create_coordinator,
+    async_forward_platforms,
+    async_register_window,
+    async_warm_up,
+)
+from .services import async_setup_services, async_unload_services
+from .snapshot import InventorySnapshot
+from .topology import Topology
+from .ventilation import VentilationManager
+
+_LOGGER = logging.getLogger(__name__)
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Configurar la integración y registrar los dispositivos correctamente."""
+    hass.data.setdefault(DOMAIN, {})
+
+    # Arranque sin depender de la nube: inventario y último estado desde la copia local
+    snapshot = InventorySnapshot(hass, entry)
+    await snapshot.async_load()
+    hass.data[DOMAIN]["snapshot"] = snapshot
+    if snapshot.devices is None:
+        snapshot.devices = entry.data.get("devices", [])
+
+    # Modelo del inventario construido una sola vez y compartido por las plataformas
+    topology = Topology(snapshot.devices)
+    hass.data[DOMAIN]["topology"] = topology
+    _LOGGER.info("Dispositivos cargados en hass.data: %s ventanas", len(topology.windows))
+
+    # Una conexión persistente por (Ip, puerto), compartida por todas las plataformas
+    pool = ConnectionPool(hass)
+    hass.data[DOMAIN]["pool"] = pool
+
+    # Registrar cada ventana una sola vez en el sistema de dispositivos de HA y
+    # crear un coordinador por ventana: todas sus entidades comparten un único ciclo de consulta
+    coordinators = {}
+    hass.data[DOMAIN]["coordinators"] = coordinators
+    for window_id, window in topology.windows.items():
+        async_register_window(hass, entry, window)
+        coordinator = coordinators[window_id] = async_create_coordinator(hass, entry, window)
+        # Las entidades se crean con el estado guardado (o desconocido) y se
+        # rellenan con la primera consulta, que no bloquea el arranque
+        restored = snapshot.states.get(window_id)
+        if restored:
+            coordinator.data = restored
+
+    # Analítica de la flota sobre los datos de los coordinadores (no consulta las ventanas)
+    analytics = FleetAnalytics(hass, coordinators)
+    hass.data[DOMAIN]["analytics"] = analytics
+    analytics.async_start()
+
+    # Control automático de la ventilación por sala, si está activado
+    if entry.options.get(CONF_VENTILATION, DEFAULT_VENTILATION):
+        ventilation = VentilationManager(hass, entry, coordinators)
+        hass.data[DOMAIN]["ventilation"] = ventilation
+        ventilation.async_start()
+
+    # Solo se cargan las plataformas con entidades en el inventario; si más
+    # adelante aparece un servicio nuevo, el refresco del inventario carga la suya
+    hass.data[DOMAIN]["platforms"] = []
+    await async_forward_platforms(hass, entry, topology)
+
+    # Primera consulta de todas las ventanas en segundo plano
+    entry.async_create_background_task(
+        hass, async_warm_up(hass, entry, list(coordinators.values())), f"{DOMAIN} warm-up"
+    )
+
+    # Quitar los dispositivos duplicados que antes se registraban por nombre de
+    # ventana o por sensor y que ya no tienen entidades
+    device_registry = async_get_device_registry(hass)
+    entity_registry = async_get_entity_registry(hass)
+    for device in async_entries_for_config_entry(device_registry, entry.entry_id):
+        if any(domain == DOMAIN and identifier in topology.windows for domain, identifier in device.identifiers):
+            continue
+        if not async_entries_for_device(entity_registry, device.id):
+            device_registry.async_remove_device(device.id)
+
+    # Refresco del inventario de la nube en segundo plano
+    refresher = InventoryRefresher(hass, entry)
+    hass.data[DOMAIN]["refresher"] = refresher
+    refresher.async_start()
+    entry.async_create_background_task(
+        hass, refresher.async_background_refresh(), f"{DOMAIN} inventory refresh"
+    )
+
+    async_setup_services(hass)
+
+    hass.data[DOMAIN]["options"] = dict(entry.options)
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+    return True
+
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Recargar la integración al cambiar las opciones."""
+    # Los cambios de `entry.data` (la reautenticación) recargan por su cuenta; el
+    # refresco del inventario escribe en la copia local y no toca la entrada
+    if hass.data.get(DOMAIN, {}).get("options") == dict(entry.options):
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
+    
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Desinstalar la integración."""
+    _LOGGER.info("Desinstalando integración MySmartWindow")
+    
+    platforms = []
+    if DOMAIN in hass.data:
+        async_unload_services(hass)
+        domain_data = hass.data.pop(DOMAIN)
+        platforms = domain_data.get("platforms", [])
+        if "refresher" in domain_data:
+            domain_data["refresher"].async_stop()
+        if "ventilation" in domain_data:
+            domain_data["ventilation"].async_stop()
+        if "snapshot" in domain_data:
+            await domain_data["snapshot"].async_save()
+        if "analytics" in domain_data:
+            await domain_data["analytics"].async_shutdown()
+        for coordinator in domain_data.get("coordinators", {}).values():
+            await coordinator.async_shutdown()
+        if "pool" in domain_data:
+            await domain_data["pool"].async_close()
+    
+    return await hass.config_entries.async_unload_platforms(entry, platforms)
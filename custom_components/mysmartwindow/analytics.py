@@ -0,0 +1,258 @@
+import logging
+import math
+from array import array
+from datetime import timedelta
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from .const import (
+    DOMAIN,
+    COMMANDS,
+    ANALYTICS_INTERVAL,
+    ANALYTICS_SAMPLES,
+    ANALYTICS_OPS,
+    ANALYTICS_THRESHOLDS,
+    SIGNAL_READING,
+)
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy se usan `array` y bucles de Python
+    np = None
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _as_float(value):
+    """Lectura como número, o NaN si falta o no es numérica."""
+    if value is None or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _ratio(total, count):
+    """Media redondeada, o None si no hay lecturas."""
+    return round(total / count, 1) if count else None
+
+
+class ReadingStore:
+    """Lecturas de los sensores de la flota en columnas: op x ventana x muestra.
+
+    Con NumPy es un único `ndarray` y las agregaciones por sala se hacen en
+    una pasada vectorizada (producto por la matriz de pertenencia ventana ->
+    sala); sin NumPy es un `array("d")` plano con el mismo orden y bucles de
+    Python. Los huecos (ventana sin ese sensor o lectura no numérica) son
+    NaN. Cada lectura que llega se guarda en el buffer circular de `samples`
+    posiciones de su ventana y op, con su propio cursor: una ventana con push
+    o consultas más frecuentes llena su buffer antes, sin pisar las demás.
+    """
+
+    def __init__(self, topology, samples=ANALYTICS_SAMPLES):
+        """Crear el almacén vacío para las ventanas del inventario."""
+        self.names = ANALYTICS_OPS
+        self.ops = tuple(COMMANDS[name]["op"] for name in ANALYTICS_OPS)
+        self.thresholds = tuple(ANALYTICS_THRESHOLDS.get(name, math.inf) for name in ANALYTICS_OPS)
+        self.window_ids = tuple(topology.windows)
+        self.columns = {window_id: column for column, window_id in enumerate(self.window_ids)}
+        # Salas como (edificio, sala) por sus claves únicas y sala de cada ventana
+        self.rooms = []
+        self.room_of = array("l")
+        index = {}
+        for window in topology.windows.values():
+            key = (window.room.building.key, window.room.key)
+            if key not in index:
+                index[key] = len(self.rooms)
+                self.rooms.append(key)
+            self.room_of.append(index[key])
+
+        self.samples = samples
+        self.recorded = False
+        # Por op y ventana (op * ventanas + ventana): última posición escrita
+        # (-1 si aún no hay lecturas) y siguiente posición del buffer
+        cells = len(self.ops) * len(self.window_ids)
+        self.latest = array("l", [-1]) * cells
+        self._next = array("l", [0]) * cells
+        shape = (len(self.ops), len(self.window_ids), samples)
+        if np is not None:
+            self.values = np.full(shape, np.nan)
+            self._membership = np.zeros((len(self.window_ids), len(self.rooms)))
+            self._membership[np.arange(len(self.window_ids)), np.asarray(self.room_of, dtype=int)] = 1.0
+        else:
+            self.values = array("d", [math.nan]) * (shape[0] * shape[1] * shape[2])
+
+    def record(self, window_id, values):
+        """Guardar las lecturas de `values` (op -> valor) de una ventana."""
+        column = self.columns.get(window_id)
+        if column is None:
+            return
+        width = len(self.window_ids)
+        for row, op in enumerate(self.ops):
+            if op not in values:
+                continue
+            cell = row * width + column
+            position = self._next[cell]
+            if np is not None:
+                self.values[row, column, position] = _as_float(values[op])
+            else:
+                self.values[cell * self.samples + position] = _as_float(values[op])
+            self.latest[cell] = position
+            self._next[cell] = (position + 1) % self.samples
+            self.recorded = True
+
+    def _reduce_numpy(self, available):
+        """Sumas, cuentas y excesos por op y sala (arrays op x sala)."""
+        values = self.values
+        valid = ~np.isnan(values)
+        thresholds = np.asarray(self.thresholds)[:, None, None]
+        latest = np.asarray(self.latest).reshape(values.shape[:2])
+        current = np.take_along_axis(values, np.maximum(latest, 0)[:, :, None], axis=2)[:, :, 0]
+        current = np.where((latest >= 0) & np.asarray(available, dtype=bool), current, np.nan)
+        current_valid = ~np.isnan(current)
+        membership = self._membership
+        return (
+            np.where(valid, values, 0.0).sum(axis=2) @ membership,
+            valid.sum(axis=2) @ membership,
+            (values > thresholds).sum(axis=2) @ membership,
+            np.where(current_valid, current, 0.0) @ membership,
+            current_valid @ membership,
+        )
+
+    def _reduce_python(self, available):
+        """Lo mismo que `_reduce_numpy` recorriendo el `array` plano."""
+        rooms = len(self.rooms)
+        sums, counts, exceed, current_sums, current_counts = (
+            [[0.0] * rooms for _ in self.ops] for _ in range(5)
+        )
+        values = self.values
+        samples = self.samples
+        width = len(self.window_ids)
+        for row, threshold in enumerate(self.thresholds):
+            for column in range(width):
+                room = self.room_of[column]
+                base = (row * width + column) * samples
+                for value in values[base:base + samples]:
+                    if value == value:  # NaN != NaN
+                        sums[row][room] += value
+                        counts[row][room] += 1
+                        if value > threshold:
+                            exceed[row][room] += 1
+                latest = self.latest[row * width + column]
+                if latest < 0 or not available[column]:
+                    continue
+                value = values[base + latest]
+                if value == value:
+                    current_sums[row][room] += value
+                    current_counts[row][room] += 1
+        return sums, counts, exceed, current_sums, current_counts
+
+    def aggregate(self, available):
+        """Medias móviles, excesos y salas a ventilar, por sala y por edificio.
+
+        `available` indica, en el orden de `window_ids`, qué ventanas responden.
+        Devuelve `{edificio: {"mean", "exceedances", "airing", "rooms"}}` con las
+        claves únicas de edificio y sala; las medias son de todas las lecturas
+        guardadas y la ventilación se decide con la última lectura de las
+        ventanas disponibles de cada sala.
+        """
+        if not self.recorded:
+            return {}
+        if np is not None:
+            sums, counts, exceed, current_sums, current_counts = (
+                matrix.tolist() for matrix in self._reduce_numpy(available)
+            )
+        else:
+            sums, counts, exceed, current_sums, current_counts = self._reduce_python(available)
+
+        result = {}
+        totals = {}
+        for room, (building_key, room_key) in enumerate(self.rooms):
+            building = result.setdefault(
+                building_key, {"mean": {}, "exceedances": {}, "airing": [], "rooms": {}}
+            )
+            building_totals = totals.setdefault(building_key, [[0.0, 0, 0] for _ in self.ops])
+            room_data = {"mean": {}, "current": {}, "exceedances": {}}
+            airing = False
+            for row, name in enumerate(self.names):
+                room_data["mean"][name] = _ratio(sums[row][room], counts[row][room])
+                room_data["current"][name] = _ratio(current_sums[row][room], current_counts[row][room])
+                if name in ANALYTICS_THRESHOLDS:
+                    room_data["exceedances"][name] = int(exceed[row][room])
+                    current = room_data["current"][name]
+                    airing = airing or (current is not None and current > ANALYTICS_THRESHOLDS[name])
+                building_totals[row][0] += sums[row][room]
+                building_totals[row][1] += counts[row][room]
+                building_totals[row][2] += exceed[row][room]
+            room_data["airing"] = airing
+            building["rooms"][room_key] = room_data
+            if airing:
+                building["airing"].append(room_key)
+
+        for building_key, building in result.items():
+            for row, name in enumerate(self.names):
+                total, count, exceeded = totals[building_key][row]
+                building["mean"][name] = _ratio(total, count)
+                if name in ANALYTICS_THRESHOLDS:
+                    building["exceedances"][name] = int(exceeded)
+        return result
+
+
+class FleetAnalytics(DataUpdateCoordinator):
+    """Analítica de ventilación de toda la flota.
+
+    Guarda en un `ReadingStore` cada lectura de los sensores que reciben los
+    coordinadores de las ventanas (consulta o push, anunciada con
+    `SIGNAL_READING`; no se consulta nada más) y cada `ANALYTICS_INTERVAL`
+    segundos calcula los agregados por sala y edificio que publican las
+    entidades de resumen. Si cambia el inventario el almacén se rehace.
+    """
+
+    def __init__(self, hass, coordinators):
+        """Inicializar la analítica sobre los coordinadores de las ventanas."""
+        self._domain_data = hass.data[DOMAIN]
+        self._coordinators = coordinators
+        self._topology = None
+        self._unsub_reading = None
+        self.store = None
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} analytics",
+            update_interval=timedelta(seconds=ANALYTICS_INTERVAL),
+        )
+
+    @callback
+    def async_start(self):
+        """Empezar a guardar las lecturas de las ventanas."""
+        self._unsub_reading = async_dispatcher_connect(self.hass, SIGNAL_READING, self._async_record)
+
+    async def async_shutdown(self):
+        """Dejar de guardar lecturas y detener la analítica."""
+        if self._unsub_reading is not None:
+            self._unsub_reading()
+            self._unsub_reading = None
+        await super().async_shutdown()
+
+    def _current_store(self):
+        """Almacén de la topología actual, rehecho si ha cambiado el inventario."""
+        topology = self._domain_data["topology"]
+        if topology is not self._topology:
+            self._topology = topology
+            self.store = ReadingStore(topology)
+        return self.store
+
+    @callback
+    def _async_record(self, window_id, values):
+        """Guardar una lectura recibida por el coordinador de una ventana."""
+        self._current_store().record(window_id, values)
+
+    async def _async_update_data(self):
+        """Recalcular los agregados con las lecturas guardadas."""
+        store = self._current_store()
+        available = []
+        for window_id in store.window_ids:
+            coordinator = self._coordinators.get(window_id)
+            available.append(coordinator is not None and coordinator.available)
+        return store.aggregate(available)
@@ -0,0 +1,122 @@
+from .const import (
+    BLIND_TRAVEL_TIME,
+    BLIND_TRAVEL_TIME_MIN,
+    BLIND_TRAVEL_TIME_MAX,
+    BLIND_POSITION_TOLERANCE,
+    BLIND_CALIBRATION_MIN_DISTANCE,
+    BLIND_CALIBRATION_WEIGHT,
+)
+
+
+class BlindModel:
+    """Modelo cinemático de una persiana en la escala de HA (0 cerrada, 100 abierta).
+
+    Con la hora de la orden y el tiempo de recorrido completo de subida y de
+    bajada se calcula la posición en cada instante sin consultar la persiana.
+    Al comprobar la posición real (`sync`) se corrige la deriva y se ajusta el
+    tiempo de recorrido del sentido en que se movía (calibración).
+    """
+
+    __slots__ = ("travel_up", "travel_down", "position", "target", "_from", "_checked", "_started", "_travel")
+
+    def __init__(self, position=None, travel_up=BLIND_TRAVEL_TIME, travel_down=BLIND_TRAVEL_TIME):
+        """Inicializar el modelo parado en `position` (None si se desconoce)."""
+        self.travel_up = travel_up
+        self.travel_down = travel_down
+        self.position = position
+        self.target = None
+        self._from = None
+        self._checked = None
+        self._started = 0.0
+        self._travel = travel_up
+
+    @property
+    def moving(self):
+        """Indica si hay un movimiento en curso según el modelo."""
+        return self.target is not None
+
+    @property
+    def opening(self):
+        """Indica si el movimiento en curso es de subida."""
+        return self.target is not None and self.target > self._from
+
+    def position_at(self, now):
+        """Posición estimada en el instante `now` (reloj monotónico)."""
+        if self.target is None:
+            return self.position
+        distance = max(0.0, now - self._started) * 100 / self._travel
+        if self.target > self._from:
+            return min(self.target, self._from + distance)
+        return max(self.target, self._from - distance)
+
+    def arrived(self, now):
+        """Indica si el modelo ya ha llegado al destino."""
+        return self.target is not None and self.position_at(now) == self.target
+
+    def remaining(self, now):
+        """Segundos que le quedan al movimiento según el modelo."""
+        if self.target is None:
+            return 0.0
+        return abs(self.target - self.position_at(now)) * self._travel / 100
+
+    def start(self, target, now):
+        """Empezar a moverse hacia `target` en `now`; devuelve los segundos previstos."""
+        origin = self.position_at(now)
+        if origin is None:
+            origin = 50.0
+        self._from = self._checked = origin
+        self.target = target
+        self._started = now
+        self._travel = self.travel_up if target > origin else self.travel_down
+        return abs(target - origin) * self._travel / 100
+
+    def stop(self, now):
+        """Detener el modelo donde esté en `now`."""
+        self.position = self.position_at(now)
+        self.target = None
+
+    def sync(self, position, now):
+        """Corregir el modelo con la posición leída de la persiana.
+
+        Si había movimiento, calibra el tiempo de recorrido con lo que ha
+        avanzado de verdad: si aún no ha llegado, la velocidad medida es
+        exacta; si ya llegó, solo se sabe que no tardó más (así un modelo
+        lento converge comprobando un poco antes de la llegada prevista).
+        Devuelve True si la persiana sigue en camino hacia el destino.
+        """
+        if self.target is None:
+            self.position = position
+            return False
+
+        elapsed = now - self._started
+        distance = abs(self.target - self._from)
+        progress = (position - self._from) * (1 if self.target > self._from else -1)
+        arrived = abs(position - self.target) <= BLIND_POSITION_TOLERANCE
+        if elapsed > 0:
+            if arrived and distance >= BLIND_CALIBRATION_MIN_DISTANCE:
+                self._calibrate(min(self._travel, elapsed * 100 / distance))
+            elif not arrived and progress >= BLIND_CALIBRATION_MIN_DISTANCE:
+                self._calibrate(elapsed * 100 / progress)
+
+        moved = abs(position - self._checked) > BLIND_POSITION_TOLERANCE
+        if arrived or not moved:
+            # En destino, o parada a medio camino (obstáculo, orden perdida)
+            self.position = position
+            self.target = None
+            return False
+
+        # Sigue en camino: el siguiente tramo parte de la posición real
+        self._from = self._checked = position
+        self._started = now
+        self._travel = self.travel_up if self.target > position else self.travel_down
+        return True
+
+    def _calibrate(self, measured):
+        """Acercar el tiempo de recorrido del sentido actual al medido."""
+        measured = min(BLIND_TRAVEL_TIME_MAX, max(BLIND_TRAVEL_TIME_MIN, measured))
+        travel = round(self._travel + BLIND_CALIBRATION_WEIGHT * (measured - self._travel), 2)
+        if self.target > self._from:
+            self.travel_up = travel
+        else:
+            self.travel_down = travel
+        self._travel = travel
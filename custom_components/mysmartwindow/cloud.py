@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import random
+import aiohttp
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from .const import (
+    CLOUD_API_URL,
+    CLOUD_TIMEOUT,
+    CLOUD_CONNECT_TIMEOUT,
+    CLOUD_RETRIES,
+    CLOUD_RETRY_BACKOFF_BASE,
+    CLOUD_RETRY_BACKOFF_MAX,
+    CLOUD_READ_CHUNK_SIZE,
+    CLOUD_MAX_RESPONSE_SIZE,
+    CLOUD_EXECUTOR_DECODE_SIZE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CloudError(Exception):
+    """La nube no respondió o respondió con un error."""
+
+
+class CloudAuthError(CloudError):
+    """La nube rechazó el token de acceso."""
+
+
+class _TransientError(CloudError):
+    """Error pasajero de la nube (5xx o 429) que merece reintentarse."""
+
+    def __init__(self, status, retry_after=None):
+        """Guardar el código HTTP y el `Retry-After` indicado por la nube."""
+        super().__init__(f"HTTP {status}")
+        self.retry_after = retry_after
+
+
+# Errores tras los que se reintenta la petición
+_RETRYABLE = (_TransientError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+def _retry_after(headers):
+    """Segundos de `Retry-After`, o None si no viene o no es un número."""
+    try:
+        return float(headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class CloudClient:
+    """Cliente de la API en la nube de MySmartWindow.
+
+    Usa la sesión `aiohttp` compartida de HA (conexiones reutilizadas entre
+    peticiones) con un plazo por petición y reintentos con backoff
+    exponencial y jitter ante errores de red, 5xx y 429. Pide la respuesta
+    comprimida con gzip, la lee por bloques con un tamaño máximo y, si es
+    grande, la decodifica fuera del bucle de eventos. Un 401/403 no se
+    reintenta: se lanza `CloudAuthError` para que la entrada pida un token
+    nuevo (reautenticación).
+    """
+
+    def __init__(self, hass, token):
+        """Inicializar el cliente con el token de acceso del usuario."""
+        self.hass = hass
+        self.token = token
+        self.etag = None
+        self.last_modified = None
+        self._session = async_get_clientsession(hass)
+        self._timeout = aiohttp.ClientTimeout(total=CLOUD_TIMEOUT, connect=CLOUD_CONNECT_TIMEOUT)
+
+    async def async_get_buildings(self, conditional=False):
+        """Pedir la lista de edificios del usuario.
+
+        Con `conditional` se envían `If-None-Match`/`If-Modified-Since` de la
+        respuesta anterior y se devuelve None si la nube responde 304.
+        """
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if conditional:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+
+        data, response_headers = await self._async_request(CLOUD_API_URL, headers)
+        if data is None:
+            return None
+        self.etag = response_headers.get("ETag")
+        self.last_modified = response_headers.get("Last-Modified")
+        return data.get("Remote_Data", {}).get("Creator_Buildings", [])
+
+    async def _async_request(self, url, headers):
+        """GET con reintentos; devuelve (JSON, cabeceras) o (None, cabeceras) si es 304."""
+        headers = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate", **headers}
+        for attempt in range(CLOUD_RETRIES + 1):
+            try:
+                return await self._async_get(url, headers)
+            except _RETRYABLE as e:
+                error = e
+            if attempt == CLOUD_RETRIES:
+                break
+            # Backoff exponencial con jitter completo; se respeta el Retry-After de la nube
+            delay = random.uniform(0, min(CLOUD_RETRY_BACKOFF_MAX, CLOUD_RETRY_BACKOFF_BASE * 2 ** attempt))
+            if getattr(error, "retry_after", None):
+                delay = max(delay, min(CLOUD_RETRY_BACKOFF_MAX, error.retry_after))
+            _LOGGER.debug("Reintentando la petición a la nube en %.1f s: %s", delay, error)
+            await asyncio.sleep(delay)
+        raise CloudError(f"la nube no responde: {str(error) or type(error).__name__}") from error
+
+    async def _async_get(self, url, headers):
+        """Una petición GET sin reintentos."""
+        try:
+            async with self._session.get(url, headers=headers, timeout=self._timeout) as response:
+                if response.status == 304:
+                    return None, response.headers
+                if response.status in (401, 403):
+                    raise CloudAuthError(f"token rechazado (HTTP {response.status})")
+                if response.status == 429 or response.status >= 500:
+                    raise _TransientError(response.status, _retry_after(response.headers))
+                if response.status >= 400:
+                    raise CloudError(f"HTTP {response.status}")
+                body = await self._async_read(response)
+                response_headers = response.headers
+        except aiohttp.ClientResponseError as e:
+            raise CloudError(str(e)) from e
+        return await self._async_decode(body), response_headers
+
+    async def _async_read(self, response):
+        """Leer el cuerpo (ya descomprimido por aiohttp) por bloques y con límite de tamaño."""
+        if (response.content_length or 0) > CLOUD_MAX_RESPONSE_SIZE:
+            raise CloudError(f"respuesta demasiado grande ({response.content_length} bytes)")
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(CLOUD_READ_CHUNK_SIZE):
+            body += chunk
+            if len(body) > CLOUD_MAX_RESPONSE_SIZE:
+                raise CloudError(f"respuesta de más de {CLOUD_MAX_RESPONSE_SIZE} bytes")
+        return body
+
+    async def _async_decode(self, body):
+        """Decodificar el JSON; las listas de edificios grandes, en el ejecutor."""
+        try:
+            if len(body) >= CLOUD_EXECUTOR_DECODE_SIZE:
+                data = await self.hass.async_add_executor_job(json.loads, body)
+            else:
+                data = json.loads(body)
+        except ValueError as e:
+            raise CloudError(f"respuesta JSON no válida: {e}") from e
+        if not isinstance(data, dict):
+            raise CloudError("respuesta JSON inesperada")
+        return data
@@ -1,49 +1,188 @@
-import logging
-import aiohttp
-import voluptuous as vol
-from homeassistant import config_entries
-from .const import CLOUD_API_URL, DOMAIN
-
-_LOGGER = logging.getLogger(__name__)
-
-class MySmartWindowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
-    """Flujo de configuración para MySmartWindow."""
-
-    async def async_step_user(self, user_input=None):
-        """Primer paso de configuración."""
-        errors = {}
-
-        schema = vol.Schema({
-            vol.Required("cloud_token"): str,
-        })
-
-        if user_input is not None:
-            cloud_token = user_input.get("cloud_token")
-            devices = await self.get_cloud_devices(cloud_token)
-
-            if devices is None:
-                errors["base"] = "invalid_token"  # Muestra un error si la autenticación falla.
-            else:
-                return self.async_create_entry(
-                    title="MySmartWindow",
-                    data={"cloud_token": cloud_token, "devices": devices},
-                )
-
-        return self.async_show_form(step_id="user", data_schema=schema, errors=errors)
-
-    async def get_cloud_devices(self, cloud_token):
-        """Obtener dispositivos desde la nube usando aiohttp."""
-        try:
-            headers = {"Authorization": f"Bearer {cloud_token}"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(CLOUD_API_URL, headers=headers, timeout=60) as response:
-                    if response.status == 401:
-                        _LOGGER.error("Token inválido. Verifica tus credenciales.")
-                        return None
-
-                    response.raise_for_status()
-                    data = await response.json()
-                    return data.get("Remote_Data", {}).get("Creator_Buildings", [])
-        except Exception as e:
-            _LOGGER.error("Error obteniendo dispositivos: %s", e)
-            return None
+import logging
+import voluptuous as vol
+from homeassistant import config_entries
+from homeassistant.core import callback
+from .cloud import CloudAuthError, CloudClient, CloudError
+from .const import (
+    DOMAIN,
+    CONF_PUSH,
+    DEFAULT_PUSH,
+    CONF_DIAGNOSTIC_SENSORS,
+    DEFAULT_DIAGNOSTIC_SENSORS,
+    CONF_LOG_SAMPLE_RATE,
+    DEFAULT_LOG_SAMPLE_RATE,
+    CONF_COMMAND_DEBOUNCE,
+    DEFAULT_COMMAND_DEBOUNCE,
+    CONF_SENSOR_MAX_INTERVAL,
+    DEFAULT_SENSOR_MAX_INTERVAL,
+    CONF_VENTILATION,
+    DEFAULT_VENTILATION,
+    CONF_VENTILATION_DRY_RUN,
+    DEFAULT_VENTILATION_DRY_RUN,
+    CONF_VENTILATION_ROOMS,
+    DEFAULT_VENTILATION_THRESHOLDS,
+)
+from .snapshot import async_replace_devices
+from .topology import Topology
+from .ventilation import room_key
+
+_LOGGER = logging.getLogger(__name__)
+
+class MySmartWindowConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
+    """Flujo de configuración para MySmartWindow."""
+
+    async def async_step_user(self, user_input=None):
+        """Primer paso de configuración."""
+        errors = {}
+
+        schema = vol.Schema({
+            vol.Required("cloud_token"): str,
+        })
+
+        if user_input is not None:
+            cloud_token = user_input.get("cloud_token")
+            devices, errors = await self.get_cloud_devices(cloud_token)
+
+            if not errors:
+                return self.async_create_entry(
+                    title="MySmartWindow",
+                    data={"cloud_token": cloud_token, "devices": devices},
+                )
+
+        return self.async_show_form(step_id="user", data_schema=schema, errors=errors)
+
+    async def async_step_reauth(self, entry_data):
+        """La nube ha rechazado el token guardado: pedir uno nuevo."""
+        self._reauth_entry = self.hass.config_entries.async_get_entry(self.context["entry_id"])
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(self, user_input=None):
+        """Nuevo token de acceso para una entrada existente."""
+        errors = {}
+        if user_input is not None:
+            cloud_token = user_input["cloud_token"]
+            devices, errors = await self.get_cloud_devices(cloud_token)
+            if not errors:
+                await async_replace_devices(self.hass, self._reauth_entry, devices)
+                return self.async_update_reload_and_abort(
+                    self._reauth_entry,
+                    data={**self._reauth_entry.data, "cloud_token": cloud_token, "devices": devices},
+                    reason="reauth_successful",
+                )
+
+        schema = vol.Schema({vol.Required("cloud_token"): str})
+        return self.async_show_form(step_id="reauth_confirm", data_schema=schema, errors=errors)
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Devolver el flujo de opciones."""
+        return MySmartWindowOptionsFlow()
+
+    async def get_cloud_devices(self, cloud_token):
+        """Obtener los edificios de la nube; devuelve (edificios, errores del formulario)."""
+        try:
+            return await CloudClient(self.hass, cloud_token).async_get_buildings(), {}
+        except CloudAuthError:
+            _LOGGER.error("Token inválido. Verifica tus credenciales.")
+            return None, {"base": "invalid_token"}
+        except CloudError as e:
+            _LOGGER.error("Error obteniendo dispositivos: %s", e)
+            return None, {"base": "cannot_connect"}
+
+
+class MySmartWindowOptionsFlow(config_entries.OptionsFlow):
+    """Flujo de opciones para MySmartWindow."""
+
+    async def async_step_init(self, user_input=None):
+        """Opciones generales; con la ventilación activada se pasa a sus umbrales."""
+        if user_input is not None:
+            self._options = {**self.config_entry.options, **user_input}
+            if user_input.get(CONF_VENTILATION):
+                return await self.async_step_ventilation()
+            return self.async_create_entry(title="", data=self._options)
+
+        options = self.config_entry.options
+        schema = vol.Schema({
+            vol.Optional(CONF_PUSH, default=options.get(CONF_PUSH, DEFAULT_PUSH)): bool,
+            vol.Optional(
+                CONF_DIAGNOSTIC_SENSORS,
+                default=options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS),
+            ): bool,
+            vol.Optional(
+                CONF_LOG_SAMPLE_RATE,
+                default=options.get(CONF_LOG_SAMPLE_RATE, DEFAULT_LOG_SAMPLE_RATE),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(
+                CONF_COMMAND_DEBOUNCE,
+                default=options.get(CONF_COMMAND_DEBOUNCE, DEFAULT_COMMAND_DEBOUNCE),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+            vol.Optional(
+                CONF_SENSOR_MAX_INTERVAL,
+                default=options.get(CONF_SENSOR_MAX_INTERVAL, DEFAULT_SENSOR_MAX_INTERVAL),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=86400)),
+            vol.Optional(CONF_VENTILATION, default=options.get(CONF_VENTILATION, DEFAULT_VENTILATION)): bool,
+            vol.Optional(
+                CONF_VENTILATION_DRY_RUN,
+                default=options.get(CONF_VENTILATION_DRY_RUN, DEFAULT_VENTILATION_DRY_RUN),
+            ): bool,
+        })
+
+        return self.async_show_form(step_id="init", data_schema=schema)
+
+    async def async_step_ventilation(self, user_input=None):
+        """Elegir la sala cuyos umbrales de ventilación se quieren cambiar (o ninguna)."""
+        topology = await self._async_topology()
+        rooms = sorted(
+            room_key(room)
+            for building in (topology.buildings if topology else ())
+            for room in building.rooms
+        )
+        if user_input is not None or not rooms:
+            self._room = (user_input or {}).get("room")
+            if self._room:
+                return await self.async_step_ventilation_room()
+            return self.async_create_entry(title="", data=self._options)
+
+        schema = vol.Schema({vol.Optional("room"): vol.In(rooms)})
+        return self.async_show_form(step_id="ventilation", data_schema=schema)
+
+    async def _async_topology(self):
+        """Inventario actual; si la integración no está cargada se pide a la nube."""
+        topology = self.hass.data.get(DOMAIN, {}).get("topology")
+        if topology is not None:
+            return topology
+        try:
+            devices = await CloudClient(self.hass, self.config_entry.data["cloud_token"]).async_get_buildings()
+        except CloudError as e:
+            _LOGGER.warning("No se pudo obtener el inventario de la nube: %s", e)
+            devices = self.config_entry.data.get("devices", [])
+        return Topology(devices)
+
+    async def async_step_ventilation_room(self, user_input=None):
+        """Umbrales de microventilación y apertura de la sala elegida."""
+        rooms = dict(self._options.get(CONF_VENTILATION_ROOMS, {}))
+        current = {**DEFAULT_VENTILATION_THRESHOLDS, **rooms.get(self._room, {})}
+        errors = {}
+        if user_input is not None:
+            thresholds = {
+                name: [user_input[f"{name.lower()}_micro"], user_input[f"{name.lower()}_open"]]
+                for name in DEFAULT_VENTILATION_THRESHOLDS
+            }
+            if all(micro <= full for micro, full in thresholds.values()):
+                rooms[self._room] = thresholds
+                self._options[CONF_VENTILATION_ROOMS] = rooms
+                return self.async_create_entry(title="", data=self._options)
+            errors["base"] = "invalid_thresholds"
+            current = thresholds
+
+        fields = {}
+        for name, (micro, full) in current.items():
+            fields[vol.Required(f"{name.lower()}_micro", default=micro)] = vol.Coerce(float)
+            fields[vol.Required(f"{name.lower()}_open", default=full)] = vol.Coerce(float)
+        return self.async_show_form(
+            step_id="ventilation_room",
+            data_schema=vol.Schema(fields),
+            errors=errors,
+            description_placeholders={"room": self._room},
+        )
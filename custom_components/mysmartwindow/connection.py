@@ -0,0 +1,332 @@
+import logging
+import asyncio
+import socket
+import time
+from collections import deque
+from datetime import timedelta
+from homeassistant.helpers.event import async_track_time_interval
+from .const import (
+    CONNECT_TIMEOUT,
+    REQUEST_TIMEOUT,
+    PROBE_TIMEOUT,
+    IDLE_TIMEOUT,
+    MAX_IN_FLIGHT_REQUESTS,
+    POOL_MAINTENANCE_INTERVAL,
+    READ_CHUNK_SIZE,
+    RECONNECT_BACKOFF_BASE,
+    RECONNECT_BACKOFF_MAX,
+)
+from .metrics import DeviceMetrics
+from .protocol import FrameDecoder
+
+_LOGGER = logging.getLogger(__name__)
+
+class DeviceConnection:
+    """Conexión TCP persistente con una ventana, con reconexión y backoff.
+
+    Las peticiones a una misma ventana se atienden de una en una y en orden
+    de llegada (`asyncio.Lock` es FIFO): la siguiente no se envía hasta que
+    llega la respuesta de la anterior. Además cada petición ocupa un hueco
+    del límite global del pool mientras está en curso.
+
+    Una tarea lectora por socket entrega cada trama decodificada a la
+    petición que la espera, emparejándolas por su `op`; las tramas que no
+    corresponden a ninguna petición pendiente (estado enviado por la propia
+    ventana) se pasan a `push_listener`, sin desplazar las respuestas.
+    """
+
+    def __init__(self, ip, port, limiter=None):
+        """Inicializar la conexión (todavía sin abrir el socket)."""
+        self.ip = ip
+        self.port = port
+        self.push_listener = None
+        self._limiter = limiter or asyncio.Semaphore(1)
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._decoder = FrameDecoder()
+        self.metrics = DeviceMetrics()
+        self._waiters = deque()
+        self._lock = asyncio.Lock()
+        self._last_used = 0.0
+        self._failures = 0
+        self._retry_at = 0.0
+
+    @property
+    def connected(self):
+        """Indica si el socket está abierto y el otro extremo no lo ha cerrado."""
+        return (
+            self._writer is not None
+            and not self._writer.is_closing()
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+    @property
+    def busy(self):
+        """Indica si hay una petición en curso."""
+        return self._lock.locked()
+
+    @property
+    def decode_errors(self):
+        """Tramas descartadas por JSON inválido o demasiado largas."""
+        return self._decoder.errors
+
+    @property
+    def keep_open(self):
+        """Indica si el socket debe mantenerse abierto para recibir tramas push."""
+        return self.push_listener is not None
+
+    @property
+    def idle(self):
+        """Indica si la conexión lleva más de `IDLE_TIMEOUT` sin usarse."""
+        if self.keep_open:
+            return False
+        return time.monotonic() - self._last_used > IDLE_TIMEOUT
+
+    async def _async_connect(self):
+        """Abrir el socket respetando el backoff tras fallos consecutivos."""
+        now = time.monotonic()
+        if now < self._retry_at:
+            raise ConnectionError(
+                f"Reconexión a {self.ip}:{self.port} en espera {self._retry_at - now:.1f}s"
+            )
+
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, self.port), timeout=CONNECT_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError):
+            self.metrics.connect_failures += 1
+            self._failures += 1
+            backoff = min(RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_BASE * 2 ** (self._failures - 1))
+            self._retry_at = time.monotonic() + backoff
+            raise
+
+        self.metrics.observe_connect(time.monotonic() - now)
+        self._failures = 0
+        self._retry_at = 0.0
+        sock = self._writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._reader_task = asyncio.get_running_loop().create_task(
+            self._async_read_loop(self._reader)
+        )
+        _LOGGER.debug("Conexión abierta con %s:%s", self.ip, self.port)
+
+    async def _async_read_loop(self, reader):
+        """Leer el socket y repartir las tramas entre peticiones y push."""
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                self.metrics.bytes_in += len(data)
+                for frame in self._decoder.feed(data):
+                    self._dispatch_frame(frame)
+        except OSError as e:
+            _LOGGER.debug("Error leyendo de %s: %s", self.ip, e)
+        finally:
+            # Las peticiones pendientes no van a recibir respuesta por este socket
+            self._cancel_waiters()
+
+    def _dispatch_frame(self, frame):
+        """Entregar una trama a la petición pendiente de su `op` o al listener push.
+
+        Una trama sin `op` se entrega a la petición más antigua (orden de envío).
+        """
+        op = frame.get("op") if isinstance(frame, dict) else None
+        for index, (waiter_op, waiter) in enumerate(self._waiters):
+            if waiter.done():
+                continue
+            if op is None or waiter_op is None or waiter_op == op:
+                del self._waiters[index]
+                waiter.set_result(frame)
+                return
+        # Sin petición de ese op: se purgan las ya resueltas o canceladas
+        while self._waiters and self._waiters[0][1].done():
+            self._waiters.popleft()
+
+        if self.push_listener is None:
+            _LOGGER.debug("Descartando trama no solicitada de %s: %s", self.ip, frame)
+            return
+        try:
+            self.push_listener(frame)
+        except Exception as e:
+            _LOGGER.error("Error procesando trama push de %s: %s", self.ip, e)
+
+    def _cancel_waiters(self):
+        """Cancelar las peticiones que esperan respuesta."""
+        while self._waiters:
+            self._waiters.popleft()[1].cancel()
+
+    def _close(self):
+        """Cerrar el socket sin esperar (la próxima petición reconecta)."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._decoder.reset()
+        self._cancel_waiters()
+
+    async def async_close(self):
+        """Cerrar la conexión esperando a que el socket termine."""
+        writer = self._writer
+        self._close()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def async_ensure_connected(self):
+        """Abrir el socket si no lo está (para recibir tramas push)."""
+        async with self._lock:
+            if not self.connected:
+                self._close()
+                await self._async_connect()
+
+    def _observe(self, waiter, op, sent):
+        """Registrar la latencia de una respuesta cuando llega."""
+        if not waiter.cancelled():
+            self.metrics.observe_response(op, time.monotonic() - sent)
+
+    async def _async_exchange(self, payloads, partial=False, ops=None, timeout=REQUEST_TIMEOUT, probe=False):
+        """Enviar las peticiones por el socket persistente y esperar sus respuestas.
+
+        Si el socket reutilizado estaba muerto se reintenta una vez con una
+        conexión nueva. Con `partial` se devuelven las respuestas recibidas
+        aunque la ventana deje de contestar a mitad del lote. `ops` indica la
+        operación de cada petición para las métricas de latencia. Con `probe`
+        un plazo vencido no cuenta como timeout de la ventana.
+        """
+        if ops is None:
+            ops = [None] * len(payloads)
+        data = b"".join(payloads)
+        async with self._lock:
+            for _ in range(2):
+                reused = self.connected and not self.idle
+                if not reused:
+                    self._close()
+                    await self._async_connect()
+
+                loop = asyncio.get_running_loop()
+                sent = time.monotonic()
+                waiters = []
+                for op in ops:
+                    waiter = loop.create_future()
+                    waiter.add_done_callback(lambda w, op=op: self._observe(w, op, sent))
+                    waiters.append(waiter)
+                self._waiters.extend(zip(ops, waiters))
+                try:
+                    # La conexión se abre fuera del límite global: una ventana
+                    # que no contesta al conectar no ocupa hueco de las demás
+                    async with self._limiter:
+                        self._writer.write(data)
+                        self.metrics.bytes_out += len(data)
+                        await self._writer.drain()
+                        await asyncio.wait(waiters, timeout=timeout)
+                except OSError:
+                    self._close()
+                    if not reused:
+                        raise
+                    continue
+                except asyncio.CancelledError:
+                    self._close()
+                    raise
+
+                frames = []
+                error = None
+                for waiter in waiters:
+                    if not waiter.done():
+                        error = asyncio.TimeoutError()
+                        break
+                    if waiter.cancelled():
+                        error = ConnectionResetError("Conexión cerrada por la ventana")
+                        break
+                    frames.append(waiter.result())
+
+                if error is None:
+                    self._last_used = time.monotonic()
+                    return frames
+
+                # Una respuesta tardía llegaría cruzada con la siguiente petición
+                if isinstance(error, asyncio.TimeoutError) and not probe:
+                    self.metrics.timeouts += 1
+                self._close()
+                if partial and frames:
+                    return frames
+                if isinstance(error, asyncio.TimeoutError) or not reused:
+                    raise error
+
+            raise ConnectionResetError("Conexión cerrada por la ventana")
+
+    async def async_request(self, payload, op=None):
+        """Enviar una petición y devolver la respuesta decodificada."""
+        return (await self._async_exchange([payload], ops=[op]))[0]
+
+    async def async_probe(self, payload, op=None):
+        """Petición de prueba con un plazo corto (`PROBE_TIMEOUT`).
+
+        Sirve para comprobar si la ventana entiende una trama: si no contesta
+        se lanza `asyncio.TimeoutError` sin contarlo en las métricas.
+        """
+        return (await self._async_exchange([payload], ops=[op], timeout=PROBE_TIMEOUT, probe=True))[0]
+
+    async def async_request_many(self, payloads, ops=None):
+        """Enviar varias peticiones seguidas por el mismo socket (pipelining).
+
+        Devuelve las respuestas decodificadas en el orden de envío. Si la
+        ventana deja de responder a mitad del lote se devuelven solo las que
+        llegaron, para que el llamante pueda pedir el resto una a una.
+        """
+        return await self._async_exchange(payloads, partial=True, ops=ops)
+
+
+class ConnectionPool:
+    """Conexiones persistentes compartidas, una por `(Ip, puerto)`."""
+
+    def __init__(self, hass, max_in_flight=MAX_IN_FLIGHT_REQUESTS):
+        """Inicializar el pool."""
+        self.hass = hass
+        self._connections = {}
+        # Límite global de peticiones en curso: evita la avalancha al arrancar
+        self._limiter = asyncio.Semaphore(max_in_flight)
+        self._unsub_maintain = async_track_time_interval(
+            hass, self._async_maintain, timedelta(seconds=POOL_MAINTENANCE_INTERVAL)
+        )
+
+    def get(self, ip, port):
+        """Devuelve la conexión de `(ip, port)`, creándola si no existe."""
+        key = (ip, port)
+        connection = self._connections.get(key)
+        if connection is None:
+            connection = self._connections[key] = DeviceConnection(ip, port, self._limiter)
+        return connection
+
+    async def _async_maintain(self, _now=None):
+        """Cerrar las conexiones sin uso y reabrir las que escuchan tramas push."""
+        for connection in list(self._connections.values()):
+            if connection.busy:
+                continue
+            if connection.keep_open and not connection.connected:
+                try:
+                    await connection.async_ensure_connected()
+                except (OSError, asyncio.TimeoutError) as e:
+                    _LOGGER.debug("No se pudo reabrir la conexión push con %s: %s", connection.ip, e)
+            elif connection.connected and connection.idle:
+                await connection.async_close()
+
+    async def async_prune(self, in_use):
+        """Cerrar y olvidar las conexiones cuyo `(Ip, puerto)` no está en `in_use`."""
+        unused = [key for key in self._connections if key not in in_use]
+        await asyncio.gather(*(self._connections.pop(key).async_close() for key in unused))
+
+    async def async_close(self):
+        """Cerrar todas las conexiones del pool."""
+        self._unsub_maintain()
+        await asyncio.gather(*(c.async_close() for c in self._connections.values()))
+        self._connections.clear()
@@ -1,37 +1,174 @@
-DOMAIN = "mysmartwindow"
-
-# URLs de la API en la nube
-CLOUD_API_URL = "https://www.mysmartwindow.com:33332/hope/v3/users/buildings"
-
-# Configuración de la API
-POLLING_INTERVAL = 15  # En segundos
-HEADERS = {"Content-Type": "application/json"}
-
-# Códigos de operación para los dispositivos
-COMMANDS = {
-    "LED ON": {"op": 60},
-    "LED OFF": {"op": 61},
-    "LED STATE": {"op": 66},
-    "LED COLOR SELECTION": {"op": 65},
-    "LED COLOR STATE": {"op": 68},
-    "WINDOW OPEN": {"op": 54},
-    "WINDOW CLOSE": {"op": 53},
-    "WINDOW STATE": {"op": 55},
-    "WINDOW MICRO OPEN": {"op": 73},
-    "WINDOW MICRO STATE": {"op": 74},
-    "BLIND UP": {"op": 7},
-    "BLIND DOWN": {"op": 8},
-    "BLIND STOP": {"op": 9},
-    "BLIND STATE": {"op": 6},
-    "BLIND POSITION UNIT": {"op": 63},
-    "TEMPERATURE": {"op": 4},
-    "HUMEDITY": {"op": 5},
-    "Co2": {"op": 58},
-    "VOC": {"op": 59},
-    "IAQ": {"op": 71},
-    "BAROMETRO": {"op": 72},
-    "OP_SENSORS": {"op": 62}
-}
-
-# Puerto para comunicación por socket (si aplica)
-SOCKET_PORT = 443
\ No newline at end of file
+DOMAIN = "mysmartwindow"
+
+# URLs de la API en la nube
+CLOUD_API_URL = "https://www.mysmartwindow.com:33332/hope/v3/users/buildings"
+CLOUD_TIMEOUT = 30  # Plazo total por petición, en segundos
+CLOUD_CONNECT_TIMEOUT = 10  # En segundos
+# Reintentos ante errores de red, 5xx y 429: backoff exponencial con jitter (segundos)
+CLOUD_RETRIES = 2
+CLOUD_RETRY_BACKOFF_BASE = 1
+CLOUD_RETRY_BACKOFF_MAX = 30
+CLOUD_READ_CHUNK_SIZE = 65536  # En bytes
+CLOUD_MAX_RESPONSE_SIZE = 32 * 1024 * 1024  # En bytes
+CLOUD_EXECUTOR_DECODE_SIZE = 256 * 1024  # Respuestas mayores se decodifican fuera del bucle
+
+# Actualización del inventario de edificios en segundo plano
+INVENTORY_REFRESH_INTERVAL = 3600  # En segundos
+SIGNAL_INVENTORY = f"{DOMAIN}_inventory_{{}}"
+# Si una ventana rechaza su `Bearer` se vuelve a pedir el inventario, como mucho una vez por periodo
+BEARER_REFRESH_COOLDOWN = 300  # En segundos
+
+# Copia local del inventario y del último estado de las ventanas
+SNAPSHOT_SAVE_DELAY = 60  # En segundos
+
+# Primera consulta al arrancar: todas las ventanas a la vez, escalonadas al azar
+# dentro de STARTUP_STAGGER segundos (las que tienen estado guardado, después) y
+# con un plazo global tras el que el arranque se da por terminado
+STARTUP_STAGGER = 2  # En segundos
+STARTUP_BUDGET = 15  # En segundos
+
+# Configuración de la API
+POLLING_INTERVAL = 15  # En segundos
+
+# Consulta adaptativa: rápida mientras la persiana o la ventana se mueven y
+# con backoff exponencial hasta el intervalo de reposo cuando están quietas
+FAST_POLLING_INTERVAL = 1  # En segundos
+IDLE_POLLING_INTERVAL = 60  # En segundos
+MOTION_SETTLE_POLLS = 2  # Consultas seguidas sin cambios, ya visto el movimiento, para darlo por terminado
+MOTION_MAX_DURATION = 120  # En segundos
+HEADERS = {"Content-Type": "application/json"}
+
+# Códigos de operación para los dispositivos
+COMMANDS = {
+    "LED ON": {"op": 60},
+    "LED OFF": {"op": 61},
+    "LED STATE": {"op": 66},
+    "LED COLOR SELECTION": {"op": 65},
+    "LED COLOR STATE": {"op": 68},
+    "WINDOW OPEN": {"op": 54},
+    "WINDOW CLOSE": {"op": 53},
+    "WINDOW STATE": {"op": 55},
+    "WINDOW MICRO OPEN": {"op": 73},
+    "WINDOW MICRO STATE": {"op": 74},
+    "BLIND UP": {"op": 7},
+    "BLIND DOWN": {"op": 8},
+    "BLIND STOP": {"op": 9},
+    "BLIND STATE": {"op": 6},
+    "BLIND POSITION UNIT": {"op": 63},
+    "TEMPERATURE": {"op": 4},
+    "HUMEDITY": {"op": 5},
+    "Co2": {"op": 58},
+    "VOC": {"op": 59},
+    "IAQ": {"op": 71},
+    "BAROMETRO": {"op": 72},
+    "OP_SENSORS": {"op": 62}
+}
+
+# Escala de posición de la persiana en la ventana (0 abierta, 120 cerrada)
+BLIND_POSITION_MAX = 120
+# Modelo de la persiana: tiempo de recorrido completo (se calibra con el uso),
+# comprobaciones de la posición real y refresco de la posición estimada
+BLIND_TRAVEL_TIME = 25  # En segundos
+BLIND_TRAVEL_TIME_MIN = 3
+BLIND_TRAVEL_TIME_MAX = 180
+BLIND_CALIBRATION_WEIGHT = 0.5  # Peso de cada medida nueva
+BLIND_CALIBRATION_MIN_DISTANCE = 10  # Recorrido mínimo (0-100) para calibrar
+BLIND_POSITION_TOLERANCE = 2  # Margen (0-100) para dar por alcanzado el destino
+BLIND_CHECK_FRACTION = 0.5  # Primera comprobación a mitad del tiempo previsto
+BLIND_SETTLE_TIME = 1  # Segundos de margen tras la llegada prevista o una parada
+BLIND_UPDATE_INTERVAL = 0.5  # Segundos entre actualizaciones de la posición estimada
+
+# Puerto para comunicación por socket (si aplica)
+SOCKET_PORT = 443
+
+# Conexiones persistentes con las ventanas (en segundos)
+CONNECT_TIMEOUT = 10
+REQUEST_TIMEOUT = 10
+PROBE_TIMEOUT = 1  # Prueba de tramas compactas: un firmware que no las entiende no contesta
+IDLE_TIMEOUT = 60
+READ_CHUNK_SIZE = 4096  # En bytes
+POOL_MAINTENANCE_INTERVAL = 30
+
+# Máximo de peticiones por socket en curso a la vez entre todas las ventanas
+MAX_IN_FLIGHT_REQUESTS = 16
+RECONNECT_BACKOFF_BASE = 1
+RECONNECT_BACKOFF_MAX = 60
+# Cortocircuito: fallos seguidos antes de marcar la ventana como no disponible
+# y backoff exponencial (segundos) de las pruebas mientras no responde
+HEALTH_FAILURE_THRESHOLD = 3
+HEALTH_PROBE_BACKOFF_BASE = 15
+HEALTH_PROBE_BACKOFF_MAX = 600
+
+# Estado optimista: plazo para que la ventana confirme un comando antes de deshacerlo
+COMMAND_CONFIRM_TIMEOUT = 5  # En segundos
+EVENT_COMMAND_FAILED = f"{DOMAIN}_command_failed"
+
+# Agrupación de comandos: dentro de la ventana de espera un comando sustituye
+# al pendiente del mismo tipo (solo se envía la última posición o color)
+CONF_COMMAND_DEBOUNCE = "command_debounce"
+DEFAULT_COMMAND_DEBOUNCE = 0.3  # En segundos
+COMMAND_SLOTS = {
+    "BLIND UP": "blind",
+    "BLIND DOWN": "blind",
+    "BLIND STOP": "blind",
+    "BLIND POSITION UNIT": "blind",
+    "LED ON": "led",
+    "LED OFF": "led",
+    "LED COLOR SELECTION": "led_color",
+    "WINDOW OPEN": "window",
+    "WINDOW CLOSE": "window",
+    "WINDOW MICRO OPEN": "window",
+}
+
+# Servicio de comandos en bloque
+SERVICE_BULK_COMMAND = "bulk_command"
+BULK_MAX_CONCURRENCY = 16  # Ventanas a las que se envía a la vez
+
+# Modo push: la ventana envía su estado por el socket persistente
+CONF_PUSH = "push"
+DEFAULT_PUSH = False
+PUSH_POLLING_INTERVAL = 300  # Consulta de respaldo con push activo (segundos)
+SIGNAL_PUSH = f"{DOMAIN}_push_{{}}"
+# Comandos encolados para una ventana (los sigue el modelo de la persiana)
+SIGNAL_COMMAND = f"{DOMAIN}_command_{{}}"
+
+# Diagnóstico: sensores de diagnóstico por ventana y muestreo del registro en debug
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+DEFAULT_DIAGNOSTIC_SENSORS = False
+CONF_LOG_SAMPLE_RATE = "log_sample_rate"
+DEFAULT_LOG_SAMPLE_RATE = 0  # Registrar 1 de cada N ciclos de consulta (0 = nunca)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Sensores: solo se escribe el estado si cambia más que la banda muerta del
+# sensor (ver `sensor.SENSOR_DESCRIPTIONS`) o si pasa el intervalo máximo
+CONF_SENSOR_MAX_INTERVAL = "sensor_max_interval"
+DEFAULT_SENSOR_MAX_INTERVAL = 300  # En segundos (0 = solo por cambio)
+# Historial en memoria de cada sensor para los atributos min/max/mean
+SENSOR_HISTORY_SIZE = 256  # Lecturas
+SENSOR_STATS_WINDOW = 3600  # En segundos
+
+# Analítica de la flota: se guarda cada lectura de los sensores y los agregados se recalculan por intervalo
+ANALYTICS_INTERVAL = 60  # En segundos
+ANALYTICS_SAMPLES = 240  # Últimas lecturas guardadas por ventana y op (una hora a POLLING_INTERVAL)
+SIGNAL_READING = f"{DOMAIN}_reading"
+ANALYTICS_OPS = ("Co2", "VOC", "IAQ", "HUMEDITY", "TEMPERATURE")
+# Por encima de estos valores una sala necesita ventilación
+ANALYTICS_THRESHOLDS = {"Co2": 1000, "VOC": 250, "IAQ": 150}
+
+# Control automático de ventilación por sala (opcional; en simulación por defecto)
+CONF_VENTILATION = "ventilation"
+DEFAULT_VENTILATION = False
+CONF_VENTILATION_DRY_RUN = "ventilation_dry_run"
+DEFAULT_VENTILATION_DRY_RUN = True
+# Umbrales por sala: "Edificio / Sala" -> {sensor: (microventilar, abrir)}
+CONF_VENTILATION_ROOMS = "ventilation_rooms"
+DEFAULT_VENTILATION_THRESHOLDS = {
+    "Co2": (1000, 1400),
+    "VOC": (250, 350),
+    "IAQ": (150, 200),
+    "HUMEDITY": (70, 80),
+}
+VENTILATION_HYSTERESIS = 0.1  # Para bajar de nivel hay que quedar un 10 % por debajo del umbral
+VENTILATION_MIN_DWELL = 300  # Segundos mínimos entre dos cambios de nivel de una sala
+VENTILATION_MAX_ACTIONS = 6  # Cambios de nivel por sala y hora como máximo
+EVENT_VENTILATION = f"{DOMAIN}_ventilation"
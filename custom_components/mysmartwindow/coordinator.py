@@ -0,0 +1,525 @@
+import logging
+import asyncio
+import time
+from datetime import timedelta
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from .const import (
+    DOMAIN,
+    COMMANDS,
+    POLLING_INTERVAL,
+    FAST_POLLING_INTERVAL,
+    IDLE_POLLING_INTERVAL,
+    MOTION_SETTLE_POLLS,
+    MOTION_MAX_DURATION,
+    PUSH_POLLING_INTERVAL,
+    SIGNAL_PUSH,
+    SIGNAL_COMMAND,
+    SIGNAL_READING,
+    COMMAND_CONFIRM_TIMEOUT,
+    COMMAND_SLOTS,
+    DEFAULT_COMMAND_DEBOUNCE,
+    EVENT_COMMAND_FAILED,
+)
+from .health import HealthTracker
+from .protocol import FrameBuilder
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def window_state_ops(window):
+    """Devuelve los códigos de operación de estado que hay que consultar para una ventana."""
+    ops = [COMMANDS["BLIND STATE"]["op"]]
+
+    if "S9" in window.services:
+        ops.append(COMMANDS["LED STATE"]["op"])
+        ops.append(COMMANDS["LED COLOR STATE"]["op"])
+    if "S5" in window.services:
+        ops.append(COMMANDS["WINDOW STATE"]["op"])
+
+    for sensor in window.sensors:
+        if sensor.op is not None and sensor.op not in ops:
+            ops.append(sensor.op)
+
+    return ops
+
+
+class MySmartWindowCoordinator(DataUpdateCoordinator):
+    """Coordinador que consulta en un único ciclo todos los estados de una ventana."""
+
+    def __init__(self, hass, connection, window):
+        """Inicializar el coordinador de la ventana."""
+        self.connection = connection
+        self.window = window
+        self.window_id = window.window_id
+        self.ip = connection.ip
+        self.bearer = window.bearer
+        self.ops = window_state_ops(window)
+        # Tramas pre-serializadas; tras la primera consulta correcta se prueba
+        # una vez por conexión si la ventana admite la codificación compacta
+        self._frames = FrameBuilder(self.bearer, self.ops)
+        self._compact_tested = False
+        # Se desactiva si la ventana no contesta a varias peticiones seguidas
+        self._pipelining = True
+        # Operaciones en movimiento: op -> último valor leído
+        self._motion = {}
+        # Movimientos ya en marcha (cambió la lectura o llegó al valor esperado)
+        self._motion_seen = set()
+        self._motion_started = 0.0
+        self._stable_polls = 0
+        self._last_full_poll = 0.0
+        self._last_push = None
+        self._unsub_push = None
+        # Valores optimistas pendientes de confirmar: op -> valor esperado
+        self._optimistic = {}
+        # Comandos agrupados antes de enviarse: tipo -> (nombre, args)
+        self.command_debounce = DEFAULT_COMMAND_DEBOUNCE
+        self._pending_commands = {}
+        self._pending_expected = {}
+        self._pending_previous = {}
+        self._pending_result = None
+        self._unsub_flush = None
+        # Registro en debug de 1 de cada N ciclos de consulta (0 = desactivado)
+        self.log_sample_rate = 0
+        self._polls = 0
+        # Cortocircuito: tras varios fallos seguidos no se consulta hasta la próxima prueba
+        self.health = HealthTracker(window.full_name)
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {window.full_name}",
+            update_interval=timedelta(seconds=POLLING_INTERVAL),
+        )
+
+    @callback
+    def async_update_window(self, window, connection):
+        """Aplicar los cambios del inventario (IP, token, servicios o sensores)."""
+        self.window = window
+        self.bearer = window.bearer
+        self.ops = window_state_ops(window)
+        if connection is self.connection:
+            self._frames = FrameBuilder(self.bearer, self.ops, self._frames.compact)
+            return
+
+        push = self._unsub_push is not None
+        if push:
+            self._unsub_push()
+            self._unsub_push = None
+            self.connection.push_listener = None
+        self.connection = connection
+        self.ip = connection.ip
+        self._pipelining = True
+        self._frames = FrameBuilder(self.bearer, self.ops)
+        self._compact_tested = False
+        if push:
+            self.async_enable_push()
+
+    def _build_frame(self, op, args=None):
+        """Trama de una operación, pre-serializada por `FrameBuilder`."""
+        return self._frames.build(op, args)
+
+    @property
+    def frame_encoding(self):
+        """Codificación de las tramas enviadas a la ventana ("compact" o "plain")."""
+        return "compact" if self._frames.compact else "plain"
+
+    async def _async_negotiate_encoding(self):
+        """Probar si la ventana entiende las tramas compactas (JSON sin espacios).
+
+        Se envía una lectura en formato compacto con un plazo corto; si la
+        ventana contesta con su valor se pasa a usarlo, y si no se sigue con
+        el formato de siempre. Que no conteste no es un fallo de la ventana:
+        no cuenta como timeout ni para el cortocircuito.
+        """
+        op = self.ops[0]
+        try:
+            reply = await self.connection.async_probe(FrameBuilder(self.bearer, compact=True).build(op), op)
+        except (OSError, asyncio.TimeoutError):
+            reply = None
+        if isinstance(reply, dict) and "value" in reply:
+            _LOGGER.debug("La ventana %s admite tramas compactas", self.ip)
+            self._frames = FrameBuilder(self.bearer, self.ops, compact=True)
+        else:
+            _LOGGER.debug("La ventana %s no admite tramas compactas; se envía JSON normal", self.ip)
+
+    async def async_send(self, op, args=None):
+        """Enviar una operación a la ventana y devolver su respuesta decodificada."""
+        return await self.connection.async_request(self._build_frame(op, args), op)
+
+    async def async_send_command(self, command, args=None):
+        """Enviar un comando de `COMMANDS` por su nombre; devuelve None si falla."""
+        if command not in COMMANDS:
+            _LOGGER.error("Comando desconocido: %s", command)
+            return None
+
+        try:
+            return await self.async_send(COMMANDS[command]["op"], args)
+        except Exception as e:
+            _LOGGER.error("Error enviando comando %s a %s: %s", command, self.ip, e)
+            return None
+
+    @callback
+    def async_command(self, commands, expected=None):
+        """Encolar comandos y aplicar su efecto de forma optimista sin esperar a la ventana.
+
+        `commands` es una lista de `(nombre, args)`; `expected` indica, en
+        unidades de la ventana, el valor que tendrán las operaciones de estado
+        (op -> valor). Esos valores se publican al momento y se mantienen hasta
+        que la ventana confirma el comando; si no lo confirma en
+        `COMMAND_CONFIRM_TIMEOUT` se restauran los anteriores y se lanza el
+        evento `EVENT_COMMAND_FAILED`.
+
+        Los comandos se agrupan durante `command_debounce` segundos: dentro de
+        esa ventana un comando sustituye al pendiente del mismo tipo
+        (`COMMAND_SLOTS`), de modo que al arrastrar el deslizador solo se envía
+        la última posición y subir seguido de parar deja solo la parada.
+
+        Devuelve un futuro que se resuelve con None cuando la ventana confirma
+        el grupo de comandos, o con el error si no lo confirma. Los comandos se
+        anuncian con `SIGNAL_COMMAND` para que las entidades con estado propio
+        (el modelo de la persiana) los sigan aunque vengan de `bulk_command`.
+        """
+        expected = expected or {}
+        data = self.data or {}
+        for op in expected:
+            # Para deshacer hace falta el valor anterior al primer comando pendiente
+            self._pending_previous.setdefault(op, data.get(op))
+        if expected:
+            self._optimistic.update(expected)
+            self._pending_expected.update(expected)
+            self.async_set_updated_data({**data, **expected})
+
+        for command, args in commands:
+            slot = COMMAND_SLOTS.get(command, command)
+            # El sustituto va al final para respetar el orden en que se pidieron
+            self._pending_commands.pop(slot, None)
+            self._pending_commands[slot] = (command, args)
+
+        if self._pending_result is None:
+            self._pending_result = self.hass.loop.create_future()
+        result = self._pending_result
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(
+                self.hass, self.command_debounce, self._async_flush_commands
+            )
+        async_dispatcher_send(self.hass, SIGNAL_COMMAND.format(self.window_id), commands, result)
+        return result
+
+    @callback
+    def _async_flush_commands(self, _now=None):
+        """Enviar por el socket los comandos agrupados."""
+        self._unsub_flush = None
+        commands = list(self._pending_commands.values())
+        expected, previous = self._pending_expected, self._pending_previous
+        result = self._pending_result
+        self._pending_commands = {}
+        self._pending_expected = {}
+        self._pending_previous = {}
+        self._pending_result = None
+        if not commands:
+            result.set_result(None)
+            return
+
+        self.hass.async_create_background_task(
+            self._async_confirm(commands, expected, previous, result),
+            f"{DOMAIN} {self.window_id} {commands[0][0]}",
+        )
+
+    async def _async_send_and_confirm(self, commands, expected):
+        """Enviar los comandos y leer el estado que no depende de un movimiento."""
+        if not self.health.available:
+            raise ConnectionError(f"La ventana {self.ip} no está disponible")
+        for command, args in commands:
+            respuesta = await self.async_send(COMMANDS[command]["op"], args)
+            self._check_bearer(respuesta)
+            if not isinstance(respuesta, dict) or "error" in respuesta:
+                raise ValueError(f"respuesta inesperada a {command}: {respuesta}")
+
+        # Lo que se mueve (persiana, ventana) lo confirma la consulta rápida al terminar
+        ops = [op for op in expected if op not in self._motion]
+        confirmed = await self.async_read_ops(ops) if ops else {}
+        for op, value in confirmed.items():
+            # Si otro comando posterior ya espera otro valor, la lectura no dice nada de este
+            if self._optimistic.get(op) == expected[op] and value != expected[op]:
+                raise ValueError(f"la ventana indica {value} en la op {op}, se esperaba {expected[op]}")
+        return confirmed
+
+    async def _async_confirm(self, commands, expected, previous, result):
+        """Confirmar los comandos o deshacer el estado optimista."""
+        try:
+            confirmed = await asyncio.wait_for(
+                self._async_send_and_confirm(commands, expected), COMMAND_CONFIRM_TIMEOUT
+            )
+        except (OSError, asyncio.TimeoutError, ValueError) as e:
+            _LOGGER.warning("La ventana %s no confirmó %s: %s", self.ip, commands, e)
+            # Solo se deshace lo que no haya sustituido otro comando posterior
+            restored = {
+                op: previous[op] for op, value in expected.items() if self._optimistic.get(op) == value
+            }
+            # Deshecho el comando, no hay movimiento que seguir
+            self._end_motion(restored)
+            if restored:
+                self.async_set_updated_data({**(self.data or {}), **restored})
+            self.hass.bus.async_fire(
+                EVENT_COMMAND_FAILED,
+                {"window_id": self.window_id, "commands": [c for c, _ in commands], "error": str(e)},
+            )
+            result.set_result(e)
+            return False
+
+        for op, value in expected.items():
+            if op not in self._motion and self._optimistic.get(op) == value:
+                del self._optimistic[op]
+        if confirmed:
+            self.async_set_updated_data({**(self.data or {}), **confirmed, **self._optimistic})
+        result.set_result(None)
+        return True
+
+    @property
+    def available(self):
+        """Indica si la ventana responde (el circuito está cerrado)."""
+        return self.health.available
+
+    def is_moving(self, op):
+        """Indica si se está siguiendo un movimiento de `op` con consulta rápida."""
+        return op in self._motion
+
+    async def async_read_ops(self, ops):
+        """Leer varias operaciones de la ventana en una sola ida y vuelta.
+
+        Devuelve un diccionario op -> valor con las operaciones que respondieron.
+        """
+        values = {}
+        pending = list(ops)
+
+        if self._pipelining and len(pending) > 1:
+            frames = await self.connection.async_request_many(
+                [self._build_frame(op) for op in pending], pending
+            )
+            for op, mensaje in zip(pending, frames):
+                self._check_bearer(mensaje)
+                if isinstance(mensaje, dict) and "value" in mensaje:
+                    values[op] = mensaje["value"]
+            if len(frames) < len(pending):
+                _LOGGER.debug(
+                    "La ventana %s no admite peticiones encadenadas; se consultará op a op", self.ip
+                )
+                self._pipelining = False
+            pending = pending[len(frames):]
+
+        for op in pending:
+            try:
+                mensaje = await self.async_send(op)
+            except (OSError, asyncio.TimeoutError) as e:
+                _LOGGER.debug("Error consultando op %s en %s: %s", op, self.ip, e)
+                continue
+            self._check_bearer(mensaje)
+            if isinstance(mensaje, dict) and "value" in mensaje:
+                values[op] = mensaje["value"]
+
+        return values
+
+    def _check_bearer(self, mensaje):
+        """Si la ventana rechaza el `Bearer` (rotado en la nube), pedir el inventario de nuevo."""
+        if not isinstance(mensaje, dict) or "bearer" not in str(mensaje.get("error", "")).lower():
+            return
+        _LOGGER.debug("La ventana %s rechaza el Bearer; se actualizará el inventario", self.ip)
+        refresher = self.hass.data.get(DOMAIN, {}).get("refresher")
+        if refresher is not None:
+            refresher.async_request_refresh()
+
+    @property
+    def push_active(self):
+        """Indica si la ventana está enviando su estado por push."""
+        return (
+            self._unsub_push is not None
+            and self.connection.connected
+            and self._last_push is not None
+            and time.monotonic() - self._last_push < PUSH_POLLING_INTERVAL
+        )
+
+    @callback
+    def async_enable_push(self):
+        """Escuchar las tramas que la ventana envía por su cuenta.
+
+        La conexión las publica en el dispatcher de Home Assistant y el
+        coordinador las incorpora a sus datos; la consulta periódica se
+        mantiene como respaldo.
+        """
+        signal = SIGNAL_PUSH.format(self.ip)
+        self.connection.push_listener = lambda frame: async_dispatcher_send(self.hass, signal, frame)
+        self._unsub_push = async_dispatcher_connect(self.hass, signal, self._async_handle_push)
+
+    @callback
+    def _async_handle_push(self, frame):
+        """Incorporar una trama de estado enviada por la ventana.
+
+        Solo se aceptan las operaciones de estado que se consultan de la
+        ventana (`self.ops`): el resto no tiene entidad y acabaría en la copia
+        local.
+        """
+        op = frame.get("op")
+        if op is None or "value" not in frame:
+            _LOGGER.debug("Trama push sin op o valor de %s: %s", self.ip, frame)
+            return
+        if op not in self.ops:
+            _LOGGER.debug("Trama push de una operación desconocida de %s: %s", self.ip, frame)
+            return
+
+        self._last_push = time.monotonic()
+        self.health.record_success()
+        data = dict(self.data or {})
+        data[op] = frame["value"]
+        async_dispatcher_send(self.hass, SIGNAL_READING, self.window_id, {op: frame["value"]})
+        self.async_set_updated_data(data)
+
+    async def async_shutdown(self):
+        """Dejar de escuchar tramas push y detener el coordinador."""
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        if self._pending_result is not None:
+            self._pending_result.set_result(ConnectionAbortedError("integración descargada"))
+            self._pending_result = None
+        if self._unsub_push is not None:
+            self._unsub_push()
+            self._unsub_push = None
+            self.connection.push_listener = None
+        await super().async_shutdown()
+
+    @callback
+    def async_start_motion(self, op):
+        """Consultar `op` cada `FAST_POLLING_INTERVAL` tras un comando de movimiento."""
+        self._motion[op] = (self.data or {}).get(op)
+        self._motion_seen.discard(op)
+        self._motion_started = time.monotonic()
+        self._stable_polls = 0
+        self.update_interval = timedelta(seconds=FAST_POLLING_INTERVAL)
+
+    def _adapt_interval(self, values):
+        """Elegir el siguiente intervalo según si algo sigue moviéndose.
+
+        Si el comando tiene un valor esperado, las consultas sin cambios solo
+        cuentan una vez que el movimiento se ha visto: la lectura cambió o ya
+        da ese valor. Una ventana cuyo estado solo cambia al final del
+        recorrido sigue en consulta rápida (hasta `MOTION_MAX_DURATION`) en vez
+        de darse por parada al empezar. Sin valor esperado no hay con qué
+        comparar, y bastan `MOTION_SETTLE_POLLS` lecturas iguales (cerrar una
+        persiana ya cerrada no la tiene en consulta rápida dos minutos).
+        """
+        if self._motion:
+            changed = False
+            for op in self._motion:
+                if op not in values:
+                    continue
+                if values[op] != self._motion[op]:
+                    self._motion[op] = values[op]
+                    self._motion_seen.add(op)
+                    changed = True
+                elif op not in self._optimistic or values[op] == self._optimistic[op]:
+                    self._motion_seen.add(op)
+            if changed or not self._motion_seen.issuperset(self._motion):
+                self._stable_polls = 0
+            else:
+                self._stable_polls += 1
+
+            if (
+                self._stable_polls < MOTION_SETTLE_POLLS
+                and time.monotonic() - self._motion_started < MOTION_MAX_DURATION
+            ):
+                self.update_interval = timedelta(seconds=FAST_POLLING_INTERVAL)
+                return
+            # Movimiento terminado: manda el valor real de la ventana
+            self._end_motion()
+
+        # En reposo: duplicar el intervalo hasta llegar al de reposo (más largo con push)
+        idle = PUSH_POLLING_INTERVAL if self.push_active else IDLE_POLLING_INTERVAL
+        current = self.update_interval.total_seconds() if self.update_interval else POLLING_INTERVAL
+        self.update_interval = timedelta(seconds=min(idle, current * 2))
+
+    def _end_motion(self, ops=None):
+        """Dejar de seguir el movimiento de `ops` (todos si es None) y su valor optimista."""
+        for op in list(self._motion) if ops is None else ops:
+            self._motion.pop(op, None)
+            self._motion_seen.discard(op)
+            self._optimistic.pop(op, None)
+
+    def _poll_failed(self, message):
+        """Anotar el fallo de una consulta y devolver el error para el coordinador.
+
+        Si con este fallo se abre el circuito, el siguiente ciclo se programa
+        directamente para la hora de la prueba en lugar de seguir consultando.
+        """
+        was_available = self.health.available
+        self.health.record_failure()
+        if not self.health.available:
+            # Sin respuesta no se sabe dónde acabó: manda lo que lea la prueba
+            self._end_motion()
+            self._schedule_probe()
+            if was_available:
+                # El coordinador no avisa de fallos repetidos: las entidades
+                # tienen que enterarse aquí de que pasan a no disponibles
+                self.async_update_listeners()
+        return UpdateFailed(message)
+
+    def _schedule_probe(self):
+        """Programar el siguiente ciclo para la hora de la próxima prueba."""
+        self.update_interval = timedelta(
+            seconds=max(FAST_POLLING_INTERVAL, self.health.seconds_to_probe())
+        )
+
+    async def _async_update_data(self):
+        """Consultar todos los estados de la ventana en un solo ciclo.
+
+        Mientras hay un movimiento en curso solo se consultan las operaciones
+        de movimiento; el resto se sigue leyendo cada `POLLING_INTERVAL`. Con
+        el circuito abierto no se consulta nada hasta que toca la prueba.
+        """
+        if not self.health.allow_request():
+            self._schedule_probe()
+            raise UpdateFailed(
+                f"La ventana {self.ip} no está disponible; próxima prueba en "
+                f"{self.health.seconds_to_probe():.0f} s"
+            )
+
+        now = time.monotonic()
+        if self._motion and now - self._last_full_poll < POLLING_INTERVAL:
+            ops = list(self._motion)
+        else:
+            ops = self.ops
+            self._last_full_poll = now
+
+        try:
+            values = await self.async_read_ops(ops)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise self._poll_failed(f"Error consultando la ventana {self.ip}: {e}") from e
+
+        self._polls += 1
+        if self.log_sample_rate and self._polls % self.log_sample_rate == 0:
+            _LOGGER.debug(
+                "Ciclo %s de %s: %s/%s ops en %.0f ms, latencia media %s ms: %s",
+                self._polls, self.ip, len(values), len(ops),
+                (time.monotonic() - now) * 1000, self.connection.metrics.mean_latency_ms, values,
+            )
+
+        if not values:
+            raise self._poll_failed(f"La ventana {self.ip} no respondió a ninguna consulta")
+
+        self.health.record_success()
+        if not self._compact_tested:
+            self._compact_tested = True
+            self.hass.async_create_background_task(
+                self._async_negotiate_encoding(), f"{DOMAIN} {self.window_id} encoding"
+            )
+
+        self._adapt_interval(values)
+        # Lo leído, sin los valores optimistas, para la analítica de la flota
+        async_dispatcher_send(self.hass, SIGNAL_READING, self.window_id, values)
+        data = dict(self.data or {})
+        data.update(values)
+        # Los comandos sin confirmar mantienen su valor esperado
+        data.update(self._optimistic)
+        return data
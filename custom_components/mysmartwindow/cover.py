@@ -1,230 +1,318 @@
-import logging
-import asyncio
-import json
-import re
-from homeassistant.components.cover import CoverEntity, CoverEntityFeature
-from homeassistant.helpers.device_registry import async_get as async_get_device_registry
-from .const import DOMAIN, COMMANDS
-from datetime import timedelta
-
-SCAN_INTERVAL = timedelta(seconds=15)
-
-_LOGGER = logging.getLogger(__name__)
-
-async def async_setup_entry(hass, entry, async_add_entities):
-    """Configurar persianas en función de los datos obtenidos de la API."""
-    devices = []
-    raw_data = hass.data[DOMAIN].get("devices", [])
-
-    if not isinstance(raw_data, list) or not raw_data:
-        return
-    
-    device_registry = async_get_device_registry(hass)
-    
-    for building in raw_data:
-        home = building.get("Home", {})
-        rooms = home.get("Rooms", [])
-        for room in rooms:
-            room_name = room.get("Name", "Sala Desconocida")
-            windows = room.get("Windows", []) or []
-            _LOGGER.warning("windows: %s", windows)
-            for window in windows:
-                window_name = window.get("Name", "Ventana desconocida")
-                if not isinstance(window, dict):
-                    continue
-                # Registrar dispositivo en HA
-                device_registry.async_get_or_create(
-                    config_entry_id=entry.entry_id,
-                    identifiers={(DOMAIN, window_name)},
-                    manufacturer="MySmartWindow",
-                    model="Smart Cover",
-                    name=f"{room_name} - {window.get('Name', 'Ventana Desconocida')}",
-                    sw_version="1.0",
-                )
-                devices.append(MySmartWindowCover(window, home, room_name))
-
-    if devices:
-        async_add_entities(devices)
-    else:
-        _LOGGER.warning("No se encontraron ventanas válidas para agregar a Home Assistant.")
-
-class MySmartWindowCover(CoverEntity):
-    """Entidad de Home Assistant para una ventana MySmartWindow."""
-
-    def __init__(self, window, home, room_name):
-        """Inicializar ventana."""
-        self._window = window
-        self._room_name = room_name
-        self._attr_name = f"{room_name} - {window.get('Name', 'Ventana Desconocida')}"
-        self._attr_unique_id = window.get("Id_Window", None)
-        self._ip = window.get("Ip", "0.0.0.0")
-        self._port = 443  # Cambia esto si el dispositivo usa otro puerto
-        self._attr_is_closed = False
-        self._bearer = home.get("Bearer", "")
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, self._attr_unique_id)},
-            "name": self._attr_name,
-            "manufacturer": "MySmartWindow",
-            "model": "Smart Cover",
-        }
-
-        # Estado inicial.
-        self._current_position = 0  # Posición inicial de la persiana (0-100)
-        self._attr_is_opening = False
-        self._attr_is_closing = False
-        self._attr_is_closed = None  # Se actualizará con `async_update`
-    
-    @property
-    def supported_features(self):
-        """Indicar a Home Assistant que la persiana soporta control de posición, abrir y cerrar."""
-        return (
-        CoverEntityFeature.OPEN |
-        CoverEntityFeature.CLOSE |
-        CoverEntityFeature.STOP |
-        CoverEntityFeature.SET_POSITION
-        )
-        
-    @property
-    def state(self):
-        """Devuelve el estado de la persiana ('closed' o 'open') según su posición."""
-        return "closed" if self._current_position == 0 else "open"
-        
-    @property
-    def current_position(self):
-        """Devuelve la posición actual en 0-100 invirtiendo la escala (0 cerrado, 100 abierto)."""
-        if self._current_position is None:
-            return 50  # Valor por defecto
-        else:
-            return self._current_position
-            #return 100 - (self._current_position / 120 * 100)
-        
-    
-    async def send_command(self, command, position=None):
-        """Enviar un comando a la ventana usando socket en formato JSON."""
-        if command not in COMMANDS:
-            _LOGGER.error("Comando desconocido: %s", command)
-            return
-    
-        # Construcción del mensaje JSON
-        auth_header = {
-            #"bearer":f"{self._bearer}",
-            "bearer": self._bearer,
-            "type": "plain",
-            "op": COMMANDS[command]["op"]
-        }
-        
-        if position is not None:
-            auth_header["args"] = position  # Enviar posición si se requiere
-
-        message = json.dumps(auth_header)  # Convertimos el diccionario a JSON
-    
-        try:
-            reader, writer = await asyncio.open_connection(self._ip, self._port)
-            
-            writer.write(message.encode())  # Enviar mensaje JSON
-            await writer.drain()
-            
-            data = await reader.read(1024)  # Leer la respuesta del dispositivo
-            response = data.decode().strip()
-            
-            writer.close()
-            await writer.wait_closed()
-            
-            return response  # Devolvemos la respuesta para posibles validaciones
-            
-        except Exception as e:
-            _LOGGER.error("Error enviando comando -> send_command a %s: %s", self._attr_name, e)
-            return None
-    
-    async def async_open_cover(self, **kwargs):
-        """Subir la persiana."""
-        _LOGGER.warning("Subiendo persiana: %s", self._attr_name)
-        await self.send_command("BLIND UP")
-        self._attr_is_opening = True
-        self._attr_is_closing = False
-        self.async_write_ha_state()
-        await self.async_update()  # Refresca el estado después de ejecutar el comando
-
-    async def async_close_cover(self, **kwargs):
-        """Bajar la persiana."""
-        _LOGGER.warning("Bajando persiana: %s", self._attr_name)
-        await self.send_command("BLIND DOWN")
-        self._attr_is_closing = True
-        self._attr_is_opening = False
-        self.async_write_ha_state()
-        await self.async_update()  # Refresca el estado después de ejecutar el comando
-
-    async def async_stop_cover(self, **kwargs):
-        """Detener la persiana."""
-        _LOGGER.warning("Deteniendo persiana: %s", self._attr_name)
-        await self.send_command("BLIND STOP")
-        self._attr_is_opening = False
-        self._attr_is_closing = False
-        self.async_write_ha_state()
-        await self.async_update()  # Refresca el estado después de ejecutar el comando
-
-    async def async_set_cover_position(self, **kwargs):
-        """Ajustar la posición de la persiana."""
-        position = kwargs.get("position", 0)
-        if position is None or not (0 <= position <= 100):
-            _LOGGER.error(" Posición inválida: %s", position)
-            return
-
-        # Convertir de 0-100 (HA) a 120-0 (persiana)
-        adjusted_position = int((100 - position) * 1.2)  
-        
-        await self.send_command("BLIND POSITION UNIT", adjusted_position)
-        
-        self._current_position = adjusted_position
-        self.async_write_ha_state()
-        await self.async_update()  # Refresca el estado después de ejecutar el comando
-        self.async_write_ha_state()
-        
-    async def async_update(self):
-        """Obtener la posición actual de la persiana y actualizar la UI."""
-        try:
-            response = await self.send_command("BLIND STATE")
-    
-            if not response:
-                _LOGGER.error("No se recibió respuesta de BLIND STATE.")
-                return  # Evitar cambiar el estado si no hay datos
-    
-            # Intentar extraer solo el primer objeto JSON válido
-            match = re.search(r"\{.*\}", response.strip())
-    
-            if not match:
-                _LOGGER.error("No se encontró un JSON válido en la respuesta: %s", response)
-                return  # Evitar sobrescribir el estado con un valor incorrecto
-    
-            response_json = match.group(0)
-    
-            try:
-                mensaje = json.loads(response_json)  # Convertir en diccionario
-                _LOGGER.warning(" JSON decodificado correctamente: %s", mensaje)
-    
-                if isinstance(mensaje, dict) and "value" in mensaje:
-                    try:
-                        position_120 = int(mensaje["value"])  # Convertir a entero
-                        new_position = int(100 - (position_120 / 120 * 100))  # Convertir de 120-0 a 0-100
-                        
-                        # Solo actualizar si el valor es válido
-                        if 0 <= new_position <= 100:
-                            if new_position != self._current_position:
-                                self._current_position = new_position
-                                self._attr_extra_state_attributes = {"current_position": self._current_position}
-                                self.async_write_ha_state()
-                            else:
-                                _LOGGER.info("Estado sin cambios.")
-                    except (ValueError, TypeError) as e:
-                        _LOGGER.error("Error al procesar 'value': %s | Respuesta: %s", e, mensaje)
-                        
-                else:
-                    _LOGGER.error("No se encontró 'value' en la respuesta BLIND STATE: %s", mensaje)
-                    
-            except json.JSONDecodeError as e:
-                _LOGGER.error("Error al decodificar JSON: %s | Respuesta: %s", e, response_json)
-                
-        except Exception as e:
-            _LOGGER.error("Error obteniendo estado de %s: %s", self._attr_name, e)
-
-
+import logging
+import asyncio
+import time
+from datetime import timedelta
+from functools import partial
+from homeassistant.components.cover import CoverEntity, CoverEntityFeature
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from .blind import BlindModel
+from .const import (
+    DOMAIN,
+    COMMANDS,
+    SIGNAL_INVENTORY,
+    SIGNAL_COMMAND,
+    BLIND_POSITION_MAX,
+    BLIND_TRAVEL_TIME,
+    BLIND_CHECK_FRACTION,
+    BLIND_SETTLE_TIME,
+    BLIND_UPDATE_INTERVAL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def to_device_position(position):
+    """Convertir una posición de HA (0 cerrada, 100 abierta) a la escala de la persiana (120-0)."""
+    return round((100 - position) * BLIND_POSITION_MAX / 100)
+
+
+def from_device_position(value):
+    """Convertir una posición de la persiana (120-0) a la escala de HA (0-100)."""
+    return round(100 - value * 100 / BLIND_POSITION_MAX)
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Configurar persianas en función de los datos obtenidos de la API."""
+    topology = hass.data[DOMAIN]["topology"]
+    coordinators = hass.data[DOMAIN]["coordinators"]
+
+    devices = [
+        MySmartWindowCover(coordinators[window_id], window)
+        for window_id, window in topology.windows.items()
+    ]
+
+    if devices:
+        async_add_entities(devices)
+    else:
+        _LOGGER.warning("No se encontraron ventanas válidas para agregar a Home Assistant.")
+
+    @callback
+    def async_add_windows(windows):
+        """Añadir las persianas de las ventanas nuevas del inventario."""
+        entity_registry = async_get_entity_registry(hass)
+        async_add_entities(
+            MySmartWindowCover(coordinators[window.window_id], window)
+            for window in windows
+            if entity_registry.async_get_entity_id("cover", DOMAIN, window.window_id) is None
+        )
+
+    entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_INVENTORY.format(entry.entry_id), async_add_windows)
+    )
+
+class MySmartWindowCover(CoordinatorEntity, CoverEntity):
+    """Entidad de Home Assistant para una ventana MySmartWindow.
+
+    Mientras la persiana se mueve, la posición y el sentido salen de su
+    `BlindModel` y se publican cada `BLIND_UPDATE_INTERVAL` segundos sin
+    tráfico de red. La posición real solo se consulta al acercarse la llegada
+    prevista (y tras una parada) para corregir la deriva y calibrar el modelo.
+    Cada orden abre un movimiento nuevo (`_move`): las consultas y los fallos
+    de un movimiento anterior ya no tocan el modelo. El modelo sigue las
+    órdenes que anuncia el coordinador, también las de `bulk_command`.
+    """
+
+    def __init__(self, coordinator, window):
+        """Inicializar ventana."""
+        super().__init__(coordinator)
+        self._window = window
+        self._room_name = window.room.name
+        self._attr_name = window.full_name
+        self._attr_unique_id = window.window_id
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, self._attr_unique_id)},
+            "name": self._attr_name,
+            "manufacturer": "MySmartWindow",
+            "model": "Smart Cover",
+        }
+
+        # Estado inicial.
+        travel = coordinator.hass.data[DOMAIN]["snapshot"].travel.get(window.window_id)
+        travel_up, travel_down = travel or (BLIND_TRAVEL_TIME, BLIND_TRAVEL_TIME)
+        self._model = BlindModel(travel_up=travel_up, travel_down=travel_down)
+        self._unsub_tick = None
+        self._unsub_check = None
+        self._move = 0  # Número del último movimiento ordenado
+        self._update_from_coordinator()
+
+    @property
+    def available(self):
+        """No disponible mientras la ventana no responde (circuito abierto)."""
+        return self.coordinator.available
+
+    @property
+    def supported_features(self):
+        """Indicar a Home Assistant que la persiana soporta control de posición, abrir y cerrar."""
+        return (
+        CoverEntityFeature.OPEN |
+        CoverEntityFeature.CLOSE |
+        CoverEntityFeature.STOP |
+        CoverEntityFeature.SET_POSITION
+        )
+
+    @property
+    def current_cover_position(self):
+        """Devuelve la posición actual en 0-100 (0 cerrado, 100 abierto), estimada si se mueve."""
+        position = self._model.position_at(time.monotonic())
+        if position is None:
+            return 50  # Valor por defecto
+        return round(position)
+
+    @property
+    def is_closed(self):
+        """La persiana está cerrada si su posición es 0."""
+        return self.current_cover_position == 0
+
+    @property
+    def is_opening(self):
+        """Subiendo según el modelo."""
+        return self._model.opening and not self._model.arrived(time.monotonic())
+
+    @property
+    def is_closing(self):
+        """Bajando según el modelo."""
+        return self._model.moving and not self._model.opening and not self._model.arrived(time.monotonic())
+
+    async def async_added_to_hass(self):
+        """Seguir las órdenes de la persiana que se encolan en el coordinador."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass, SIGNAL_COMMAND.format(self._window.window_id), self._async_follow_commands
+            )
+        )
+
+    @callback
+    def _async_follow_commands(self, commands, result):
+        """Arrancar o parar el modelo con las órdenes encoladas para la ventana."""
+        for command, args in commands:
+            if command == "BLIND STOP":
+                self._async_stop()
+            elif command == "BLIND UP":
+                self._async_move(100, result)
+            elif command == "BLIND DOWN":
+                self._async_move(0, result)
+            elif command == "BLIND POSITION UNIT":
+                try:
+                    target = from_device_position(float(args))
+                except (TypeError, ValueError):
+                    _LOGGER.debug("Posición no válida para %s: %s", self._attr_name, args)
+                    continue
+                self._async_move(max(0, min(100, target)), result)
+
+    @callback
+    def _async_move(self, target, result):
+        """Mover la persiana hacia `target` (0-100) siguiendo el modelo."""
+        self._move += 1
+        origin = self._model.position_at(time.monotonic())
+        # La orden sale tras agrupar los comandos: el movimiento empieza entonces
+        eta = self._model.start(target, time.monotonic() + self.coordinator.command_debounce)
+        result.add_done_callback(partial(self._async_move_done, self._move, origin))
+        self._async_schedule_check(
+            self.coordinator.command_debounce + max(BLIND_SETTLE_TIME, eta * BLIND_CHECK_FRACTION)
+        )
+        if self._unsub_tick is None:
+            self._unsub_tick = async_track_time_interval(
+                self.hass, self._async_tick, timedelta(seconds=BLIND_UPDATE_INTERVAL)
+            )
+        self.async_write_ha_state()
+
+    @callback
+    def _async_move_done(self, move, origin, result):
+        """Si la ventana no confirmó la orden, la persiana sigue donde estaba."""
+        if result.result() is None or move != self._move:
+            return  # Confirmada, o ya se ha ordenado otro movimiento
+        self._move += 1
+        self._model.stop(time.monotonic())
+        self._model.position = origin
+        self._async_stop_tick()
+        # Se consulta dónde está de verdad por si la orden sí llegó
+        self._async_schedule_check(BLIND_SETTLE_TIME)
+        self.async_write_ha_state()
+
+    async def async_open_cover(self, **kwargs):
+        """Subir la persiana."""
+        _LOGGER.debug("Subiendo persiana: %s", self._attr_name)
+        self.coordinator.async_command([("BLIND UP", None)])
+
+    async def async_close_cover(self, **kwargs):
+        """Bajar la persiana."""
+        _LOGGER.debug("Bajando persiana: %s", self._attr_name)
+        self.coordinator.async_command([("BLIND DOWN", None)])
+
+    async def async_stop_cover(self, **kwargs):
+        """Detener la persiana."""
+        _LOGGER.debug("Deteniendo persiana: %s", self._attr_name)
+        self.coordinator.async_command([("BLIND STOP", None)])
+
+    @callback
+    def _async_stop(self):
+        """Detener el modelo donde esté y consultar dónde se ha parado de verdad."""
+        self._move += 1
+        self._model.stop(time.monotonic())
+        self._async_stop_tick()
+        self._async_schedule_check(self.coordinator.command_debounce + BLIND_SETTLE_TIME)
+        self.async_write_ha_state()
+
+    async def async_set_cover_position(self, **kwargs):
+        """Ajustar la posición de la persiana."""
+        position = kwargs.get("position", 0)
+        if position is None or not (0 <= position <= 100):
+            _LOGGER.error(" Posición inválida: %s", position)
+            return
+
+        self.coordinator.async_command([("BLIND POSITION UNIT", to_device_position(position))])
+
+    @callback
+    def _async_tick(self, _now=None):
+        """Publicar la posición estimada mientras el modelo se mueve."""
+        if not self._model.moving or self._model.arrived(time.monotonic()):
+            self._async_stop_tick()
+        self.async_write_ha_state()
+
+    @callback
+    def _async_stop_tick(self):
+        """Dejar de publicar la posición estimada."""
+        if self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+
+    @callback
+    def _async_schedule_check(self, delay):
+        """Programar la consulta de la posición real dentro de `delay` segundos."""
+        if self._unsub_check is not None:
+            self._unsub_check()
+        self._unsub_check = async_call_later(self.hass, delay, partial(self._async_check, self._move))
+
+    async def _async_check(self, move, _now=None):
+        """Leer la posición real, corregir y calibrar el modelo del movimiento `move`."""
+        self._unsub_check = None
+        op = COMMANDS["BLIND STATE"]["op"]
+        try:
+            values = await self.coordinator.async_read_ops([op])
+            position = from_device_position(int(values[op]))
+        except (OSError, asyncio.TimeoutError, KeyError, TypeError, ValueError) as e:
+            if move != self._move:
+                return  # Durante la lectura se ordenó otro movimiento
+            _LOGGER.debug("No se pudo comprobar la posición de %s: %s", self._attr_name, e)
+            # Sin lectura se queda donde dice el modelo; la consulta periódica corregirá
+            self._model.stop(time.monotonic())
+            self._async_stop_tick()
+            self.async_write_ha_state()
+            return
+        if move != self._move:
+            # La lectura es anterior al nuevo movimiento: lo pararía con una posición vieja
+            return
+
+        model = self._model
+        travel = (model.travel_up, model.travel_down)
+        if model.sync(position, time.monotonic()):
+            self._async_schedule_check(model.remaining(time.monotonic()) + BLIND_SETTLE_TIME)
+        else:
+            self._async_stop_tick()
+        if (model.travel_up, model.travel_down) != travel:
+            _LOGGER.debug(
+                "Persiana %s calibrada: subida %s s, bajada %s s",
+                self._attr_name, model.travel_up, model.travel_down,
+            )
+            self.hass.data[DOMAIN]["snapshot"].async_set_travel(
+                self._window.window_id, model.travel_up, model.travel_down
+            )
+        # Compartir la lectura con el resto de entidades de la ventana
+        self.coordinator.async_set_updated_data({**(self.coordinator.data or {}), **values})
+
+    async def async_will_remove_from_hass(self):
+        """Cancelar las actualizaciones pendientes."""
+        self._async_stop_tick()
+        if self._unsub_check is not None:
+            self._unsub_check()
+            self._unsub_check = None
+        await super().async_will_remove_from_hass()
+
+    def _update_from_coordinator(self):
+        """Tomar la posición de la persiana de los datos del coordinador."""
+        op = COMMANDS["BLIND STATE"]["op"]
+        value = (self.coordinator.data or {}).get(op)
+        if value is None or self._model.moving:
+            # Durante el movimiento manda el modelo; la comprobación lo corrige al final
+            return
+
+        try:
+            new_position = from_device_position(int(value))
+        except (ValueError, TypeError) as e:
+            _LOGGER.debug("Error al procesar 'value': %s | Valor: %s", e, value)
+            return
+
+        # Solo actualizar si el valor es válido
+        if 0 <= new_position <= 100:
+            self._model.position = new_position
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Actualizar la posición cuando el coordinador trae datos nuevos."""
+        self._update_from_coordinator()
+        super()._handle_coordinator_update()
@@ -0,0 +1,35 @@
+from homeassistant.components.diagnostics import async_redact_data
+from .const import DOMAIN
+
+TO_REDACT = {"cloud_token", "Bearer", "bearer"}
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Diagnósticos de la integración: estado y métricas de cada ventana."""
+    domain_data = hass.data.get(DOMAIN, {})
+    coordinators = domain_data.get("coordinators", {})
+
+    windows = {}
+    for window_id, coordinator in coordinators.items():
+        connection = coordinator.connection
+        windows[window_id] = {
+            "name": coordinator.window.full_name,
+            "ip": connection.ip,
+            "port": connection.port,
+            "last_update_success": coordinator.last_update_success,
+            "health": coordinator.health.as_dict(),
+            "update_interval": coordinator.update_interval.total_seconds() if coordinator.update_interval else None,
+            "push_active": coordinator.push_active,
+            "frame_encoding": coordinator.frame_encoding,
+            "connected": connection.connected,
+            "data": coordinator.data,
+            "metrics": connection.metrics.as_dict(connection.decode_errors),
+        }
+
+    ventilation = domain_data.get("ventilation")
+    return {
+        "entry": async_redact_data({"data": dict(entry.data), "options": dict(entry.options)}, TO_REDACT),
+        "platforms": domain_data.get("platforms", []),
+        "windows": windows,
+        "ventilation": ventilation.as_dict() if ventilation is not None else None,
+    }
@@ -0,0 +1,69 @@
+import logging
+import time
+from .const import HEALTH_FAILURE_THRESHOLD, HEALTH_PROBE_BACKOFF_BASE, HEALTH_PROBE_BACKOFF_MAX
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HealthTracker:
+    """Salud de una ventana con cortocircuito (circuit breaker).
+
+    Tras `HEALTH_FAILURE_THRESHOLD` fallos seguidos la ventana se marca como
+    no disponible y deja de consultarse; solo se prueba de nuevo según un
+    backoff exponencial (`HEALTH_PROBE_BACKOFF_BASE` ... `_MAX`). La primera
+    respuesta correcta la vuelve a dar por disponible.
+    """
+
+    __slots__ = ("name", "failures", "trips", "next_probe")
+
+    def __init__(self, name):
+        """Inicializar la ventana como disponible."""
+        self.name = name
+        self.failures = 0
+        self.trips = 0
+        self.next_probe = 0.0
+
+    @property
+    def available(self):
+        """Indica si la ventana se considera disponible."""
+        return self.failures < HEALTH_FAILURE_THRESHOLD
+
+    def seconds_to_probe(self):
+        """Segundos que faltan para poder probar la ventana (0 si ya se puede)."""
+        if self.available:
+            return 0.0
+        return max(0.0, self.next_probe - time.monotonic())
+
+    def allow_request(self):
+        """Indica si se puede consultar la ventana ahora (disponible o toca probar)."""
+        return self.seconds_to_probe() == 0.0
+
+    def record_success(self):
+        """Anotar una respuesta correcta: se cierra el circuito."""
+        if not self.available:
+            _LOGGER.info("La ventana %s vuelve a responder", self.name)
+        self.failures = 0
+        self.trips = 0
+        self.next_probe = 0.0
+
+    def record_failure(self):
+        """Anotar un fallo; al llegar al umbral se abre el circuito y se programa la prueba."""
+        self.failures += 1
+        if self.failures < HEALTH_FAILURE_THRESHOLD:
+            return
+        if self.failures == HEALTH_FAILURE_THRESHOLD:
+            _LOGGER.warning(
+                "La ventana %s no responde tras %s intentos; se marca como no disponible",
+                self.name, self.failures,
+            )
+        backoff = min(HEALTH_PROBE_BACKOFF_MAX, HEALTH_PROBE_BACKOFF_BASE * 2 ** self.trips)
+        self.trips += 1
+        self.next_probe = time.monotonic() + backoff
+
+    def as_dict(self):
+        """Representación para los diagnósticos."""
+        return {
+            "available": self.available,
+            "consecutive_failures": self.failures,
+            "next_probe_in": round(self.seconds_to_probe(), 1),
+        }
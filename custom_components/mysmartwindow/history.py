@@ -0,0 +1,53 @@
+from array import array
+from .const import SENSOR_HISTORY_SIZE
+
+
+class SensorHistory:
+    """Lecturas recientes de un sensor en un buffer circular de tamaño fijo.
+
+    Guarda pares (instante, valor) en dos `array("d")` preasignados: no hay
+    asignaciones por lectura y la memoria por sensor es constante
+    (16 bytes por posición). Al llenarse se sobrescriben las más antiguas.
+    """
+
+    __slots__ = ("_times", "_values", "_next", "_count")
+
+    def __init__(self, size=SENSOR_HISTORY_SIZE):
+        """Inicializar el buffer vacío con `size` posiciones."""
+        self._times = array("d", bytes(8 * size))
+        self._values = array("d", bytes(8 * size))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        """Número de lecturas guardadas."""
+        return self._count
+
+    def add(self, timestamp, value):
+        """Guardar una lectura (instante monotónico en segundos)."""
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._values)
+        if self._count < len(self._values):
+            self._count += 1
+
+    def stats(self, since):
+        """Mínimo, máximo y media de las lecturas posteriores a `since`."""
+        size = len(self._values)
+        count = 0
+        total = 0.0
+        low = high = None
+        for index in range(self._next - self._count, self._next):
+            index %= size
+            if self._times[index] < since:
+                continue
+            value = self._values[index]
+            count += 1
+            total += value
+            if low is None or value < low:
+                low = value
+            if high is None or value > high:
+                high = value
+        if not count:
+            return {}
+        return {"min": low, "max": high, "mean": round(total / count, 2), "samples": count}
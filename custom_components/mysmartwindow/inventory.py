@@ -0,0 +1,251 @@
+import logging
+import asyncio
+import random
+import time
+from datetime import timedelta
+from homeassistant.core import callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.device_registry import async_get as async_get_device_registry
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+from homeassistant.helpers.event import async_track_time_interval
+from .const import (
+    DOMAIN,
+    INVENTORY_REFRESH_INTERVAL,
+    SIGNAL_INVENTORY,
+    BEARER_REFRESH_COOLDOWN,
+    STARTUP_STAGGER,
+    STARTUP_BUDGET,
+    CONF_PUSH,
+    DEFAULT_PUSH,
+    CONF_LOG_SAMPLE_RATE,
+    DEFAULT_LOG_SAMPLE_RATE,
+    CONF_COMMAND_DEBOUNCE,
+    DEFAULT_COMMAND_DEBOUNCE,
+)
+from .cloud import CloudAuthError, CloudClient, CloudError
+from .coordinator import MySmartWindowCoordinator
+from .topology import Topology
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@callback
+def async_register_window(hass, entry, window):
+    """Registrar la ventana en el sistema de dispositivos de HA (una vez por `Id_Window`)."""
+    async_get_device_registry(hass).async_get_or_create(
+        config_entry_id=entry.entry_id,
+        identifiers={(DOMAIN, window.window_id)},
+        manufacturer="MySmartWindow",
+        model="Smart Cover",
+        name=window.full_name,
+        sw_version="1.0",
+    )
+
+
+@callback
+def async_create_coordinator(hass, entry, window):
+    """Crear el coordinador de una ventana sobre la conexión compartida del pool."""
+    pool = hass.data[DOMAIN]["pool"]
+    coordinator = MySmartWindowCoordinator(hass, pool.get(window.ip, window.port), window)
+    if entry.options.get(CONF_PUSH, DEFAULT_PUSH):
+        coordinator.async_enable_push()
+    coordinator.log_sample_rate = entry.options.get(CONF_LOG_SAMPLE_RATE, DEFAULT_LOG_SAMPLE_RATE)
+    coordinator.command_debounce = entry.options.get(CONF_COMMAND_DEBOUNCE, DEFAULT_COMMAND_DEBOUNCE)
+    hass.data[DOMAIN]["snapshot"].async_track(window.window_id, coordinator)
+    return coordinator
+
+
+async def async_warm_up(hass, entry, coordinators):
+    """Primera consulta de las ventanas sin bloquear el arranque.
+
+    Las consultas se lanzan todas a la vez, escalonadas al azar dentro de
+    `STARTUP_STAGGER` segundos para no abrir cientos de sockets en el mismo
+    instante; las ventanas con estado guardado van detrás de las que no lo
+    tienen. Las entidades ya existen (con el estado guardado o desconocido)
+    y se rellenan según llegan las respuestas. Pasado `STARTUP_BUDGET` se deja
+    de esperar: las ventanas lentas terminan por su cuenta y la analítica se
+    calcula con lo que haya.
+    """
+    started = time.monotonic()
+
+    async def async_first_read(coordinator):
+        delay = random.uniform(0, STARTUP_STAGGER)
+        if coordinator.data:
+            delay += STARTUP_STAGGER
+        await asyncio.sleep(delay)
+        await coordinator.async_refresh()
+
+    tasks = [
+        entry.async_create_background_task(
+            hass, async_first_read(coordinator), f"{DOMAIN} first refresh {coordinator.window_id}"
+        )
+        for coordinator in coordinators
+    ]
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks, timeout=STARTUP_BUDGET)
+    failed = sum(1 for coordinator in coordinators if not coordinator.last_update_success)
+    _LOGGER.info(
+        "Primera consulta de %s ventanas en %.1f s: %s fallidas, %s pendientes",
+        len(tasks), time.monotonic() - started, failed, len(pending),
+    )
+
+    analytics = hass.data.get(DOMAIN, {}).get("analytics")
+    if analytics is not None:
+        await analytics.async_refresh()
+
+
+async def async_forward_platforms(hass, entry, topology):
+    """Cargar las plataformas que necesita el inventario y que aún no están cargadas."""
+    loaded = hass.data[DOMAIN]["platforms"]
+    platforms = [platform for platform in topology.platforms() if platform not in loaded]
+    if platforms:
+        loaded.extend(platforms)
+        await hass.config_entries.async_forward_entry_setups(entry, platforms)
+
+
+class InventoryRefresher:
+    """Mantiene al día el inventario de edificios de la nube sin recargar la integración.
+
+    Cada `INVENTORY_REFRESH_INTERVAL` vuelve a pedir la lista de edificios con
+    `If-None-Match`/`If-Modified-Since`; si la nube responde 304 no se hace
+    nada. Si hay cambios se comparan con la topología actual y solo se
+    añaden, quitan o actualizan las entidades y dispositivos afectados.
+
+    Si una ventana rechaza su `Bearer` (rotado en la nube) se adelanta el
+    refresco, como mucho una vez cada `BEARER_REFRESH_COOLDOWN`. Si la nube
+    rechaza el token de acceso se pide al usuario uno nuevo (reautenticación).
+    """
+
+    def __init__(self, hass, entry):
+        """Inicializar el refresco del inventario."""
+        self.hass = hass
+        self.entry = entry
+        self.client = CloudClient(hass, entry.data["cloud_token"])
+        self._lock = asyncio.Lock()
+        self._unsub = None
+        self._debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=BEARER_REFRESH_COOLDOWN,
+            immediate=True,
+            function=self.async_background_refresh,
+        )
+
+    @callback
+    def async_start(self):
+        """Programar el refresco periódico."""
+        self._unsub = async_track_time_interval(
+            self.hass, self.async_background_refresh, timedelta(seconds=INVENTORY_REFRESH_INTERVAL)
+        )
+
+    @callback
+    def async_stop(self):
+        """Cancelar el refresco periódico."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self._debouncer.async_cancel()
+
+    @callback
+    def async_request_refresh(self):
+        """Adelantar el refresco (una ventana rechaza su `Bearer`)."""
+        self.hass.async_create_task(self._debouncer.async_call())
+
+    async def async_background_refresh(self, _now=None):
+        """Refresco en segundo plano: los errores de la nube solo se registran."""
+        try:
+            await self.async_refresh()
+        except CloudAuthError as e:
+            _LOGGER.warning("La nube rechaza el token de acceso (%s); se pide uno nuevo", e)
+            self.entry.async_start_reauth(self.hass)
+        except CloudError as e:
+            _LOGGER.warning("No se pudo actualizar el inventario de la nube: %s", e)
+
+    async def async_fetch(self):
+        """Pedir la lista de edificios; devuelve None si no ha cambiado (304)."""
+        return await self.client.async_get_buildings(conditional=True)
+
+    async def async_refresh(self):
+        """Pedir el inventario a la nube y aplicar las diferencias."""
+        async with self._lock:
+            devices = await self.async_fetch()
+            if DOMAIN not in self.hass.data:
+                return  # Integración descargada mientras se consultaba la nube
+            snapshot = self.hass.data[DOMAIN]["snapshot"]
+            if devices is None or devices == snapshot.devices:
+                _LOGGER.debug("Inventario de la nube sin cambios")
+                return
+
+            await self.async_apply(Topology(devices))
+            # Guardar el inventario en la copia local para el próximo arranque
+            snapshot.async_set_devices(devices)
+
+    async def async_apply(self, topology):
+        """Aplicar una topología nueva tocando solo lo que ha cambiado."""
+        hass = self.hass
+        domain_data = hass.data[DOMAIN]
+        old = domain_data["topology"]
+        coordinators = domain_data["coordinators"]
+        device_registry = async_get_device_registry(hass)
+        entity_registry = async_get_entity_registry(hass)
+
+        # Entidades que ya no existen (sensor retirado, servicio perdido, IP nueva...)
+        for platform, unique_id in old.entity_keys() - topology.entity_keys():
+            entity_id = entity_registry.async_get_entity_id(platform, DOMAIN, unique_id)
+            if entity_id is not None:
+                entity_registry.async_remove(entity_id)
+
+        # Ventanas retiradas: se quita su dispositivo y se detiene su coordinador
+        for window_id in old.windows.keys() - topology.windows.keys():
+            coordinator = coordinators.pop(window_id, None)
+            if coordinator is not None:
+                await coordinator.async_shutdown()
+            domain_data["snapshot"].async_untrack(window_id)
+            device = device_registry.async_get_device(identifiers={(DOMAIN, window_id)})
+            if device is not None:
+                device_registry.async_remove_device(device.id)
+            _LOGGER.info("Ventana %s retirada del inventario", window_id)
+
+        # Ventanas nuevas o modificadas
+        pool = domain_data["pool"]
+        changed = []
+        created = []
+        for window_id, window in topology.windows.items():
+            previous = old.windows.get(window_id)
+            coordinator = coordinators.get(window_id)
+            if coordinator is None:
+                coordinator = coordinators[window_id] = async_create_coordinator(hass, self.entry, window)
+                created.append(coordinator)
+                _LOGGER.info("Ventana %s añadida al inventario", window.full_name)
+            else:
+                coordinator.async_update_window(window, pool.get(window.ip, window.port))
+
+            if previous is None:
+                async_register_window(hass, self.entry, window)
+            elif previous.full_name != window.full_name:
+                device = device_registry.async_get_device(identifiers={(DOMAIN, window_id)})
+                if device is not None:
+                    device_registry.async_update_device(device.id, name=window.full_name)
+            if (
+                previous is None
+                or previous.ip != window.ip
+                or previous.services != window.services
+                or {s.op for s in previous.sensors} != {s.op for s in window.sensors}
+            ):
+                changed.append(window)
+
+        domain_data["topology"] = topology
+        # Las conexiones de IP que ya no usa ninguna ventana (IP nueva o ventana retirada)
+        await pool.async_prune({(window.ip, window.port) for window in topology.windows.values()})
+        if created:
+            self.entry.async_create_background_task(
+                hass, async_warm_up(hass, self.entry, created), f"{DOMAIN} warm-up"
+            )
+
+        # Las plataformas cargadas crean solo las entidades que todavía no existen
+        if changed:
+            async_dispatcher_send(hass, SIGNAL_INVENTORY.format(self.entry.entry_id), changed)
+        # Las que hagan falta por primera vez (p. ej. la primera ventana S9) crean todas las suyas
+        await async_forward_platforms(hass, self.entry, topology)
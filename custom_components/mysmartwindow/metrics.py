@@ -0,0 +1,114 @@
+import bisect
+import time
+from .const import LATENCY_BUCKETS_MS
+
+
+class LatencyHistogram:
+    """Histograma de latencias con cubetas fijas en milisegundos."""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        """Inicializar el histograma vacío (una cubeta extra para `> máximo`)."""
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, milliseconds):
+        """Añadir una medida."""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+
+    def quantile(self, fraction):
+        """Cota superior (ms) de la cubeta donde cae el percentil pedido."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    def as_dict(self):
+        """Representación para los diagnósticos."""
+        labels = [f"<={bucket}" for bucket in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class DeviceMetrics:
+    """Métricas de la conexión con una ventana.
+
+    Las actualiza `DeviceConnection` en el camino de cada petición; solo son
+    contadores y sumas, sin bloqueo ni asignaciones por trama salvo la primera
+    vez que aparece un op.
+    """
+
+    __slots__ = (
+        "connects",
+        "connect_failures",
+        "connect_ms",
+        "timeouts",
+        "requests",
+        "bytes_in",
+        "bytes_out",
+        "last_contact",
+        "latency",
+    )
+
+    def __init__(self):
+        """Inicializar los contadores a cero."""
+        self.connects = 0
+        self.connect_failures = 0
+        self.connect_ms = None
+        self.timeouts = 0
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.last_contact = None
+        self.latency = {}
+
+    def observe_connect(self, seconds):
+        """Registrar una conexión abierta y lo que tardó."""
+        self.connects += 1
+        self.connect_ms = round(seconds * 1000, 2)
+
+    def observe_response(self, op, seconds):
+        """Registrar la latencia de ida y vuelta de una respuesta."""
+        self.requests += 1
+        self.last_contact = time.time()
+        histogram = self.latency.get(op)
+        if histogram is None:
+            histogram = self.latency[op] = LatencyHistogram()
+        histogram.observe(seconds * 1000)
+
+    @property
+    def mean_latency_ms(self):
+        """Latencia media de todas las operaciones, en milisegundos."""
+        count = sum(h.count for h in self.latency.values())
+        if not count:
+            return None
+        return round(sum(h.total for h in self.latency.values()) / count, 1)
+
+    def as_dict(self, decode_errors=0):
+        """Representación para los diagnósticos."""
+        return {
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "last_connect_ms": self.connect_ms,
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "decode_errors": decode_errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "last_contact": self.last_contact,
+            "latency_by_op": {str(op): h.as_dict() for op, h in sorted(self.latency.items(), key=lambda i: str(i[0]))},
+        }
@@ -0,0 +1,168 @@
+import logging
+import json
+import re
+from collections import OrderedDict
+
+_LOGGER = logging.getLogger(__name__)
+
+# Dentro de una trama: todo lo que no es llave (saltando cadenas completas con
+# sus escapes) hasta la siguiente llave. Los cuantificadores posesivos evitan
+# el backtracking cuando la trama todavía está incompleta.
+_NEXT_BRACE = re.compile(rb'(?:[^"{}]++|"[^"\\]*+(?:\\.[^"\\]*+)*+")*+[{}]', re.DOTALL)
+_RBRACE = ord("}")
+
+# Tamaño máximo de una trama; si se supera se descarta para no crecer sin límite
+MAX_FRAME_SIZE = 65536
+
+# Tramas con argumentos (posición, color...) que se guardan ya serializadas por ventana
+FRAME_CACHE_SIZE = 32
+
+# Separadores JSON: los de `json.dumps` por defecto y los de la codificación compacta
+PLAIN_SEPARATORS = (", ", ": ")
+COMPACT_SEPARATORS = (",", ":")
+
+
+class FrameBuilder:
+    """Tramas de petición pre-serializadas de una ventana.
+
+    `bearer`, `type` y `op` son fijos por ventana y operación: su prefijo se
+    serializa una vez y solo se añaden los argumentos. Las tramas de lectura
+    (sin argumentos, una por op) se guardan todas y las de comandos con
+    argumentos en una LRU de `FRAME_CACHE_SIZE` entradas por (op, args). La
+    salida es byte a byte la de `json.dumps(mensaje) + "\n"`, o la misma sin
+    espacios si la ventana admite la codificación compacta.
+    """
+
+    __slots__ = ("bearer", "compact", "_separators", "_reads", "_prefixes", "_frames")
+
+    def __init__(self, bearer, ops=(), compact=False):
+        """Preparar las tramas de lectura de `ops` firmadas con `bearer`."""
+        self.bearer = bearer
+        self.compact = compact
+        self._separators = COMPACT_SEPARATORS if compact else PLAIN_SEPARATORS
+        self._reads = {}
+        self._prefixes = {}
+        self._frames = OrderedDict()
+        for op in ops:
+            self.build(op)
+
+    def _prefix(self, op):
+        """`{"bearer": ..., "type": "plain", "op": ...` sin cerrar, ya codificado."""
+        prefix = self._prefixes.get(op)
+        if prefix is None:
+            item, key = self._separators
+            prefix = self._prefixes[op] = (
+                f'{{"bearer"{key}{json.dumps(self.bearer)}{item}"type"{key}"plain"{item}"op"{key}{json.dumps(op)}'
+            ).encode()
+        return prefix
+
+    def _encode(self, op, args):
+        """Serializar la trama completa de `op` con sus argumentos."""
+        if args is None:
+            return self._prefix(op) + b"}\n"
+        item, key = self._separators
+        encoded = json.dumps(args, separators=self._separators)
+        return self._prefix(op) + f'{item}"args"{key}{encoded}}}\n'.encode()
+
+    def build(self, op, args=None):
+        """Trama lista para enviar de `op` con `args` (None si no lleva)."""
+        if args is None:
+            frame = self._reads.get(op)
+            if frame is None:
+                frame = self._reads[op] = self._encode(op, None)
+            return frame
+
+        # El tipo forma parte de la clave: 1, 1.0 y True se serializan distinto
+        key = (op, type(args), args)
+        try:
+            frame = self._frames.get(key)
+        except TypeError:  # Argumentos no hashables: sin caché
+            return self._encode(op, args)
+        if frame is not None:
+            self._frames.move_to_end(key)
+            return frame
+        frame = self._frames[key] = self._encode(op, args)
+        if len(self._frames) > FRAME_CACHE_SIZE:
+            self._frames.popitem(last=False)
+        return frame
+
+
+class FrameDecoder:
+    """Decodificador incremental de tramas JSON sobre un flujo TCP persistente.
+
+    Continúa en cada lectura desde la última llave analizada contando la profundidad de
+    llaves (las cadenas, con sus escapes, se saltan enteras), de modo que una
+    respuesta partida en varios segmentos, varias respuestas juntas o el
+    relleno `\\x00` entre tramas se resuelven sin volver a analizar el buffer
+    completo.
+    """
+
+    __slots__ = ("_buffer", "_pos", "_start", "_depth", "errors")
+
+    def __init__(self):
+        """Inicializar el decodificador vacío."""
+        self._buffer = bytearray()
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        """Descartar los datos pendientes (p. ej. tras reconectar)."""
+        self._buffer.clear()
+        self._pos = 0
+        self._start = 0
+        self._depth = 0
+
+    def feed(self, data):
+        """Añadir bytes recibidos y devolver la lista de mensajes completos."""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+
+        pos = self._pos
+        start = self._start
+        depth = self._depth
+
+        while True:
+            if not depth:
+                # Entre tramas solo interesa la llave de apertura (se ignora el relleno)
+                start = buffer.find(b"{", pos)
+                if start < 0:
+                    break
+                depth = 1
+                pos = start + 1
+
+            match = _NEXT_BRACE.match(buffer, pos)
+            if match is None:
+                # Trama incompleta: se sigue desde aquí cuando lleguen más datos
+                break
+
+            pos = match.end()
+            if buffer[pos - 1] == _RBRACE:
+                depth -= 1
+                if not depth:
+                    try:
+                        frames.append(json.loads(buffer[start:pos].decode()))
+                    except ValueError as e:
+                        self.errors += 1
+                        _LOGGER.debug("Trama JSON inválida descartada: %s", e)
+            else:
+                depth += 1
+
+        if depth and len(buffer) - start > MAX_FRAME_SIZE:
+            self.errors += 1
+            _LOGGER.debug("Trama de más de %s bytes descartada", MAX_FRAME_SIZE)
+            depth = 0
+
+        if depth:
+            # Conservar solo la trama incompleta
+            del buffer[:start]
+            pos -= start
+            start = 0
+        else:
+            buffer.clear()
+            pos = 0
+
+        self._pos = pos
+        self._start = start
+        self._depth = depth
+        return frames
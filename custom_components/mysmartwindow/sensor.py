@@ -1,143 +1,398 @@
-import logging
-import asyncio
-import json
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.device_registry import async_get as async_get_device_registry
-from homeassistant.const import STATE_UNKNOWN
-from .const import DOMAIN,COMMANDS
-from datetime import timedelta
-
-SCAN_INTERVAL = timedelta(seconds=15)
-
-_LOGGER = logging.getLogger(__name__)
-
-async def async_setup_entry(hass, entry, async_add_entities):
-    """Configura los sensores para MySmartWindow."""
-    devices = []
-    raw_data = hass.data[DOMAIN].get("devices", [])
-
-    if not isinstance(raw_data, list) or not raw_data:
-        _LOGGER.error("Estructura inesperada de los dispositivos: %s", type(raw_data))
-        return
-    
-    device_registry = async_get_device_registry(hass)
-    
-    for building in raw_data:
-        home = building.get("Home", {})
-        rooms = home.get("Rooms", [])
-
-        for room in rooms:
-            room_name = room.get("Name", "Sala Desconocida")
-            windows = room.get("Windows", []) or []
-            for window in windows:
-                
-                window_name = window.get("Name", "Ventana Desconocida")
-                sensors = window.get("Sensors", [])
-                if not isinstance(sensors, list):
-                    sensors = []
-                for sensor in sensors:
-                    device_registry.async_get_or_create(
-                    config_entry_id=entry.entry_id,
-                    identifiers={(DOMAIN, window_name)},
-                    manufacturer="MySmartWindow",
-                    model="Smart Cover",
-                    name=f"{room_name} - {window.get('Name', 'Ventana Desconocida')}",
-                    sw_version="1.0",
-                    )
-                    devices.append(MySmartWindowSensor(window, sensor, room_name, home, window_name))
-    if devices:
-        async_add_entities(devices, update_before_add=True)
-    else:
-        _LOGGER.warning("No se encontraron sensores válidos para agregar a Home Assistant.")
-
-class MySmartWindowSensor(SensorEntity):
-    """Entidad de sensor para MySmartWindow."""
-
-    def __init__(self, window, sensor, room_name, home, window_name):
-        """Inicializa el sensor."""
-        self._window = window
-        self._sensor = sensor
-        self._room_name = room_name
-        self._home = home
-        self._window_name = window_name
-        self._attr_name = f"{room_name} - {window_name} - Sensor {sensor.get('Op', 'Desconocido')}"
-        self._state = sensor.get("Value", "unknown")
-        self._ip = window.get("Ip", "0.0.0.0")
-        self._port = 443  # Puerto del socket TCP
-        self._bearer = home.get("Bearer", "")
-        self._attr_unique_id = f"{self._ip}-{sensor.get('Op', 'unknown')}"
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, self._attr_unique_id)},
-            "name": self._attr_name,
-            "manufacturer": "MySmartWindow",
-            "model": "Smart Cover",
-        }
-        
-    @property
-    def unique_id(self):
-        """Devuelve un ID único para el sensor."""
-        return self._attr_unique_id
-
-    @property
-    def state(self):
-        """Devuelve el estado actual del sensor."""
-        return self._state
-        
-    async def async_update(self):
-        """Actualizar el valor del sensor desde el dispositivo."""
-        try:
-            updated_value = await self._get_updated_value()
-            
-            if updated_value is not None:
-                self._state = updated_value
-                self.async_write_ha_state()  # 📝 Asegura que el estado se actualiza en la UI
-                
-        except Exception as e:
-            _LOGGER.error("Error actualizando sensor %s: %s", self._attr_name, e)
-            
-    async def _get_updated_value(self):
-        """Obtener el valor actualizado del sensor usando socket TCP."""
-        message = json.dumps({
-            "bearer": self._bearer,
-            "type": "plain",
-            "op": self._sensor["Op"]
-        }) + "\n" 
-    
-        try:
-            # Intentar conexión con timeout
-            reader, writer = await asyncio.wait_for(asyncio.open_connection(self._ip, self._port), timeout=10)
-    
-            writer.write(message.encode())  
-            await writer.drain()  # Asegura que el mensaje se envió completamente
-            
-            data = await reader.read(1000)  # Leer respuesta
-            
-            response = data
-            
-            response = response.replace(b'\x00', b'').strip()
-            
-            writer.close()
-            
-            await writer.wait_closed()  # Cierra la conexión correctamente
-            # Intentar parsear JSON
-            try:
-                
-                response_json = json.loads(response.decode()) 
-                 
-                if "value" in response_json:
-                    return response_json["value"]
-                else:
-                    return self._sensor.get("Value", STATE_UNKNOWN)
-    
-            except json.JSONDecodeError:
-                _LOGGER.error("Error al decodificar JSON: %s", response)
-                return self._sensor.get("Value", STATE_UNKNOWN)
-    
-        except asyncio.TimeoutError:
-            _LOGGER.error("Timeout al conectar con %s:%d", self._ip, self._port)
-        except Exception as e:
-            _LOGGER.error("Error obteniendo valor del sensor %s: %s", self._attr_name, e)
-    
-
-        return self._sensor["value"]  # Devuelve el último valor conocido si falla
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import (
+    CONCENTRATION_PARTS_PER_MILLION,
+    PERCENTAGE,
+    EntityCategory,
+    UnitOfPressure,
+    UnitOfTemperature,
+    UnitOfTime,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from .const import (
+    DOMAIN,
+    COMMANDS,
+    SIGNAL_INVENTORY,
+    CONF_DIAGNOSTIC_SENSORS,
+    DEFAULT_DIAGNOSTIC_SENSORS,
+    CONF_SENSOR_MAX_INTERVAL,
+    DEFAULT_SENSOR_MAX_INTERVAL,
+    SENSOR_STATS_WINDOW,
+)
+from .history import SensorHistory
+
+_LOGGER = logging.getLogger(__name__)
+
+# Margen al comparar con la banda muerta: 21.2 - 21.0 da 0.19999... en coma flotante
+DEADBAND_TOLERANCE = 1e-9
+
+
+@dataclass(frozen=True, kw_only=True)
+class MySmartWindowSensorEntityDescription(SensorEntityDescription):
+    """Descripción de un sensor de la ventana.
+
+    `key` es el nombre del op en `COMMANDS`; `deadband` es el cambio mínimo
+    respecto al último valor escrito para volver a escribir el estado.
+    """
+
+    deadband: float = 0
+
+
+# Sensores conocidos: op -> descripción (clase, unidad, precisión y banda muerta)
+SENSOR_DESCRIPTIONS = {
+    COMMANDS[description.key]["op"]: description
+    for description in (
+        MySmartWindowSensorEntityDescription(
+            key="TEMPERATURE",
+            name="Temperatura",
+            device_class=SensorDeviceClass.TEMPERATURE,
+            native_unit_of_measurement=UnitOfTemperature.CELSIUS,
+            state_class=SensorStateClass.MEASUREMENT,
+            suggested_display_precision=1,
+            deadband=0.2,
+        ),
+        MySmartWindowSensorEntityDescription(
+            key="HUMEDITY",
+            name="Humedad",
+            device_class=SensorDeviceClass.HUMIDITY,
+            native_unit_of_measurement=PERCENTAGE,
+            state_class=SensorStateClass.MEASUREMENT,
+            suggested_display_precision=0,
+            deadband=1,
+        ),
+        MySmartWindowSensorEntityDescription(
+            key="Co2",
+            name="CO2",
+            device_class=SensorDeviceClass.CO2,
+            native_unit_of_measurement=CONCENTRATION_PARTS_PER_MILLION,
+            state_class=SensorStateClass.MEASUREMENT,
+            suggested_display_precision=0,
+            deadband=25,
+        ),
+        # Índice VOC sin unidad (100 es la referencia del aire habitual)
+        MySmartWindowSensorEntityDescription(
+            key="VOC",
+            name="Índice VOC",
+            state_class=SensorStateClass.MEASUREMENT,
+            suggested_display_precision=0,
+            deadband=10,
+        ),
+        MySmartWindowSensorEntityDescription(
+            key="IAQ",
+            name="Calidad del aire (IAQ)",
+            device_class=SensorDeviceClass.AQI,
+            state_class=SensorStateClass.MEASUREMENT,
+            suggested_display_precision=0,
+            deadband=5,
+        ),
+        MySmartWindowSensorEntityDescription(
+            key="BAROMETRO",
+            name="Presión",
+            device_class=SensorDeviceClass.ATMOSPHERIC_PRESSURE,
+            native_unit_of_measurement=UnitOfPressure.HPA,
+            state_class=SensorStateClass.MEASUREMENT,
+            suggested_display_precision=1,
+            deadband=0.5,
+        ),
+    )
+}
+
+
+def sensor_description(op):
+    """Descripción del op; los desconocidos se muestran tal cual, sin unidad."""
+    description = SENSOR_DESCRIPTIONS.get(op)
+    if description is None:
+        description = MySmartWindowSensorEntityDescription(
+            key=str(op), name=f"Sensor {op if op is not None else 'Desconocido'}"
+        )
+    return description
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Configura los sensores para MySmartWindow."""
+    topology = hass.data[DOMAIN]["topology"]
+    coordinators = hass.data[DOMAIN]["coordinators"]
+    max_interval = entry.options.get(CONF_SENSOR_MAX_INTERVAL, DEFAULT_SENSOR_MAX_INTERVAL)
+
+    devices = [
+        MySmartWindowSensor(coordinators[sensor.window.window_id], sensor, max_interval)
+        for sensor in topology.sensors
+    ]
+
+    if devices:
+        async_add_entities(devices)
+    else:
+        _LOGGER.warning("No se encontraron sensores válidos para agregar a Home Assistant.")
+
+    analytics = hass.data[DOMAIN]["analytics"]
+    async_add_entities(
+        MySmartWindowFleetSensor(analytics, building.key, kind)
+        for building in topology.buildings
+        for kind in FLEET_SENSORS
+    )
+
+    diagnostics = entry.options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS)
+    if diagnostics:
+        async_add_entities(
+            MySmartWindowDiagnosticSensor(coordinators[window_id], kind)
+            for window_id in topology.windows
+            for kind in DIAGNOSTIC_SENSORS
+        )
+
+    @callback
+    def async_add_windows(windows):
+        """Añadir los sensores de las ventanas nuevas o modificadas del inventario."""
+        entity_registry = async_get_entity_registry(hass)
+        entities = [
+            MySmartWindowSensor(coordinators[window.window_id], sensor, max_interval)
+            for window in windows
+            for sensor in window.sensors
+            if entity_registry.async_get_entity_id("sensor", DOMAIN, sensor.unique_id) is None
+        ]
+        entities.extend(
+            MySmartWindowFleetSensor(analytics, building, kind)
+            for building in {window.room.building.key for window in windows}
+            for kind in FLEET_SENSORS
+            if entity_registry.async_get_entity_id("sensor", DOMAIN, f"building-{building}-{kind}") is None
+        )
+        if diagnostics:
+            entities.extend(
+                MySmartWindowDiagnosticSensor(coordinators[window.window_id], kind)
+                for window in windows
+                for kind in DIAGNOSTIC_SENSORS
+                if entity_registry.async_get_entity_id("sensor", DOMAIN, f"{window.window_id}-{kind}") is None
+            )
+        async_add_entities(entities)
+
+    entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_INVENTORY.format(entry.entry_id), async_add_windows)
+    )
+
+def _as_number(value):
+    """Valor numérico de una lectura, o None si no lo es."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MySmartWindowSensor(CoordinatorEntity, SensorEntity):
+    """Entidad de sensor para MySmartWindow.
+
+    La unidad, la clase y la banda muerta salen de `SENSOR_DESCRIPTIONS`; los
+    sensores conocidos son numéricos y de medida, así que Home Assistant
+    guarda estadísticas a largo plazo en lugar de un historial de texto.
+
+    Cada lectura se guarda en un historial en memoria, pero el estado solo se
+    escribe (y llega al recorder) cuando se aleja del último valor escrito más
+    que la banda muerta del op, o cuando pasan `max_interval` segundos. Los
+    atributos min/max/mean resumen la última hora sin consultar el recorder.
+    """
+
+    def __init__(self, coordinator, sensor, max_interval=DEFAULT_SENSOR_MAX_INTERVAL):
+        """Inicializa el sensor."""
+        super().__init__(coordinator)
+        window = sensor.window
+        self._window = window
+        self._sensor = sensor
+        self._room_name = window.room.name
+        self._window_name = window.name
+        self.entity_description = sensor_description(sensor.op)
+        self._numeric = self.entity_description.state_class is not None
+        self._attr_name = f"{window.full_name} - {self.entity_description.name}"
+        self._ip = window.ip
+        self._max_interval = max_interval
+        self._history = SensorHistory()
+        # Hasta la primera consulta se muestra el valor del inventario
+        self._written_number = _as_number(sensor.value)
+        self._state = self._written_number if self._numeric else sensor.value
+        self._written_at = None
+        self._written_available = True
+        self._attr_unique_id = sensor.unique_id
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, window.window_id)},
+            "name": window.full_name,
+            "manufacturer": "MySmartWindow",
+            "model": "Smart Cover",
+        }
+        self._update_from_coordinator()
+
+    @property
+    def available(self):
+        """No disponible mientras la ventana no responde (circuito abierto)."""
+        return self.coordinator.available
+
+    @property
+    def unique_id(self):
+        """Devuelve un ID único para el sensor."""
+        return self._attr_unique_id
+
+    @property
+    def native_value(self):
+        """Devuelve el valor actual del sensor (numérico en los sensores conocidos)."""
+        return self._state
+
+    def _should_write(self, value, number, now):
+        """Indica si la lectura merece escribirse como nuevo estado."""
+        if self._written_at is None:
+            return True
+        if self._max_interval and now - self._written_at >= self._max_interval:
+            return True
+        if number is None or self._written_number is None:
+            return value != self._state
+        # Banda muerta respecto al último valor escrito (no al último leído):
+        # una deriva lenta acaba escribiéndose, el ruido alrededor no
+        change = abs(number - self._written_number)
+        return change > 0 and change >= self.entity_description.deadband - DEADBAND_TOLERANCE
+
+    def _update_from_coordinator(self):
+        """Tomar el valor del sensor de los datos del coordinador.
+
+        Devuelve si el estado ha cambiado y hay que escribirlo.
+        """
+        data = self.coordinator.data or {}
+        updated_value = data.get(self._sensor.op)
+        if updated_value is None:
+            return False
+
+        now = time.monotonic()
+        number = _as_number(updated_value)
+        if number is not None:
+            self._history.add(now, number)
+        elif self._numeric:
+            _LOGGER.debug("Valor no numérico del sensor %s: %s", self._attr_name, updated_value)
+            return False
+        if not self._should_write(updated_value, number, now):
+            return False
+
+        self._state = number if self._numeric else updated_value
+        self._written_number = number
+        self._written_at = now
+        self._attr_extra_state_attributes = self._history.stats(now - SENSOR_STATS_WINDOW)
+        return True
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Actualizar el sensor solo si el cambio es significativo o cambia la disponibilidad."""
+        changed = self._update_from_coordinator()
+        available = self.available
+        if changed or available != self._written_available:
+            self._written_available = available
+            super()._handle_coordinator_update()
+
+
+# Sensores de diagnóstico: clave -> (nombre, unidad, clase de dispositivo)
+DIAGNOSTIC_SENSORS = {
+    "latency": ("Latencia", UnitOfTime.MILLISECONDS, None),
+    "timeouts": ("Tiempos de espera agotados", None, None),
+    "last_contact": ("Último contacto", None, SensorDeviceClass.TIMESTAMP),
+}
+
+
+class MySmartWindowDiagnosticSensor(CoordinatorEntity, SensorEntity):
+    """Métrica de la conexión con una ventana (latencia, timeouts, último contacto)."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    @property
+    def available(self):
+        """Siempre disponible: las métricas sirven justo cuando la ventana no responde."""
+        return True
+
+    def __init__(self, coordinator, kind):
+        """Inicializa el sensor de diagnóstico."""
+        super().__init__(coordinator)
+        window = coordinator.window
+        name, unit, device_class = DIAGNOSTIC_SENSORS[kind]
+        self._kind = kind
+        self._attr_name = f"{window.full_name} - {name}"
+        self._attr_unique_id = f"{window.window_id}-{kind}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, window.window_id)},
+        }
+
+    @property
+    def native_value(self):
+        """Valor actual de la métrica."""
+        metrics = self.coordinator.connection.metrics
+        if self._kind == "latency":
+            return metrics.mean_latency_ms
+        if self._kind == "timeouts":
+            return metrics.timeouts
+        if metrics.last_contact is None:
+            return None
+        return datetime.fromtimestamp(metrics.last_contact, timezone.utc)
+
+
+# Resúmenes por edificio de la analítica de la flota: medias de la última hora
+# de estos sensores y número de salas que necesitan ventilación
+FLEET_SENSORS = ("Co2", "VOC", "IAQ", "airing")
+
+
+class MySmartWindowFleetSensor(CoordinatorEntity, SensorEntity):
+    """Resumen de la analítica de la flota para un edificio (por su clave única)."""
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, building, kind):
+        """Inicializa el sensor de resumen del edificio."""
+        super().__init__(coordinator)
+        self._building = building
+        self._kind = kind
+        if kind == "airing":
+            self._attr_name = f"{building} - Salas a ventilar"
+            self._attr_icon = "mdi:window-open-variant"
+        else:
+            description = SENSOR_DESCRIPTIONS[COMMANDS[kind]["op"]]
+            self._attr_name = f"{building} - {description.name} medio"
+            self._attr_device_class = description.device_class
+            self._attr_native_unit_of_measurement = description.native_unit_of_measurement
+            self._attr_suggested_display_precision = description.suggested_display_precision
+        self._attr_unique_id = f"building-{building}-{kind}"
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, f"building-{building}")},
+            "name": building,
+            "manufacturer": "MySmartWindow",
+            "model": "Edificio",
+        }
+
+    @property
+    def _summary(self):
+        """Agregados del edificio en el último cálculo."""
+        return (self.coordinator.data or {}).get(self._building)
+
+    @property
+    def native_value(self):
+        """Media del edificio o número de salas a ventilar."""
+        summary = self._summary
+        if summary is None:
+            return None
+        if self._kind == "airing":
+            return len(summary["airing"])
+        return summary["mean"][self._kind]
+
+    @property
+    def extra_state_attributes(self):
+        """Detalle por sala."""
+        summary = self._summary
+        if summary is None:
+            return None
+        if self._kind == "airing":
+            return {"rooms": summary["airing"]}
+        return {
+            "exceedances": summary["exceedances"][self._kind],
+            "rooms": {name: room["mean"][self._kind] for name, room in summary["rooms"].items()},
+        }
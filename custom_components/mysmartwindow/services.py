@@ -0,0 +1,137 @@
+import logging
+import asyncio
+import voluptuous as vol
+from homeassistant.core import SupportsResponse, callback
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+from .const import DOMAIN, COMMANDS, COMMAND_SLOTS, SERVICE_BULK_COMMAND, BULK_MAX_CONCURRENCY
+
+_LOGGER = logging.getLogger(__name__)
+
+WINDOW_STATE_OP = COMMANDS["WINDOW STATE"]["op"]
+LED_STATE_OP = COMMANDS["LED STATE"]["op"]
+
+# Estado que deja cada comando (op -> valor), el mismo que aplican las entidades.
+# Las persianas no tienen valor esperado: las sigue su modelo (`BlindModel`).
+EXPECTED = {
+    "LED ON": {LED_STATE_OP: 1},
+    "LED OFF": {LED_STATE_OP: 0},
+    "WINDOW OPEN": {WINDOW_STATE_OP: 1},
+    "WINDOW CLOSE": {WINDOW_STATE_OP: 0},
+    "WINDOW MICRO OPEN": {WINDOW_STATE_OP: 1},
+}
+
+# Comandos que mueven la ventana: se consulta su estado rápido hasta que termina
+MOTION_OPS = {
+    "WINDOW OPEN": WINDOW_STATE_OP,
+    "WINDOW CLOSE": WINDOW_STATE_OP,
+    "WINDOW MICRO OPEN": WINDOW_STATE_OP,
+}
+
+BULK_COMMAND_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required("command"): vol.In(list(COMMANDS)),
+            vol.Optional("args"): vol.Any(int, float, str),
+            vol.Optional("window_ids"): vol.All(cv.ensure_list, [cv.string]),
+            vol.Optional("room"): cv.string,
+            vol.Optional("building"): cv.string,
+        }
+    ),
+    cv.has_at_least_one_key("window_ids", "room", "building"),
+)
+
+
+def _expected(command, args):
+    """Valores de estado que dejará el comando en la ventana."""
+    if command == "LED COLOR SELECTION" and isinstance(args, int):
+        return {COMMANDS["LED COLOR STATE"]["op"]: args}
+    return EXPECTED.get(command)
+
+
+async def _async_send(coordinator, command, args, limiter):
+    """Enviar el comando a una ventana y devolver su resultado.
+
+    Las órdenes pasan por `async_command`, como las de las entidades: estado
+    optimista que se deshace si la ventana no confirma, agrupación con las
+    órdenes pendientes y modelo de la persiana. Las consultas (estados y
+    sensores) se envían tal cual y devuelven el valor leído.
+    """
+    if not coordinator.available:
+        return {"success": False, "error": "ventana no disponible"}
+    if command in COMMAND_SLOTS:
+        if command in MOTION_OPS:
+            coordinator.async_start_motion(MOTION_OPS[command])
+        error = await coordinator.async_command([(command, args)], _expected(command, args))
+        if error is not None:
+            return {"success": False, "error": str(error) or type(error).__name__}
+        return {"success": True}
+
+    async with limiter:
+        try:
+            respuesta = await coordinator.async_send(COMMANDS[command]["op"], args)
+        except (OSError, asyncio.TimeoutError) as e:
+            return {"success": False, "error": str(e) or type(e).__name__}
+
+    if not isinstance(respuesta, dict) or "error" in respuesta:
+        return {"success": False, "error": f"respuesta inesperada: {respuesta}"}
+    return {"success": True, "value": respuesta.get("value")}
+
+
+async def _async_bulk_command(hass, call):
+    """Enviar un comando a todas las ventanas de una sala, un edificio o una lista.
+
+    Se envía a todas a la vez (las consultas, como mucho `BULK_MAX_CONCURRENCY`
+    en curso; las órdenes, con el límite global de peticiones por socket) y
+    después se consulta el estado de todas en un único ciclo concurrente.
+    """
+    domain_data = hass.data[DOMAIN]
+    windows = domain_data["topology"].select(
+        call.data.get("window_ids"), call.data.get("room"), call.data.get("building")
+    )
+    if not windows:
+        raise ServiceValidationError("No hay ventanas que coincidan con el destino indicado")
+
+    coordinators = domain_data["coordinators"]
+    command = call.data["command"]
+    args = call.data.get("args")
+    limiter = asyncio.Semaphore(BULK_MAX_CONCURRENCY)
+
+    targets = [coordinators[window.window_id] for window in windows]
+    outcomes = await asyncio.gather(*(_async_send(c, command, args, limiter) for c in targets))
+    results = {c.window_id: outcome for c, outcome in zip(targets, outcomes)}
+
+    failed = [window_id for window_id, outcome in results.items() if not outcome["success"]]
+    if failed:
+        _LOGGER.warning("%s falló en %s de %s ventanas: %s", command, len(failed), len(results), failed)
+
+    # Una consulta por ventana, todas a la vez, para reflejar el nuevo estado
+    await asyncio.gather(*(c.async_refresh() for c in targets))
+
+    if call.return_response:
+        return {"results": results}
+    return None
+
+
+@callback
+def async_setup_services(hass):
+    """Registrar los servicios de la integración."""
+    if hass.services.has_service(DOMAIN, SERVICE_BULK_COMMAND):
+        return
+
+    async def handle_bulk_command(call):
+        return await _async_bulk_command(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BULK_COMMAND,
+        handle_bulk_command,
+        schema=BULK_COMMAND_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+@callback
+def async_unload_services(hass):
+    """Quitar los servicios de la integración."""
+    hass.services.async_remove(DOMAIN, SERVICE_BULK_COMMAND)
@@ -0,0 +1,117 @@
+import logging
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+from .const import DOMAIN, SNAPSHOT_SAVE_DELAY
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+
+def _parse_state(window_id, state):
+    """Recuperar los códigos de operación de un estado guardado.
+
+    JSON guarda las claves como texto. Las que no son un número se
+    descartan: una clave corrupta no debe impedir arrancar la integración.
+    """
+    parsed = {}
+    for op, value in state.items():
+        try:
+            parsed[int(op)] = value
+        except ValueError:
+            _LOGGER.debug("Operación no válida en la copia local de %s: %s", window_id, op)
+    return parsed
+
+
+class InventorySnapshot:
+    """Copia local del inventario de la nube y del último estado de cada ventana.
+
+    Se guarda con `Store` de Home Assistant (`.storage/mysmartwindow.<entry_id>`)
+    para arrancar sin esperar a la nube ni a las ventanas: las entidades se
+    crean con el último estado conocido y se reconcilian en segundo plano.
+    """
+
+    def __init__(self, hass, entry):
+        """Inicializar la copia local de la entrada."""
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+        self._coordinators = {}
+        self._unsubs = {}
+        self.devices = None
+        self.states = {}
+        # Tiempos de recorrido calibrados de las persianas: window_id -> [subida, bajada]
+        self.travel = {}
+
+    async def async_load(self):
+        """Leer la copia local; si no existe se deja vacía."""
+        data = await self._store.async_load() or {}
+        self.devices = data.get("devices")
+        self.states = {
+            window_id: _parse_state(window_id, state)
+            for window_id, state in (data.get("states") or {}).items()
+            if isinstance(state, dict)
+        }
+        self.travel = data.get("travel") or {}
+        _LOGGER.debug(
+            "Copia local cargada: inventario %s, %s ventanas con estado",
+            "sí" if self.devices is not None else "no", len(self.states),
+        )
+
+    @callback
+    def async_track(self, window_id, coordinator):
+        """Guardar el estado de la ventana cada vez que su coordinador trae datos."""
+        self._coordinators[window_id] = coordinator
+        self._unsubs[window_id] = coordinator.async_add_listener(self._async_schedule_save)
+
+    @callback
+    def async_untrack(self, window_id):
+        """Dejar de guardar el estado de una ventana retirada del inventario."""
+        self._coordinators.pop(window_id, None)
+        unsub = self._unsubs.pop(window_id, None)
+        if unsub is not None:
+            unsub()
+        self.states.pop(window_id, None)
+        self.travel.pop(window_id, None)
+        self._async_schedule_save()
+
+    @callback
+    def async_set_devices(self, devices):
+        """Sustituir el inventario guardado por el recibido de la nube."""
+        self.devices = devices
+        self._async_schedule_save()
+
+    @callback
+    def async_set_travel(self, window_id, travel_up, travel_down):
+        """Guardar los tiempos de recorrido calibrados de una persiana."""
+        self.travel[window_id] = [travel_up, travel_down]
+        self._async_schedule_save()
+
+    @callback
+    def _async_schedule_save(self):
+        """Agrupar las escrituras en disco cada `SNAPSHOT_SAVE_DELAY`."""
+        self._store.async_delay_save(self._data_to_save, SNAPSHOT_SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        """Datos a escribir: inventario, último estado de cada ventana y calibración."""
+        for window_id, coordinator in self._coordinators.items():
+            if coordinator.data:
+                self.states[window_id] = coordinator.data
+        return {"devices": self.devices, "states": self.states, "travel": self.travel}
+
+    async def async_save(self):
+        """Escribir la copia local inmediatamente (al descargar la integración)."""
+        await self._store.async_save(self._data_to_save())
+
+
+async def async_replace_devices(hass, entry, devices):
+    """Guardar en la copia local un inventario obtenido fuera del refresco (reautenticación).
+
+    El arranque prefiere la copia local a `entry.data`: sin esto, el
+    inventario recién descargado no se usaría hasta el siguiente refresco.
+    """
+    snapshot = hass.data.get(DOMAIN, {}).get("snapshot")
+    if snapshot is None:
+        snapshot = InventorySnapshot(hass, entry)
+        await snapshot.async_load()
+    snapshot.devices = devices
+    await snapshot.async_save()
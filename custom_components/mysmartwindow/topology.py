@@ -0,0 +1,191 @@
+import logging
+from .const import SOCKET_PORT
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _assign_keys(items):
+    """Dar a cada sala o edificio una clave única: su nombre, con " (2)", " (3)"... si se repite."""
+    used = set()
+    for item in items:
+        key, count = item.name, 1
+        while key in used:
+            count += 1
+            key = f"{item.name} ({count})"
+        used.add(key)
+        item.key = key
+
+
+class Sensor:
+    """Sensor de una ventana."""
+
+    __slots__ = ("op", "value", "window")
+
+    def __init__(self, raw, window):
+        """Crear el sensor a partir de su entrada en el inventario de la nube."""
+        self.op = raw.get("Op")
+        self.value = raw.get("Value")
+        self.window = window
+
+    @property
+    def unique_id(self):
+        """ID único de la entidad del sensor: `Ip-Op`."""
+        return f"{self.window.ip}-{self.op if self.op is not None else 'unknown'}"
+
+
+class Window:
+    """Ventana con su IP, servicios y sensores."""
+
+    __slots__ = ("window_id", "name", "ip", "port", "services", "sensors", "room")
+
+    def __init__(self, raw, room):
+        """Crear la ventana a partir de su entrada en el inventario de la nube."""
+        self.window_id = raw.get("Id_Window")
+        self.name = raw.get("Name", "Ventana Desconocida")
+        self.ip = raw.get("Ip", "0.0.0.0")
+        # La nube no envía `Port`; solo lo usan inventarios locales como el del simulador
+        self.port = raw.get("Port", SOCKET_PORT)
+        self.services = frozenset(raw.get("Services", []) or [])
+        self.room = room
+        sensors = raw.get("Sensors", [])
+        if not isinstance(sensors, list):
+            sensors = []
+        self.sensors = tuple(Sensor(sensor, self) for sensor in sensors if isinstance(sensor, dict))
+
+    @property
+    def full_name(self):
+        """Nombre mostrado en Home Assistant: `Sala - Ventana`."""
+        return f"{self.room.name} - {self.name}"
+
+    @property
+    def bearer(self):
+        """Token del edificio con el que se firman las tramas."""
+        return self.room.building.bearer
+
+
+class Room:
+    """Sala de un edificio.
+
+    `key` es el nombre de la sala, o el nombre con un número si otra sala
+    del mismo edificio se llama igual.
+    """
+
+    __slots__ = ("name", "key", "windows", "building")
+
+    def __init__(self, raw, building):
+        """Crear la sala a partir de su entrada en el inventario de la nube."""
+        self.name = raw.get("Name", "Sala Desconocida")
+        self.key = self.name
+        self.building = building
+        self.windows = tuple(
+            Window(window, self)
+            for window in raw.get("Windows", []) or []
+            if isinstance(window, dict) and window.get("Id_Window")
+        )
+
+
+class Building:
+    """Edificio (`Home`) con su token y sus salas.
+
+    La nube no da un id de edificio: `key` es el nombre, o el nombre con un
+    número si otro edificio del inventario se llama igual.
+    """
+
+    __slots__ = ("name", "key", "bearer", "rooms")
+
+    def __init__(self, raw):
+        """Crear el edificio a partir de su entrada en el inventario de la nube."""
+        home = raw.get("Home", {}) or {}
+        self.name = home.get("Name", "Edificio Desconocido")
+        self.key = self.name
+        self.bearer = home.get("Bearer", "")
+        self.rooms = tuple(Room(room, self) for room in home.get("Rooms", []) or [])
+        _assign_keys(self.rooms)
+
+
+class Topology:
+    """Inventario de edificios, salas, ventanas y sensores con índices.
+
+    Se construye una vez a partir de `entry.data["devices"]` y las plataformas
+    lo consultan en lugar de recorrer de nuevo el árbol de la nube.
+    """
+
+    __slots__ = ("buildings", "windows", "by_ip", "by_service", "sensors")
+
+    def __init__(self, devices):
+        """Construir el modelo y sus índices."""
+        if not isinstance(devices, list):
+            _LOGGER.error("Estructura inesperada de los dispositivos: %s", type(devices))
+            devices = []
+
+        self.buildings = tuple(Building(building) for building in devices if isinstance(building, dict))
+        _assign_keys(self.buildings)
+        self.windows = {}
+        self.by_ip = {}
+        self.by_service = {}
+        self.sensors = []
+
+        for building in self.buildings:
+            for room in building.rooms:
+                for window in room.windows:
+                    self.windows[window.window_id] = window
+                    self.by_ip[window.ip] = window
+                    for service in window.services:
+                        self.by_service.setdefault(service, []).append(window)
+                    self.sensors.extend(window.sensors)
+
+    def with_service(self, service):
+        """Devuelve las ventanas que ofrecen el servicio (`S5`, `S9`...)."""
+        return self.by_service.get(service, [])
+
+    def select(self, window_ids=None, room=None, building=None):
+        """Devuelve las ventanas indicadas por id, por nombre de sala o de edificio.
+
+        Sala y edificio se combinan: con los dos solo se eligen las ventanas de
+        esa sala en ese edificio (dos edificios pueden tener una sala con el
+        mismo nombre). Las ventanas indicadas por id se añaden a la selección.
+        """
+        selected = {}
+        for window_id in window_ids or []:
+            window = self.windows.get(window_id)
+            if window is not None:
+                selected[window_id] = window
+        if room is not None or building is not None:
+            for window_id, window in self.windows.items():
+                if room is not None and window.room.name != room:
+                    continue
+                if building is not None and window.room.building.name != building:
+                    continue
+                selected[window_id] = window
+        return list(selected.values())
+
+    def entity_keys(self):
+        """Devuelve el conjunto `(plataforma, unique_id)` de las entidades del inventario."""
+        keys = set()
+        for window_id, window in self.windows.items():
+            keys.add(("cover", window_id))
+            if "S9" in window.services:
+                keys.add(("light", window_id))
+            if "S5" in window.services:
+                keys.add(("switch", window_id))
+            keys.update(("sensor", sensor.unique_id) for sensor in window.sensors)
+        return keys
+
+    def platforms(self):
+        """Devuelve las plataformas de HA que necesita el inventario, en orden fijo.
+
+        Toda ventana tiene persiana (`cover`); `light` y `switch` solo hacen
+        falta con ventanas `S9` y `S5`. `sensor` se carga con cualquier
+        edificio porque, además de los sensores de las ventanas (y los de
+        diagnóstico), publica el resumen de la analítica de cada edificio.
+        """
+        platforms = []
+        if self.windows:
+            platforms.append("cover")
+        if self.buildings:
+            platforms.append("sensor")
+        if self.by_service.get("S9"):
+            platforms.append("light")
+        if self.by_service.get("S5"):
+            platforms.append("switch")
+        return platforms
@@ -0,0 +1,255 @@
+import logging
+import time
+from collections import deque
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from .const import (
+    DOMAIN,
+    COMMANDS,
+    SIGNAL_INVENTORY,
+    CONF_VENTILATION_DRY_RUN,
+    DEFAULT_VENTILATION_DRY_RUN,
+    CONF_VENTILATION_ROOMS,
+    DEFAULT_VENTILATION_THRESHOLDS,
+    VENTILATION_HYSTERESIS,
+    VENTILATION_MIN_DWELL,
+    VENTILATION_MAX_ACTIONS,
+    EVENT_VENTILATION,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Niveles de ventilación y el comando que pone las ventanas en cada uno
+LEVELS = ("cerrada", "microventilación", "abierta")
+LEVEL_COMMANDS = ("WINDOW CLOSE", "WINDOW MICRO OPEN", "WINDOW OPEN")
+WINDOW_STATE_OP = COMMANDS["WINDOW STATE"]["op"]
+
+
+def room_key(room):
+    """Clave de una sala en las opciones: "Edificio / Sala"."""
+    return f"{room.building.name} / {room.name}"
+
+
+class RoomVentilation:
+    """Lazo de control de la ventilación de una sala.
+
+    Escucha directamente a los coordinadores de las ventanas de la sala (sin
+    pasar por el bus de eventos ni la máquina de estados) y, con la peor
+    lectura de cada sensor, elige entre cerrar, microventilar o abrir:
+
+    - subir a un nivel requiere superar su umbral; mantenerlo basta con no
+      bajar de `umbral * (1 - VENTILATION_HYSTERESIS)` (histéresis);
+    - entre dos cambios de nivel pasan al menos `VENTILATION_MIN_DWELL`
+      segundos y como mucho hay `VENTILATION_MAX_ACTIONS` cambios por hora;
+    - en simulación (`dry_run`) solo se registra y se lanza el evento.
+
+    Al arrancar el nivel es desconocido: no se cierra lo que ya estuviera
+    abierto hasta que el propio lazo haya abierto alguna vez.
+    """
+
+    def __init__(self, hass, key, windows, coordinators, thresholds, dry_run):
+        """Inicializar el control de la sala."""
+        self.hass = hass
+        self.key = key
+        self.windows = [w for w in windows if "S5" in w.services]
+        self.sensor_windows = list(windows)
+        self.coordinators = coordinators
+        self.thresholds = {
+            name: tuple(values)
+            for name, values in thresholds.items()
+            if name in DEFAULT_VENTILATION_THRESHOLDS
+        }
+        self.dry_run = dry_run
+        self.level = None
+        self.last_change = None
+        self.last_values = {}
+        self._actions = deque()
+        self._unsubs = []
+
+    @callback
+    def async_start(self):
+        """Escuchar las actualizaciones de las ventanas de la sala."""
+        for window in self.sensor_windows:
+            coordinator = self.coordinators.get(window.window_id)
+            if coordinator is not None:
+                self._unsubs.append(coordinator.async_add_listener(self.async_evaluate))
+
+    @callback
+    def async_stop(self):
+        """Dejar de escuchar."""
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs.clear()
+
+    def read_values(self):
+        """Peor lectura (máxima) de cada sensor entre las ventanas disponibles."""
+        values = {}
+        for window in self.sensor_windows:
+            coordinator = self.coordinators.get(window.window_id)
+            if coordinator is None or not coordinator.available or not coordinator.data:
+                continue
+            for name in self.thresholds:
+                value = coordinator.data.get(COMMANDS[name]["op"])
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                if name not in values or value > values[name]:
+                    values[name] = value
+        return values
+
+    def desired_level(self, values):
+        """Nivel que piden las lecturas, con histéresis respecto al nivel actual."""
+        current = self.level or 0
+        desired = 0
+        for name, value in values.items():
+            for level in (2, 1):
+                threshold = self.thresholds[name][level - 1]
+                if current >= level:
+                    threshold *= 1 - VENTILATION_HYSTERESIS
+                if value >= threshold:
+                    desired = max(desired, level)
+                    break
+        return desired
+
+    def _allowed(self, now):
+        """Indica si la permanencia mínima y el límite por hora permiten actuar."""
+        if self.last_change is not None and now - self.last_change < VENTILATION_MIN_DWELL:
+            return False
+        while self._actions and now - self._actions[0] >= 3600:
+            self._actions.popleft()
+        return len(self._actions) < VENTILATION_MAX_ACTIONS
+
+    @callback
+    def async_evaluate(self):
+        """Recalcular el nivel con las últimas lecturas y actuar si hace falta."""
+        if not self.windows:
+            return
+        values = self.read_values()
+        self.last_values = values
+        if not values:
+            return
+
+        desired = self.desired_level(values)
+        if desired == self.level:
+            return
+        if self.level is None and desired == 0:
+            # Sin saber cómo están no se cierran ventanas abiertas a mano
+            self.level = 0
+            return
+
+        now = time.monotonic()
+        if not self._allowed(now):
+            return
+        self._actions.append(now)
+        self.last_change = now
+        self.level = desired
+        self._async_apply(desired, values)
+
+    @callback
+    def _async_apply(self, level, values):
+        """Enviar el comando del nivel a las ventanas de la sala (o solo registrarlo)."""
+        command = LEVEL_COMMANDS[level]
+        _LOGGER.info(
+            "%sVentilación de %s: %s (%s)",
+            "[simulación] " if self.dry_run else "", self.key, LEVELS[level], values,
+        )
+        self.hass.bus.async_fire(
+            EVENT_VENTILATION,
+            {
+                "room": self.key,
+                "level": LEVELS[level],
+                "command": command,
+                "values": values,
+                "dry_run": self.dry_run,
+            },
+        )
+        if self.dry_run:
+            return
+
+        for window in self.windows:
+            coordinator = self.coordinators.get(window.window_id)
+            if coordinator is None or not coordinator.available:
+                continue
+            coordinator.async_start_motion(WINDOW_STATE_OP)
+            coordinator.async_command([(command, None)], {WINDOW_STATE_OP: 1 if level else 0})
+
+    def as_dict(self):
+        """Representación para los diagnósticos."""
+        return {
+            "level": LEVELS[self.level] if self.level is not None else None,
+            "thresholds": self.thresholds,
+            "last_values": self.last_values,
+            "actions_last_hour": len(self._actions),
+            "windows": [w.window_id for w in self.windows],
+        }
+
+
+class VentilationManager:
+    """Controles de ventilación de todas las salas con ventanas motorizadas.
+
+    Se rehacen al cambiar el inventario conservando el estado de las salas
+    que siguen existiendo.
+    """
+
+    def __init__(self, hass, entry, coordinators):
+        """Inicializar el gestor con las opciones de la entrada."""
+        self.hass = hass
+        self.entry = entry
+        self.coordinators = coordinators
+        self.dry_run = entry.options.get(CONF_VENTILATION_DRY_RUN, DEFAULT_VENTILATION_DRY_RUN)
+        self.room_thresholds = entry.options.get(CONF_VENTILATION_ROOMS, {})
+        self.rooms = {}
+        self._unsub_inventory = None
+
+    @callback
+    def async_start(self):
+        """Crear los controles de las salas y seguir los cambios del inventario."""
+        self._async_build()
+        self._unsub_inventory = async_dispatcher_connect(
+            self.hass, SIGNAL_INVENTORY.format(self.entry.entry_id), self._async_build
+        )
+
+    @callback
+    def async_stop(self):
+        """Parar todos los controles."""
+        if self._unsub_inventory is not None:
+            self._unsub_inventory()
+            self._unsub_inventory = None
+        for room in self.rooms.values():
+            room.async_stop()
+        self.rooms = {}
+
+    @callback
+    def _async_build(self, _changed=None):
+        """(Re)crear un control por sala a partir de la topología actual."""
+        topology = self.hass.data[DOMAIN]["topology"]
+        rooms = {}
+        for building in topology.buildings:
+            for room in building.rooms:
+                if not any("S5" in w.services for w in room.windows):
+                    continue
+                key = room_key(room)
+                thresholds = {**DEFAULT_VENTILATION_THRESHOLDS, **self.room_thresholds.get(key, {})}
+                control = RoomVentilation(
+                    self.hass, key, room.windows, self.coordinators, thresholds, self.dry_run
+                )
+                previous = self.rooms.get(key)
+                if previous is not None:
+                    control.level = previous.level
+                    control.last_change = previous.last_change
+                    control._actions = previous._actions
+                rooms[key] = control
+
+        for room in self.rooms.values():
+            room.async_stop()
+        self.rooms = rooms
+        for room in rooms.values():
+            room.async_start()
+
+    def as_dict(self):
+        """Representación para los diagnósticos."""
+        return {
+            "dry_run": self.dry_run,
+            "rooms": {key: room.as_dict() for key, room in self.rooms.items()},
+        }
@@ -0,0 +1,118 @@
+"""Fixtures comunes: Home Assistant mínimo y ventanas simuladas por socket.
+
+Las pruebas arrancan un Home Assistant mínimo sin acceso a la nube que
+encuentra la integración del repositorio y hablan por TCP con las ventanas
+virtuales de `benchmarks/simulator.py`.
+"""
+import asyncio
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+from homeassistant import bootstrap, loader
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.core import HomeAssistant
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from simulator import DeviceSimulator, SimulatorOptions  # noqa: E402
+
+DOMAIN = "mysmartwindow"
+REPO_COMPONENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components")
+
+
+def integration_module(name):
+    """Módulo de la integración tal y como lo importa Home Assistant."""
+    return importlib.import_module(f"custom_components.{DOMAIN}.{name}")
+
+
+async def wait_for(predicate, timeout=5):
+    """Esperar a que `predicate()` sea cierto; falla la prueba si no llega a serlo."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            pytest.fail("la condición no se cumplió a tiempo")
+        await asyncio.sleep(0.02)
+
+
+def record_ops(simulator):
+    """Lista (que se va llenando) de las op recibidas por las ventanas simuladas."""
+    received = []
+    for window in simulator.windows:
+        handle = window.handle
+
+        def recording(op, args, handle=handle, window_id=window.window_id):
+            received.append((window_id, op))
+            return handle(op, args)
+
+        window.handle = recording
+    return received
+
+
+@pytest.fixture
+async def simulator():
+    """Dos ventanas simuladas (S5 y S9) en una misma sala, sin latencia."""
+    simulator = DeviceSimulator(2, options=SimulatorOptions(latency=0, jitter=0, seed=1), rooms=1)
+    await simulator.start()
+    yield simulator
+    await simulator.stop()
+
+
+@pytest.fixture
+async def hass(monkeypatch):
+    """Home Assistant mínimo con la integración del repositorio."""
+    config_dir = tempfile.mkdtemp(prefix=f"{DOMAIN}-test-")
+    os.symlink(os.path.abspath(REPO_COMPONENTS), os.path.join(config_dir, "custom_components"))
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = ConfigEntries(hass, {})
+    await bootstrap.async_load_base_functionality(hass)
+    # `network` solo hace falta para descubrir interfaces; con localhost basta marcarlo como cargado
+    hass.config.components.add("network")
+    await hass.async_start()
+
+    # El refresco del inventario no consulta la nube: la lista se da por no modificada (304)
+    async def async_get_buildings(self, conditional=False):
+        return None
+
+    monkeypatch.setattr(integration_module("cloud").CloudClient, "async_get_buildings", async_get_buildings)
+    # Primera consulta de las ventanas sin escalonar
+    monkeypatch.setattr(integration_module("inventory"), "STARTUP_STAGGER", 0)
+    yield hass
+    await hass.async_stop(force=True)
+    shutil.rmtree(config_dir, ignore_errors=True)
+
+
+@pytest.fixture
+async def setup_integration(hass, simulator):
+    """Cargar la integración con el inventario del simulador y las opciones dadas."""
+    entries = []
+
+    async def async_setup(options):
+        entry = ConfigEntry(
+            version=1,
+            minor_version=1,
+            domain=DOMAIN,
+            title="MySmartWindow",
+            data={"cloud_token": "simulator", "devices": simulator.inventory()},
+            source="user",
+            options={"push": False, **options},
+        )
+        await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+        coordinators = hass.data[DOMAIN]["coordinators"]
+        await wait_for(lambda: all(coordinator.data for coordinator in coordinators.values()))
+        entries.append(entry)
+        return entry
+
+    yield async_setup
+    for entry in entries:
+        if hass.data.get(DOMAIN):
+            await hass.config_entries.async_unload(entry.entry_id)
+
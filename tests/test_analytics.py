@@ -0,0 +1,67 @@
+"""Analítica de la flota: cada lectura cuenta y los nombres repetidos no se pisan."""
+import pytest
+
+from conftest import DOMAIN, integration_module
+from simulator import OP
+
+
+def devices():
+    """Dos edificios "Sede" y, en el primero, dos salas "Oficina"."""
+    def window(window_id):
+        return {"Id_Window": window_id, "Ip": f"10.0.0.{len(window_id)}"}
+
+    return [
+        {"Home": {"Name": "Sede", "Rooms": [
+            {"Name": "Oficina", "Windows": [window("a1")]},
+            {"Name": "Oficina", "Windows": [window("a22")]},
+        ]}},
+        {"Home": {"Name": "Sede", "Rooms": [{"Name": "Oficina", "Windows": [window("b333")]}]}},
+    ]
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_every_reading_is_kept_under_unique_keys(monkeypatch, vectorized):
+    """Varias lecturas entre dos cálculos entran todas y cada sala tiene su resumen."""
+    analytics = integration_module("analytics")
+    if not vectorized:
+        monkeypatch.setattr(analytics, "np", None)
+    store = analytics.ReadingStore(integration_module("topology").Topology(devices()), samples=4)
+    co2 = OP["Co2"]
+
+    for value in (900, 1100, 1000):
+        store.record("a1", {co2: value})
+    store.record("a22", {co2: 400})
+    store.record("b333", {co2: 1200})
+    result = store.aggregate([True, True, True])
+
+    assert list(result) == ["Sede", "Sede (2)"]
+    rooms = result["Sede"]["rooms"]
+    assert list(rooms) == ["Oficina", "Oficina (2)"]
+    assert rooms["Oficina"]["mean"]["Co2"] == 1000
+    assert rooms["Oficina"]["exceedances"]["Co2"] == 1
+    assert rooms["Oficina"]["current"]["Co2"] == 1000
+    assert rooms["Oficina (2)"]["mean"]["Co2"] == 400
+    assert result["Sede"]["mean"]["Co2"] == 850
+    assert result["Sede (2)"]["airing"] == ["Oficina"]
+
+    # La última lectura de una ventana caída no decide la ventilación
+    result = store.aggregate([True, True, False])
+    assert result["Sede (2)"]["airing"] == []
+    assert result["Sede (2)"]["mean"]["Co2"] == 1200
+
+
+async def test_each_poll_is_recorded(hass, simulator, setup_integration):
+    """Cada consulta de la ventana deja una lectura, sin esperar al intervalo de la analítica."""
+    await setup_integration({})
+    window_id = simulator.windows[0].window_id
+    coordinator = hass.data[DOMAIN]["coordinators"][window_id]
+    analytics = hass.data[DOMAIN]["analytics"]
+    await analytics.async_refresh()
+    store = analytics.store
+    cell = store.names.index("Co2") * len(store.window_ids) + store.window_ids.index(window_id)
+    before = store.latest[cell]
+
+    await coordinator.async_refresh()
+    await coordinator.async_refresh()
+
+    assert store.latest[cell] == (before + 2) % store.samples
@@ -0,0 +1,62 @@
+"""Confirmación de los comandos optimistas."""
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+
+from conftest import DOMAIN, integration_module, wait_for
+from simulator import OP
+
+
+def failed_events(hass):
+    """Lista (que se va llenando) de eventos de comandos no confirmados."""
+    events = []
+    hass.bus.async_listen(integration_module("const").EVENT_COMMAND_FAILED, events.append)
+    return events
+
+
+async def test_confirmation_that_disagrees_rolls_back(hass, simulator, setup_integration):
+    """La ventana acepta LED ON pero el LED sigue apagado: se deshace y se avisa."""
+    await setup_integration({})
+    window = simulator.windows[0]
+    coordinator = hass.data[DOMAIN]["coordinators"][window.window_id]
+    handle = window.handle
+
+    def ignoring_handle(op, args):
+        reply = handle(op, args)
+        if op == OP["LED ON"]:
+            window.led_on = 0
+        return reply
+
+    window.handle = ignoring_handle
+    events = failed_events(hass)
+    error = await coordinator.async_command([("LED ON", None)], {OP["LED STATE"]: 1})
+
+    assert isinstance(error, ValueError)
+    await wait_for(lambda: events)
+    assert events[0].data["commands"] == ["LED ON"]
+    assert coordinator.data[OP["LED STATE"]] == 0
+
+
+async def test_rollback_ends_the_motion(hass, simulator, setup_integration):
+    """Si no se confirma la apertura, se deja de seguir el movimiento."""
+    await setup_integration({})
+    window = simulator.windows[0]
+    handle = window.handle
+
+    def rejecting_handle(op, args):
+        if op == OP["WINDOW OPEN"]:
+            raise KeyError(op)
+        return handle(op, args)
+
+    window.handle = rejecting_handle
+    entity_id = async_get_entity_registry(hass).async_get_entity_id("switch", DOMAIN, window.window_id)
+    switch = hass.data["switch"].get_entity(entity_id)
+    coordinator = switch.coordinator
+    op = OP["WINDOW STATE"]
+    events = failed_events(hass)
+
+    await switch.async_turn_on()
+    assert coordinator.is_moving(op)
+    await wait_for(lambda: events)
+
+    assert not coordinator.is_moving(op)
+    assert coordinator.data[op] == 0
+    assert not switch.is_on
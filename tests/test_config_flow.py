@@ -0,0 +1,78 @@
+"""Flujo de opciones de la ventilación y sus textos."""
+from homeassistant.helpers.translation import async_get_translations
+
+from conftest import DOMAIN, integration_module
+
+ROOM = "Simulador / Sala 0"
+THRESHOLDS = {
+    "co2_micro": 900, "co2_open": 1200,
+    "voc_micro": 250, "voc_open": 350,
+    "iaq_micro": 150, "iaq_open": 200,
+    "humedity_micro": 70, "humedity_open": 80,
+}
+# Campos del primer paso de opciones
+INIT_FIELDS = [
+    "push", "diagnostic_sensors", "log_sample_rate", "command_debounce",
+    "sensor_max_interval", "ventilation", "ventilation_dry_run",
+]
+
+
+async def start_options_flow(hass, monkeypatch, entry):
+    """Abrir el flujo de opciones de la entrada."""
+    # Las versiones de HA anteriores a 2024.11 no asignan `config_entry` al flujo de opciones
+    flow = integration_module("config_flow").MySmartWindowOptionsFlow
+    if not hasattr(flow, "config_entry"):
+        monkeypatch.setattr(
+            flow, "config_entry", property(lambda self: hass.config_entries.async_get_entry(self.handler)),
+            raising=False,
+        )
+    return await hass.config_entries.options.async_init(entry.entry_id)
+
+
+async def test_ventilation_room_thresholds(hass, setup_integration, monkeypatch):
+    """Los umbrales de una sala se guardan y se rechazan si microventilar supera a abrir."""
+    entry = await setup_integration({})
+    result = await start_options_flow(hass, monkeypatch, entry)
+    assert result["step_id"] == "init"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], {"ventilation": True, "ventilation_dry_run": True}
+    )
+    assert result["step_id"] == "ventilation"
+    result = await hass.config_entries.options.async_configure(result["flow_id"], {"room": ROOM})
+    assert result["step_id"] == "ventilation_room"
+    assert result["description_placeholders"] == {"room": ROOM}
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"], {**THRESHOLDS, "co2_micro": 1300}
+    )
+    assert result["errors"] == {"base": "invalid_thresholds"}
+
+    result = await hass.config_entries.options.async_configure(result["flow_id"], THRESHOLDS)
+    assert result["type"] == "create_entry"
+    assert entry.options["ventilation_rooms"][ROOM]["Co2"] == [900, 1200]
+
+
+async def test_options_translations(hass, setup_integration):
+    """Cada paso, campo y error del flujo de opciones tiene su texto."""
+    await setup_integration({})
+    for language in ("en", "es"):
+        translations = await async_get_translations(hass, language, "options", [DOMAIN])
+        prefix = f"component.{DOMAIN}.options"
+        assert f"{prefix}.error.invalid_thresholds" in translations
+        assert "{room}" in translations[f"{prefix}.step.ventilation_room.title"]
+        assert f"{prefix}.step.ventilation.data.room" in translations
+        for field in INIT_FIELDS:
+            assert f"{prefix}.step.init.data.{field}" in translations
+        for field in THRESHOLDS:
+            assert f"{prefix}.step.ventilation_room.data.{field}" in translations
+
+
+async def test_config_translations(hass):
+    """La reautenticación y los errores de la nube tienen su texto."""
+    for language in ("en", "es"):
+        translations = await async_get_translations(hass, language, "config", [DOMAIN])
+        prefix = f"component.{DOMAIN}.config"
+        assert f"{prefix}.step.reauth_confirm.data.cloud_token" in translations
+        assert f"{prefix}.error.cannot_connect" in translations
+        assert f"{prefix}.abort.reauth_successful" in translations
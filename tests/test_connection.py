@@ -0,0 +1,79 @@
+"""Reparto de las tramas del socket entre peticiones y push."""
+import asyncio
+import json
+
+import pytest
+
+from conftest import integration_module
+
+
+@pytest.fixture
+async def push_device():
+    """Ventana falsa que envía una trama push antes de contestar a cada lote."""
+    async def handle(reader, writer):
+        while data := await reader.read(4096):
+            ops = [json.loads(line)["op"] for line in data.decode().splitlines() if line]
+            replies = [{"type": "plain", "op": 55, "value": 21.5}]
+            replies += [{"type": "plain", "op": op, "value": op * 10} for op in ops]
+            writer.write(b"".join(json.dumps(reply).encode() for reply in replies))
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+
+
+async def test_push_frame_does_not_shift_replies(hass, push_device):
+    """Una trama push en mitad de un lote va al listener y no desplaza las respuestas."""
+    connection = integration_module("connection").DeviceConnection("127.0.0.1", push_device)
+    pushed = []
+    connection.push_listener = pushed.append
+    ops = [6, 4, 58]
+    try:
+        frames = await connection.async_request_many(
+            [json.dumps({"op": op}).encode() + b"\n" for op in ops], ops
+        )
+    finally:
+        await connection.async_close()
+
+    assert [frame["op"] for frame in frames] == ops
+    assert [frame["value"] for frame in frames] == [60, 40, 580]
+    assert [frame["op"] for frame in pushed] == [55]
+
+
+@pytest.fixture
+async def plain_only_device():
+    """Ventana falsa que no contesta a las tramas sin espacios (firmware antiguo)."""
+    async def handle(reader, writer):
+        while data := await reader.read(4096):
+            for line in data.decode().splitlines():
+                if line and ", " in line:
+                    reply = {"type": "plain", "op": json.loads(line)["op"], "value": 1}
+                    writer.write(json.dumps(reply).encode())
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+
+
+async def test_ignored_probe_is_short_and_not_a_timeout(hass, plain_only_device):
+    """Una prueba sin respuesta vence en PROBE_TIMEOUT y no cuenta como timeout."""
+    connection = integration_module("connection").DeviceConnection("127.0.0.1", plain_only_device)
+    protocol = integration_module("protocol")
+    loop = asyncio.get_running_loop()
+    try:
+        started = loop.time()
+        with pytest.raises(asyncio.TimeoutError):
+            await connection.async_probe(protocol.FrameBuilder("token", compact=True).build(6), 6)
+        assert loop.time() - started < integration_module("const").REQUEST_TIMEOUT / 2
+        assert connection.metrics.timeouts == 0
+
+        reply = await connection.async_request(protocol.FrameBuilder("token").build(6), 6)
+        assert reply["value"] == 1
+    finally:
+        await connection.async_close()
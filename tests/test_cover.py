@@ -0,0 +1,82 @@
+"""Modelo de la persiana: parada, órdenes sin confirmar y consultas de otro movimiento."""
+from types import SimpleNamespace
+
+import pytest
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+
+from conftest import DOMAIN, integration_module, wait_for
+from simulator import OP
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj monotónico de la persiana controlado por la prueba."""
+    clock = SimpleNamespace(now=10_000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(integration_module("cover"), "time", clock)
+    return clock
+
+
+def cover_entity(hass, simulator):
+    """Entidad de la persiana de la primera ventana simulada."""
+    window_id = simulator.windows[0].window_id
+    entity_id = async_get_entity_registry(hass).async_get_entity_id("cover", DOMAIN, window_id)
+    return hass.data["cover"].get_entity(entity_id)
+
+
+async def test_stop_reports_the_model_position(hass, simulator, setup_integration, clock):
+    """Tras parar se publica dónde se paró, no la última lectura anterior al movimiento."""
+    await setup_integration({})
+    cover = cover_entity(hass, simulator)
+    await wait_for(lambda: cover.current_cover_position == 100)
+
+    await cover.async_close_cover()
+    # Diez segundos de bajada a 25 s el recorrido completo (más la agrupación de comandos)
+    clock.now += 10 + cover.coordinator.command_debounce
+    await cover.async_stop_cover()
+
+    assert not cover._model.moving
+    assert cover.current_cover_position == 60
+
+
+async def test_unconfirmed_move_restores_the_model(hass, simulator, setup_integration, clock, monkeypatch):
+    """Si la ventana no confirma la orden el modelo vuelve a donde estaba."""
+    await setup_integration({})
+    cover = cover_entity(hass, simulator)
+    await wait_for(lambda: cover.current_cover_position == 100)
+    failed = []
+    hass.bus.async_listen(integration_module("const").EVENT_COMMAND_FAILED, failed.append)
+
+    async def async_send(op, args=None):
+        raise OSError("sin respuesta")
+
+    monkeypatch.setattr(cover.coordinator, "async_send", async_send)
+    await cover.async_close_cover()
+    clock.now += 5
+    await wait_for(lambda: failed)
+
+    assert not cover._model.moving
+    assert cover.current_cover_position == 100
+
+
+async def test_check_of_an_older_move_is_ignored(hass, simulator, setup_integration, clock, monkeypatch):
+    """Una lectura iniciada antes de la nueva orden no para el movimiento nuevo."""
+    await setup_integration({})
+    cover = cover_entity(hass, simulator)
+    await wait_for(lambda: cover.current_cover_position == 100)
+
+    await cover.async_close_cover()
+    previous_move = cover._move
+    clock.now += 10 + cover.coordinator.command_debounce
+    await cover.async_open_cover()
+
+    # La lectura vieja dice que la persiana sigue arriba, como antes de bajar
+    async def async_read_ops(ops):
+        return {OP["BLIND STATE"]: 0}
+
+    monkeypatch.setattr(cover.coordinator, "async_read_ops", async_read_ops)
+    await cover._async_check(previous_move)
+
+    assert cover._model.moving
+    assert cover._model.target == 100
+    assert cover.current_cover_position < 70
@@ -0,0 +1,52 @@
+"""Cortocircuito: una ventana que deja de responder a mitad de un movimiento."""
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+
+from conftest import DOMAIN, integration_module, wait_for
+from simulator import OP
+
+
+async def test_device_value_wins_after_a_trip_during_motion(hass, simulator, setup_integration):
+    """Al abrirse el circuito se olvida el valor optimista del movimiento en curso."""
+    await setup_integration({})
+    window = simulator.windows[0]
+    handle = window.handle
+    received = []
+
+    def lost_handle(op, args):
+        """La ventana acepta la orden de abrir pero no llega a moverse."""
+        reply = handle(op, args)
+        if op == OP["WINDOW OPEN"]:
+            window.window_state = 0
+            received.append(op)
+        return reply
+
+    window.handle = lost_handle
+    entity_id = async_get_entity_registry(hass).async_get_entity_id("switch", DOMAIN, window.window_id)
+    switch = hass.data["switch"].get_entity(entity_id)
+    coordinator = switch.coordinator
+    op = OP["WINDOW STATE"]
+
+    await switch.async_turn_on()
+    await wait_for(lambda: received)
+    assert coordinator.is_moving(op)
+    assert coordinator.data[op] == 1
+
+    read_ops = coordinator.async_read_ops
+
+    async def unreachable(ops):
+        raise OSError("sin respuesta")
+
+    coordinator.async_read_ops = unreachable
+    for _ in range(integration_module("const").HEALTH_FAILURE_THRESHOLD):
+        await coordinator.async_refresh()
+    assert not coordinator.available
+    assert not coordinator.is_moving(op)
+
+    # La ventana vuelve y toca la prueba
+    coordinator.async_read_ops = read_ops
+    coordinator.health.next_probe = 0.0
+    await coordinator.async_refresh()
+
+    assert coordinator.available
+    assert coordinator.data[op] == 0
+    assert not switch.is_on
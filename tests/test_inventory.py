@@ -0,0 +1,22 @@
+"""Aplicar cambios del inventario de la nube."""
+from conftest import DOMAIN, integration_module
+
+
+async def test_ip_change_closes_the_old_connection(hass, simulator, setup_integration):
+    """La conexión de la IP anterior se cierra y sale del pool."""
+    await setup_integration({})
+    domain_data = hass.data[DOMAIN]
+    devices = simulator.inventory()
+    window = devices[0]["Home"]["Rooms"][0]["Windows"][0]
+    old_key = (window["Ip"], window["Port"])
+    old_connection = domain_data["pool"].get(*old_key)
+    assert old_connection.connected
+
+    window["Ip"] = "127.0.0.254"
+    await domain_data["refresher"].async_apply(integration_module("topology").Topology(devices))
+
+    pool_keys = set(domain_data["pool"]._connections)
+    assert old_key not in pool_keys
+    assert ("127.0.0.254", window["Port"]) in pool_keys
+    assert not old_connection.connected
+    assert domain_data["coordinators"][window["Id_Window"]].connection is not old_connection
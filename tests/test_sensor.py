@@ -0,0 +1,24 @@
+"""Banda muerta de los sensores."""
+import time
+
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+
+from conftest import DOMAIN
+from simulator import OP
+
+
+async def test_change_exactly_at_the_deadband_is_written(hass, simulator, setup_integration):
+    """21.0 -> 21.2 con banda de 0.2 se escribe aunque la resta dé 0.19999..."""
+    await setup_integration({})
+    unique_id = f"{simulator.windows[0].host}-{OP['TEMPERATURE']}"
+    entity_id = async_get_entity_registry(hass).async_get_entity_id("sensor", DOMAIN, unique_id)
+    sensor = hass.data["sensor"].get_entity(entity_id)
+    assert sensor.entity_description.deadband == 0.2
+    assert 21.2 - 21.0 < 0.2
+
+    now = time.monotonic()
+    sensor._written_number = 21.0
+    sensor._written_at = now
+    assert sensor._should_write(21.2, 21.2, now)
+    assert sensor._should_write(20.8, 20.8, now)
+    assert not sensor._should_write(21.1, 21.1, now)
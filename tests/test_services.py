@@ -0,0 +1,65 @@
+"""Servicio bulk_command: las órdenes siguen el mismo camino que las entidades."""
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+
+from conftest import DOMAIN, wait_for
+from simulator import OP
+
+ROOM = "Sala 0"
+
+
+async def bulk_command(hass, **data):
+    """Llamar a bulk_command y devolver los resultados por ventana."""
+    response = await hass.services.async_call(
+        DOMAIN, "bulk_command", data, blocking=True, return_response=True
+    )
+    return response["results"]
+
+
+async def test_bulk_blind_command_moves_the_model(hass, simulator, setup_integration):
+    """Bajar todas las persianas de la sala arranca el modelo de cada persiana."""
+    await setup_integration({})
+    registry = async_get_entity_registry(hass)
+    covers = [
+        hass.data["cover"].get_entity(registry.async_get_entity_id("cover", DOMAIN, window.window_id))
+        for window in simulator.windows
+    ]
+
+    results = await bulk_command(hass, command="BLIND DOWN", room=ROOM)
+
+    assert all(result["success"] for result in results.values())
+    assert len(results) == len(simulator.windows)
+    for cover in covers:
+        assert cover._model.target == 0
+        assert cover.is_closing
+
+
+async def test_bulk_close_of_closed_windows_settles(hass, simulator, setup_integration):
+    """Cerrar ventanas ya cerradas no las deja en consulta rápida."""
+    await setup_integration({})
+    coordinators = hass.data[DOMAIN]["coordinators"].values()
+    op = OP["WINDOW STATE"]
+
+    results = await bulk_command(hass, command="WINDOW CLOSE", room=ROOM)
+
+    assert all(result["success"] for result in results.values())
+    await wait_for(lambda: not any(coordinator.is_moving(op) for coordinator in coordinators), timeout=6)
+    assert all(coordinator.data[op] == 0 for coordinator in coordinators)
+
+
+async def test_bulk_command_rolls_back_when_unconfirmed(hass, simulator, setup_integration):
+    """Si una ventana no confirma, su resultado es un fallo y se deshace el estado optimista."""
+    await setup_integration({})
+    window = simulator.windows[0]
+    coordinator = hass.data[DOMAIN]["coordinators"][window.window_id]
+    handle = window.handle
+
+    def rejecting_handle(op, args):
+        if op == OP["LED ON"]:
+            raise KeyError(op)
+        return handle(op, args)
+
+    window.handle = rejecting_handle
+    results = await bulk_command(hass, command="LED ON", window_ids=[window.window_id])
+
+    assert results[window.window_id]["success"] is False
+    assert coordinator.data[OP["LED STATE"]] == 0
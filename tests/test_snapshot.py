@@ -0,0 +1,58 @@
+"""Copia local del estado: claves corruptas y tramas push desconocidas."""
+from types import SimpleNamespace
+
+from homeassistant.helpers.storage import Store
+
+from conftest import DOMAIN, integration_module
+from simulator import OP
+
+
+async def test_load_skips_non_numeric_ops(hass):
+    """Una clave que no es un código de operación se descarta al cargar."""
+    entry = SimpleNamespace(entry_id="corrupt")
+    snapshot = integration_module("snapshot")
+    await Store(hass, snapshot.STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_save(
+        {"devices": [], "states": {"w1": {"6": 60, "temperatura": 21.5}, "w2": None}}
+    )
+
+    inventory = snapshot.InventorySnapshot(hass, entry)
+    await inventory.async_load()
+
+    assert inventory.states == {"w1": {6: 60}}
+
+
+async def test_push_of_unknown_op_is_ignored(hass, simulator, setup_integration):
+    """Solo las operaciones de estado de la ventana entran en sus datos."""
+    await setup_integration({})
+    coordinator = hass.data[DOMAIN]["coordinators"][simulator.windows[0].window_id]
+
+    coordinator._async_handle_push({"op": "temperatura", "value": 21.5})
+    coordinator._async_handle_push({"op": 9999, "value": 1})
+    coordinator._async_handle_push({"op": OP["WINDOW STATE"], "value": 1})
+
+    assert "temperatura" not in coordinator.data
+    assert 9999 not in coordinator.data
+    assert coordinator.data[OP["WINDOW STATE"]] == 1
+
+
+async def test_reauth_inventory_is_used_after_reload(hass, simulator, setup_integration, monkeypatch):
+    """El inventario descargado al reautenticar manda sobre la copia local anterior."""
+    entry = await setup_integration({})
+    devices = simulator.inventory()
+    window = devices[0]["Home"]["Rooms"][0]["Windows"][0]
+    window["Name"] = "Renombrada"
+
+    async def async_get_buildings(self, conditional=False):
+        # Solo la reautenticación lo descarga; el refresco en segundo plano ve un 304
+        return None if conditional else devices
+
+    monkeypatch.setattr(integration_module("cloud").CloudClient, "async_get_buildings", async_get_buildings)
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": "reauth", "entry_id": entry.entry_id}, data=entry.data
+    )
+    result = await hass.config_entries.flow.async_configure(result["flow_id"], {"cloud_token": "nuevo"})
+    assert result["reason"] == "reauth_successful"
+    await hass.async_block_till_done()
+
+    assert entry.data["cloud_token"] == "nuevo"
+    assert hass.data[DOMAIN]["topology"].windows[window["Id_Window"]].name == "Renombrada"
@@ -0,0 +1,59 @@
+"""Apertura de la ventana: el estado optimista se mantiene hasta que termina el recorrido."""
+import asyncio
+
+from homeassistant.helpers.entity_registry import async_get as async_get_entity_registry
+
+from conftest import DOMAIN, wait_for
+from simulator import OP
+
+
+async def test_slow_window_keeps_optimistic_state_until_it_moves(hass, simulator, setup_integration):
+    """Si WINDOW STATE solo cambia al final del recorrido no se da por parada antes."""
+    await setup_integration({})
+    window = simulator.windows[0]
+    handle = window.handle
+    travelling = []
+
+    def slow_handle(op, args):
+        """La ventana acepta la orden pero su estado no cambia hasta llegar."""
+        reply = handle(op, args)
+        if op == OP["WINDOW OPEN"]:
+            window.window_state = 0
+            travelling.append(op)
+        return reply
+
+    window.handle = slow_handle
+    entity_id = async_get_entity_registry(hass).async_get_entity_id("switch", DOMAIN, window.window_id)
+    switch = hass.data["switch"].get_entity(entity_id)
+    coordinator = switch.coordinator
+    op = OP["WINDOW STATE"]
+
+    await switch.async_turn_on()
+    await wait_for(lambda: travelling)
+    # Varias consultas rápidas sin cambios: la ventana aún está de camino
+    await asyncio.sleep(3.5)
+    assert coordinator.is_moving(op)
+    assert coordinator.data[op] == 1
+    assert switch.is_on
+
+    window.window_state = 1
+    await wait_for(lambda: not coordinator.is_moving(op), timeout=10)
+    assert coordinator.data[op] == 1
+    assert switch.is_on
+
+
+async def test_no_op_without_expected_value_settles(hass, simulator, setup_integration):
+    """Cerrar una ventana ya cerrada sin valor esperado se da por terminado enseguida."""
+    await setup_integration({})
+    coordinator = hass.data[DOMAIN]["coordinators"][simulator.windows[0].window_id]
+    op = OP["WINDOW STATE"]
+    assert coordinator.data[op] == 0
+
+    coordinator.async_start_motion(op)
+    coordinator.async_command([("WINDOW CLOSE", None)])
+    # Como hace bulk_command tras enviar: una consulta que arranca la consulta rápida
+    await coordinator.async_refresh()
+    assert coordinator.is_moving(op)
+    # MOTION_SETTLE_POLLS consultas iguales, no MOTION_MAX_DURATION
+    await wait_for(lambda: not coordinator.is_moving(op), timeout=6)
+    assert coordinator.data[op] == 0
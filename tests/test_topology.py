@@ -0,0 +1,38 @@
+"""Selección de ventanas del inventario."""
+from conftest import integration_module
+
+
+def devices():
+    """Dos edificios con una sala del mismo nombre."""
+    def building(name, prefix):
+        return {
+            "Home": {
+                "Name": name,
+                "Rooms": [
+                    {"Name": "Oficina", "Windows": [{"Id_Window": f"{prefix}1"}]},
+                    {"Name": "Cocina", "Windows": [{"Id_Window": f"{prefix}2"}]},
+                ],
+            }
+        }
+
+    return [building("Sede", "a"), building("Almacén", "b")]
+
+
+def selected_ids(**kwargs):
+    """Ids de las ventanas elegidas por `Topology.select`."""
+    topology = integration_module("topology").Topology(devices())
+    return sorted(window.window_id for window in topology.select(**kwargs))
+
+
+def test_select_room_and_building_intersect():
+    """Sala y edificio juntos eligen solo la sala de ese edificio."""
+    assert selected_ids(room="Oficina", building="Sede") == ["a1"]
+    assert selected_ids(room="Oficina") == ["a1", "b1"]
+    assert selected_ids(building="Almacén") == ["b1", "b2"]
+    assert selected_ids(room="Oficina", building="Nadie") == []
+
+
+def test_select_window_ids_are_added():
+    """Las ventanas indicadas por id se suman a la sala o el edificio."""
+    assert selected_ids(window_ids=["b2"], room="Oficina", building="Sede") == ["a1", "b2"]
+    assert selected_ids(window_ids=["zz"]) == []
@@ -0,0 +1,144 @@
+"""Control automático de la ventilación contra ventanas simuladas por socket."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import DOMAIN, integration_module, record_ops, wait_for
+from simulator import OP
+
+ROOM = "Simulador / Sala 0"
+OPEN_OPS = {OP["WINDOW OPEN"], OP["WINDOW MICRO OPEN"], OP["WINDOW CLOSE"]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj monotónico de la ventilación controlado por la prueba."""
+    clock = SimpleNamespace(now=10_000.0)
+    clock.monotonic = lambda: clock.now
+    monkeypatch.setattr(integration_module("ventilation"), "time", clock)
+    return clock
+
+
+async def set_co2(hass, simulator, value):
+    """Poner el CO2 de todas las ventanas y consultarlas (lo que evalúa la sala)."""
+    for window in simulator.windows:
+        window._sensors[OP["Co2"]] = value
+    coordinators = hass.data[DOMAIN]["coordinators"].values()
+    await asyncio.gather(*(coordinator.async_refresh() for coordinator in coordinators))
+
+
+def motion_settled(hass):
+    """Condición: ninguna ventana tiene un movimiento en seguimiento."""
+    coordinators = hass.data[DOMAIN]["coordinators"].values()
+    return lambda: not any(coordinator.is_moving(OP["WINDOW STATE"]) for coordinator in coordinators)
+
+
+def room(hass):
+    """Control de ventilación de la única sala del simulador."""
+    return hass.data[DOMAIN]["ventilation"].rooms[ROOM]
+
+
+def window_commands(received):
+    """Comandos de apertura y cierre recibidos por las ventanas."""
+    return [op for _, op in received if op in OPEN_OPS]
+
+
+async def test_desired_level_hysteresis(hass, setup_integration):
+    """Subir de nivel exige el umbral; mantenerlo basta con no bajar un 10 % de él."""
+    await setup_integration({"ventilation": True})
+    control = room(hass)  # Co2: microventilar desde 1000 ppm, abrir desde 1400
+
+    control.level = None
+    assert control.desired_level({"Co2": 950}) == 0
+    assert control.desired_level({"Co2": 1100}) == 1
+    assert control.desired_level({"Co2": 1500}) == 2
+
+    control.level = 1
+    assert control.desired_level({"Co2": 950}) == 1
+    assert control.desired_level({"Co2": 890}) == 0
+
+    control.level = 2
+    assert control.desired_level({"Co2": 1300}) == 2
+    assert control.desired_level({"Co2": 1250}) == 1
+
+
+async def test_startup_never_closes_hand_opened_windows(hass, simulator, setup_integration, clock):
+    """Con el aire limpio al arrancar no se cierra lo que alguien abrió a mano."""
+    for window in simulator.windows:
+        window.window_state = 1
+    received = record_ops(simulator)
+    await setup_integration({"ventilation": True, "ventilation_dry_run": False})
+
+    await set_co2(hass, simulator, 600)
+    await asyncio.sleep(0.5)
+
+    assert room(hass).level == 0
+    assert window_commands(received) == []
+    assert all(window.window_state == 1 for window in simulator.windows)
+
+
+async def test_opens_and_respects_min_dwell(hass, simulator, setup_integration, clock):
+    """Abre al superar el umbral y no vuelve a cambiar antes de la permanencia mínima."""
+    received = record_ops(simulator)
+    await setup_integration({"ventilation": True, "ventilation_dry_run": False})
+    dwell = integration_module("const").VENTILATION_MIN_DWELL
+
+    await set_co2(hass, simulator, 2000)
+    assert room(hass).level == 2
+    await wait_for(lambda: all(window.window_state == 1 for window in simulator.windows))
+    assert window_commands(received).count(OP["WINDOW OPEN"]) == len(simulator.windows)
+    # Mientras se sigue el movimiento solo se consulta el estado de la ventana
+    await wait_for(motion_settled(hass), timeout=10)
+
+    clock.now += dwell - 1
+    await set_co2(hass, simulator, 600)
+    await asyncio.sleep(0.5)
+    assert room(hass).level == 2
+    assert OP["WINDOW CLOSE"] not in window_commands(received)
+
+    clock.now += 1
+    await set_co2(hass, simulator, 600)
+    assert room(hass).level == 0
+    await wait_for(lambda: all(window.window_state == 0 for window in simulator.windows))
+
+
+async def test_max_actions_per_hour(hass, simulator, setup_integration, clock):
+    """Como mucho VENTILATION_MAX_ACTIONS cambios de nivel por sala y hora."""
+    await setup_integration({"ventilation": True})
+    const = integration_module("const")
+    control = room(hass)
+
+    levels = []
+    for index in range(const.VENTILATION_MAX_ACTIONS + 1):
+        clock.now += const.VENTILATION_MIN_DWELL
+        await set_co2(hass, simulator, 2000 if index % 2 == 0 else 600)
+        levels.append(control.level)
+
+    expected = [2 if index % 2 == 0 else 0 for index in range(const.VENTILATION_MAX_ACTIONS)]
+    assert levels[:-1] == expected
+    # El siguiente cambio de la hora se descarta
+    assert levels[-1] == expected[-1]
+
+    # Pasada la hora vuelve a poder actuar
+    clock.now += 3600
+    await set_co2(hass, simulator, 2000)
+    assert control.level == 2
+
+
+async def test_dry_run_fires_event_without_sending_frames(hass, simulator, setup_integration, clock):
+    """En simulación se lanza el evento pero no se envía ninguna trama de apertura."""
+    received = record_ops(simulator)
+    await setup_integration({"ventilation": True, "ventilation_dry_run": True})
+    events = []
+    hass.bus.async_listen(integration_module("const").EVENT_VENTILATION, events.append)
+
+    await set_co2(hass, simulator, 2000)
+    await hass.async_block_till_done()
+    await asyncio.sleep(0.5)
+
+    assert [event.data["level"] for event in events] == ["abierta"]
+    assert events[0].data["room"] == ROOM
+    assert events[0].data["dry_run"] is True
+    assert window_commands(received) == []
+    assert all(window.window_state == 0 for window in simulator.windows)